@@ -4,11 +4,6 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
 import io, base64
 
-import matplotlib
-matplotlib.use("Agg")
-import matplotlib.pyplot as plt
-import matplotlib.dates as mdates
-
 from app.db.session import get_db
 from app.db.models import TrainEvent
 
@@ -60,6 +55,12 @@ async def get_trains_chart(video_id: int, db: AsyncSession = Depends(get_db)):
         tid = ev.full_train_id
         by_train.setdefault(tid, []).append(ev)
 
+    # matplotlib тяжёлый — грузим только когда реально строим график
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+    import matplotlib.dates as mdates
+
     # Готовим данные для Gantt‑графика (горизонтальные бары)[web:63]
     fig, ax = plt.subplots(figsize=(10, 4))
     y = 0
@@ -3,12 +3,16 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select, delete, desc, func
 from app.db.session import get_db
 from app.db.models import VideoFile, SafetyEvent
-from app.services.video_stream import start_video_processing_task
+from app.services.inference_worker import start_video_processing_task
 import shutil
 import os
 from pydantic import BaseModel
-from typing import List, Union
+from datetime import datetime
+from typing import List, Union, Optional
 from app.services.zones import zone_service
+from app.services.trajectory_store import trajectory_store
+from app.services.detection_cache import clear_cache
+from app.services.live_streams import live_manager
 from app.api.v1.endpoints import trains
 
 api_router = APIRouter()
@@ -29,6 +33,8 @@ async def reset_db(db: AsyncSession = Depends(get_db)):
         await db.execute(delete(SafetyEvent))
         await db.execute(delete(VideoFile))
         await db.commit()
+        clear_cache()
+        trajectory_store.clear()
 
         folder = 'app/temp'
         if os.path.exists(folder):
@@ -114,13 +120,44 @@ async def upload_video(background_tasks: BackgroundTasks, file: UploadFile = Fil
     background_tasks.add_task(start_video_processing_task, file_location, new_video.id)
     return {"id": new_video.id, "filename": file.filename}
 
+# --- LIVE ПОТОКИ (RTSP / КАМЕРЫ) ---
+class LiveStreamRequest(BaseModel):
+    source: str  # rtsp://... или индекс устройства ("0")
+    camera_id: Optional[str] = None
+
+@api_router.post("/live/start")
+async def start_live_stream(body: LiveStreamRequest, db: AsyncSession = Depends(get_db)):
+    # Под поток заводим запись VideoFile, чтобы события ссылались на неё как на обычное видео
+    new_video = VideoFile(filename=body.source, filepath=body.source, processed=0)
+    db.add(new_video)
+    await db.commit()
+    await db.refresh(new_video)
+
+    await live_manager.start(new_video.id, body.source, body.camera_id)
+    return {"id": new_video.id, "source": body.source}
+
+@api_router.post("/live/{video_id}/stop")
+async def stop_live_stream(video_id: int):
+    stats = await live_manager.stop(video_id)
+    if stats is None:
+        raise HTTPException(status_code=404, detail="Live stream not found")
+    return stats
+
+@api_router.get("/live")
+async def get_live_streams():
+    """Состояние потоков: подключение, прочитано/отброшено кадров, переподключения."""
+    return live_manager.status()
+
 @api_router.delete("/videos/{video_id}")
 async def delete_video(video_id: int, db: AsyncSession = Depends(get_db)):
     await db.execute(delete(SafetyEvent).where(SafetyEvent.video_id == video_id))
+    trajectory_store.clear(video_id)
     result = await db.execute(select(VideoFile).where(VideoFile.id == video_id))
     video = result.scalar_one_or_none()
     if video:
         try:
+            # Кеш детекций ключуется содержимым файла — удаляем, пока файл ещё на месте
+            clear_cache(f"app/temp/{video.filename}")
             if os.path.exists(f"app/temp/{video.filename}"):
                 os.remove(f"app/temp/{video.filename}")
         except:
@@ -148,6 +185,20 @@ async def get_video_events(video_id: int, db: AsyncSession = Depends(get_db)):
         "real_time": e.real_time
     } for e in events]
 
+# Ретроспективный запрос: кто был в полигоне за интервал времени (по траекториям, без видео)
+class TrajectoryQuery(BaseModel):
+    points: List[List[float]]  # полигон в нормированных координатах
+    start: datetime
+    end: datetime
+
+@api_router.post("/videos/{video_id}/trajectories/query")
+async def query_trajectories(video_id: int, body: TrajectoryQuery):
+    if len(body.points) < 3:
+        raise HTTPException(status_code=400, detail="Need at least 3 points")
+    if body.end < body.start:
+        raise HTTPException(status_code=400, detail="end must be after start")
+    return trajectory_store.query(video_id, body.points, body.start, body.end)
+
 @api_router.get("/videos/{video_id}/risk_ranking")
 async def get_risk_ranking(video_id: int, db: AsyncSession = Depends(get_db)):
     query = select(SafetyEvent.track_id, SafetyEvent.event_type, func.count(SafetyEvent.id)) \
@@ -206,14 +257,56 @@ async def get_danger_zone(video_id: int = Query(1)):
     return zone
 
 
+# Несколько именованных зон на камеру (колея, смотровые ямы, контактная сеть, проходы)
+class NamedZoneModel(BaseModel):
+    name: str
+    type: str = "danger"  # danger | track | pit | catenary — запрещённые; walkway и др. — разметка
+    points: List[List[float]]
+
+@api_router.get("/zones")
+async def list_zones(video_id: int = Query(1)):
+    return zone_service.list_zones(video_id)
+
+@api_router.put("/zones")
+async def replace_zones(zones: List[NamedZoneModel], video_id: int = Query(1)):
+    """Заменяет все зоны камеры."""
+    names = [z.name for z in zones]
+    if len(set(names)) != len(names):
+        raise HTTPException(status_code=400, detail="Zone names must be unique")
+    if any(len(z.points) < 3 for z in zones):
+        raise HTTPException(status_code=400, detail="Need at least 3 points per zone")
+    zone_service.set_zones(video_id, [z.model_dump() for z in zones])
+    print(f"📥 ZONES UPDATE for Video {video_id}: {len(zones)} zones")
+    return {"status": "Zones updated", "video_id": video_id, "zones": len(zones)}
+
+@api_router.put("/zones/{name}")
+async def upsert_zone(name: str, body: ZoneUpdateModel, video_id: int = Query(1),
+                      zone_type: str = Query("danger", alias="type")):
+    if len(body.points) < 3:
+        raise HTTPException(status_code=400, detail="Need at least 3 points")
+    zone_service.upsert_zone(video_id, name, body.points, zone_type)
+    return {"status": "Zone updated", "video_id": video_id, "name": name}
+
+@api_router.delete("/zones/{name}")
+async def delete_zone(name: str, video_id: int = Query(1)):
+    if not zone_service.remove_zone(video_id, name):
+        raise HTTPException(status_code=404, detail="Zone not found")
+    return {"status": "Zone deleted", "video_id": video_id, "name": name}
+
+
 @api_router.post("/videos/{video_id}/reprocess")
-async def reprocess_video(video_id: int, background_tasks: BackgroundTasks, db: AsyncSession = Depends(get_db)):
+async def reprocess_video(video_id: int, background_tasks: BackgroundTasks,
+                          segments: int = Query(1, ge=1, description="Параллельных сегментов (архивная обработка)"),
+                          rerun_models: bool = Query(False, description="Игнорировать кеш детекций и заново прогнать нейросети"),
+                          db: AsyncSession = Depends(get_db)):
     # 1. Находим видео
     video = await db.get(VideoFile, video_id)
     if not video: return {"error": "not found"}
 
-    # 2. Удаляем старые события
+    # 2. Удаляем старые события и траектории
     await db.execute(delete(SafetyEvent).where(SafetyEvent.video_id == video_id))
+    trajectory_store.clear(video_id)
+    video.processed = 0
     await db.commit()
 
     # 3. Запускаем процесс заново
@@ -221,5 +314,5 @@ async def reprocess_video(video_id: int, background_tasks: BackgroundTasks, db:
     # У тебя в upload_video путь: f"app/temp/{file.filename}"
     file_path = f"app/temp/{video.filename}"
 
-    background_tasks.add_task(start_video_processing_task, file_path, video_id)
-    return {"status": "reprocessing started"}
+    background_tasks.add_task(start_video_processing_task, file_path, video_id, segments, not rerun_models)
+    return {"status": "reprocessing started", "segments": segments, "rerun_models": rerun_models}
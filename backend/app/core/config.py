@@ -12,6 +12,46 @@ class Settings(BaseSettings):
     POSTGRES_PORT: str = "5432"
     POSTGRES_DB: str = "argus_db"
 
+    # Видео-пайплайн
+    DECODE_BUFFER_SIZE: int = 8  # слотов в кольцевом буфере декодера
+    SAMPLING_MODE: str = "fixed"  # fixed (каждый 3-й кадр) | adaptive (по движению)
+    SAMPLING_TARGET_FPS: float = 6.0  # бюджет анализируемых кадров в секунду видео
+    INFERENCE_WORKERS: int = 1  # процессов в пуле инференса
+    INFERENCE_MP_START: str = "spawn"  # spawn безопасен для CUDA; fork — только при INFERENCE_DEVICE=cpu
+    ZONE_SYNC_DIR: str = "data/zones"  # Снимки зон: правки из API доходят до идущих задач пула
+    SHARED_PREPROCESSING: bool = True  # один letterbox/тензор на разрешение для всех моделей
+    PARALLEL_MODELS: bool = False  # P2 / Pose / PPE в параллельных потоках
+    PPE_CASCADE_MODE: str = "roi"  # full | roi | crops — PPE только вокруг найденных людей
+    PPE_ONE_TO_ONE: bool = True  # True: предмет — одному владельцу (голова/лицо 1:1); False: всем, чей бокс его содержит
+    PERSON_FUSION_MODE: str = "wbf"  # nms | wbf — слияние людей P2 и Pose
+    P2_TILING: bool = False  # Тайлы P2 для мелких дальних людей (батчем, поверх полного кадра)
+    P2_TILE_SIZE: int = 640  # Сторона тайла в пикселях кадра (кратно 32)
+    P2_TILE_OVERLAP: float = 0.2
+    P2_TILE_ROI: str = "none"  # none | zone — резать только область опасной зоны
+    INFERENCE_BACKEND: str = "torch"  # torch | onnx | openvino — рантайм моделей
+    INFERENCE_DEVICE: str = "auto"  # auto | cpu | cuda:0 (torch-детектор и EasyOCR)
+    INFERENCE_INT8: bool = False  # INT8-квантизация при экспорте в onnx/openvino
+    INT8_CALIBRATION_DIR: str = "data/calibration"  # Кадры камер для INT8-калибровки
+    MODEL_WARMUP: str = "detector,ocr"  # Какие модели воркеры прогревают в фоне при старте
+    API_MODEL_WARMUP: bool = False  # Прогревать детектор и в процессе API (live-потоки)
+    TRACK_HIGH_THRESH: float = 0.4  # Уверенные детекции (1-й этап ByteTrack); Pose отдаёт от 0.5, P2 — от 0.25
+    TRACK_LOW_THRESH: float = 0.25  # Слабые — только продлевают треки; ниже детектор ничего не отдаёт
+    TRACK_NEW_THRESH: float = 0.45  # Минимальная уверенность для старта нового трека
+    TRACK_MIN_HITS: int = 3  # Кадров подряд до выдачи ID: одиночные ложняки не плодят треки
+    KEYFRAME_INTERVAL: int = 1  # Детекция на каждом k-м анализируемом кадре (1 — на каждом)
+    KEYFRAME_MIN_CONFIDENCE: float = 0.5  # Ниже — перенос потоком ненадёжен, форсируем детекцию
+    KEYFRAME_NEW_OBJECT_MOTION: float = 0.002  # Доля движущихся пикселей вне боксов -> новый объект
+    DETECTION_CACHE: bool = True  # Сохранять сырые детекции: reprocess без нейросетей
+    DETECTION_CACHE_DIR: str = "data/detection_cache"
+    WORKER_IDLE_SEC: float = 60.0  # Трек не виден дольше — состояние вытесняется
+    WORKER_STATE_MAX_MB: int = 64  # Жёсткий лимит памяти состояний треков на процессор
+    TRAJECTORY_STORE: bool = True  # Сохранять траектории треков для запросов "кто был в зоне"
+    TRAJECTORY_DIR: str = "data/trajectories"  # Часовые партиции траекторий по видео
+    TIMESTAMP_SYNC_SEC: float = 1.0  # Сверка часов по оверлею (шаблоны цифр — почти бесплатно)
+    TIMESTAMP_OCR_FALLBACK_SEC: float = 10.0  # EasyOCR для часов — только при расхождении и не чаще
+    LIVE_BATCH_SIZE: int = 8  # максимум кадров разных камер в одном батче
+    LIVE_BATCH_DELAY_MS: float = 20.0  # сколько ждём добора батча
+
     @property
     def DATABASE_URL(self) -> str:
         return f"postgresql+asyncpg://{self.POSTGRES_USER}:{self.POSTGRES_PASSWORD}@{self.POSTGRES_SERVER}:{self.POSTGRES_PORT}/{self.POSTGRES_DB}"
@@ -3,9 +3,14 @@ from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 from contextlib import asynccontextmanager
+import asyncio
 from app.core.config import settings
 from app.db.session import init_db
 from app.api.v1.router import api_router
+from app.services.inference_worker import inference_pool
+from app.services.live_streams import live_manager
+from app.services.model_registry import model_registry
+from app.services.zones import zone_service
 import os
 
 os.makedirs("app/temp", exist_ok=True)
@@ -14,8 +19,16 @@ os.makedirs("app/temp", exist_ok=True)
 async def lifespan(app: FastAPI):
     print("🚀 Startup: Initializing Database...")
     await init_db()
+    zone_service.clear_snapshots()
+    # Модели грузятся в фоне: /health отвечает сразу, готовность видна в его ответе
+    warmup_task = asyncio.create_task(inference_pool.warm_up())
+    if settings.API_MODEL_WARMUP:
+        model_registry.warm_up(["detector"])
     yield
     print("🛑 Shutdown: Cleaning up...")
+    await live_manager.stop_all()
+    warmup_task.cancel()
+    inference_pool.shutdown()
 
 app = FastAPI(
     title=settings.PROJECT_NAME,
@@ -36,7 +49,13 @@ app.include_router(api_router, prefix="/api/v1")
 
 @app.get("/health")
 async def health_check():
-    return {"status": "ok"}
+    pool = inference_pool.status()
+    return {
+        "status": "ok",
+        "ready": pool["ready"],
+        "inference_pool": pool,
+        "api_models": model_registry.status(),
+    }
 
 if __name__ == "__main__":
     import uvicorn
@@ -0,0 +1,133 @@
+# backend/app/services/activity.py
+from typing import List, Tuple
+
+import numpy as np
+
+from app.services.detections import NUM_KPTS
+
+HISTORY = 30  # кадров истории позиций и скелетов
+
+ANALYZING = "Анализ..."
+STANDING = "Стоит"
+WALKING = "Идет"
+WORKING = "Работает"
+SITTING = "Сидит"
+FALLEN = "Лежит"
+
+LEFT_WRIST, RIGHT_WRIST = 9, 10
+POSE_KPTS = (0, 5, 6, 11, 12)  # нос, плечи, бёдра — для classify_poses
+
+
+class ActivityEngine:
+    """
+    История всех живых треков в заранее выделенных тензорах и классификация
+    активности всех людей кадра одним векторным проходом.
+    - positions (C, HISTORY, 2) и keypoints (C, HISTORY, 17, 3) — кольцевые буферы,
+      у каждого трека свой слот (alloc/release), ёмкость C растёт удвоением до max_slots.
+    - classify(): Стоит / Идет / Работает / Сидит / Лежит (+ "Анализ..." пока истории мало).
+    """
+    def __init__(self, max_slots: int, initial_slots: int = 64):
+        self.max_slots = max_slots
+        self.capacity = 0
+        self.positions = np.zeros((0, HISTORY, 2), dtype=np.float32)
+        self.keypoints = np.zeros((0, HISTORY, NUM_KPTS, 3), dtype=np.float32)
+        self.pos_head = np.zeros(0, dtype=np.int32)
+        self.pos_len = np.zeros(0, dtype=np.int32)
+        self.kpt_head = np.zeros(0, dtype=np.int32)
+        self.kpt_len = np.zeros(0, dtype=np.int32)
+        self._free: List[int] = []
+        self._grow(min(initial_slots, max_slots))
+
+    @staticmethod
+    def slot_bytes() -> int:
+        return HISTORY * 2 * 4 + HISTORY * NUM_KPTS * 3 * 4 + 4 * 4
+
+    def _grow(self, capacity: int):
+        extra = capacity - self.capacity
+
+        def pad(arr):
+            return np.concatenate([arr, np.zeros((extra, *arr.shape[1:]), dtype=arr.dtype)])
+
+        self.positions, self.keypoints = pad(self.positions), pad(self.keypoints)
+        self.pos_head, self.pos_len = pad(self.pos_head), pad(self.pos_len)
+        self.kpt_head, self.kpt_len = pad(self.kpt_head), pad(self.kpt_len)
+        # Младшие слоты выдаются первыми
+        self._free.extend(range(capacity - 1, self.capacity - 1, -1))
+        self.capacity = capacity
+
+    def alloc(self) -> int:
+        if not self._free:
+            if self.capacity >= self.max_slots:
+                raise RuntimeError("ActivityEngine: no free slots")
+            self._grow(min(self.max_slots, max(1, self.capacity * 2)))
+        slot = self._free.pop()
+        self.pos_head[slot] = self.pos_len[slot] = 0
+        self.kpt_head[slot] = self.kpt_len[slot] = 0
+        return slot
+
+    def release(self, slot: int):
+        self._free.append(slot)
+
+    def update(self, slots: np.ndarray, centers: np.ndarray, keypoints: np.ndarray, has_kpts: np.ndarray):
+        """Дописывает центры боксов (всем) и скелеты (у кого есть) в кольцевые буферы."""
+        head = self.pos_head[slots]
+        self.positions[slots, head] = centers
+        self.pos_head[slots] = (head + 1) % HISTORY
+        self.pos_len[slots] = np.minimum(self.pos_len[slots] + 1, HISTORY)
+
+        k_slots = slots[has_kpts]
+        head = self.kpt_head[k_slots]
+        self.keypoints[k_slots, head] = keypoints[has_kpts]
+        self.kpt_head[k_slots] = (head + 1) % HISTORY
+        self.kpt_len[k_slots] = np.minimum(self.kpt_len[k_slots] + 1, HISTORY)
+
+    def classify(self, slots: np.ndarray, boxes: np.ndarray, has_kpts: np.ndarray) -> Tuple[List[str], np.ndarray]:
+        """
+        Активности людей кадра (после update) и маска падений.
+        Падение — бокс со скелетом лежит (ширина > 1.2 высоты), независимо от истории.
+        """
+        box_w = boxes[:, 2] - boxes[:, 0]
+        box_h = boxes[:, 3] - boxes[:, 1]
+        fallen = has_kpts & (box_w > box_h * 1.2)
+
+        # Смещение за окно истории: последняя точка минус самая старая
+        n = self.pos_len[slots]
+        head = self.pos_head[slots]
+        last = self.positions[slots, (head - 1) % HISTORY]
+        first = self.positions[slots, (head - n) % HISTORY]
+        movement = np.linalg.norm(last - first, axis=1)
+
+        # Подвижность рук: std запястий по истории скелетов (только заполненная часть буфера)
+        k_len = self.kpt_len[slots]
+        wrists = self.keypoints[:, :, LEFT_WRIST:RIGHT_WRIST + 1, :2][slots]  # (N, H, 2, 2)
+        valid = (np.arange(HISTORY)[None, :] < k_len[:, None])[..., None, None]
+        count = np.maximum(k_len, 1)[:, None, None]
+        mean = (wrists * valid).sum(axis=1) / count
+        std = np.sqrt((((wrists - mean[:, None]) ** 2) * valid).sum(axis=1) / count)
+        hands_active = (k_len > 5) & (std.mean(axis=(1, 2)) > 2.0)
+
+        labels = np.where(movement < 10, STANDING, WALKING).astype(object)
+        with_pose = has_kpts & (n >= 5)
+        labels[with_pose] = STANDING
+        labels[with_pose & (box_w > box_h * 0.8) & (movement < 10)] = SITTING
+        labels[with_pose & hands_active] = WORKING
+        labels[with_pose & (movement > 20.0)] = WALKING
+        labels[with_pose & fallen] = FALLEN
+        labels[n < 5] = ANALYZING
+        return labels.tolist(), fallen
+
+
+def classify_poses(keypoints: np.ndarray) -> np.ndarray:
+    """
+    Поза по одиночному скелету для всех людей сразу: keypoints (N, 17, 3).
+    Unknown — видно меньше трёх опорных точек.
+    """
+    kps = np.asarray(keypoints, dtype=np.float32).reshape(-1, NUM_KPTS, 3)
+    visible = (kps[:, POSE_KPTS, 2] > 0.5).sum(axis=1)
+    nose_y, shoulder_y, hip_y = kps[:, 0, 1], kps[:, 5, 1], kps[:, 11, 1]
+
+    labels = np.full(len(kps), "Standing", dtype=object)
+    labels[shoulder_y < nose_y - 30] = "Working"
+    labels[hip_y - nose_y < 20] = "Fallen"
+    labels[visible < 3] = "Unknown"
+    return labels
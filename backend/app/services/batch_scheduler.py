@@ -0,0 +1,105 @@
+# backend/app/services/batch_scheduler.py
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Hashable, Optional, Set
+
+from app.services.detector import GodModeDetector
+from app.services.detections import DetectionBatch
+
+
+class BatchInferenceScheduler:
+    """
+    Собирает кадры от нескольких одновременно работающих потоков (камер)
+    в батч: до max_batch_size кадров или пока не истёк max_delay_ms
+    с момента прихода первого кадра. Каждая модель вызывается один раз
+    на батч, результаты возвращаются своему потоку.
+
+    Трекер у каждого потока свой (register_stream -> контекст трекинга
+    детектора), поэтому ID людей разных камер не смешиваются.
+    """
+    def __init__(self, detector: GodModeDetector, max_batch_size: int = 8, max_delay_ms: float = 20.0):
+        self.detector = detector
+        self.max_batch_size = max_batch_size
+        self.max_delay = max_delay_ms / 1000.0
+        self.streams: Set[Hashable] = set()
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+        # Один поток: инференс не блокирует event loop и не гоняет модели параллельно
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="batch-infer")
+        self.batches_run = 0
+        self.frames_run = 0
+
+    def register_stream(self, stream_id: Hashable, frame_rate: int = 30):
+        self.detector.open_stream(stream_id, frame_rate=frame_rate)
+        self.streams.add(stream_id)
+
+    def unregister_stream(self, stream_id: Hashable):
+        self.streams.discard(stream_id)
+        self.detector.close_stream(stream_id)
+
+    def _ensure_worker(self):
+        if self._worker is None or self._worker.done():
+            self._queue = asyncio.Queue()
+            self._worker = asyncio.create_task(self._run())
+
+    async def detect(self, stream_id: Hashable, frame, roi=None) -> DetectionBatch:
+        """Ставит кадр в очередь и ждёт детекции для него (roi — область тайлинга P2)."""
+        if stream_id not in self.streams:
+            self.register_stream(stream_id)
+        self._ensure_worker()
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((stream_id, frame, roi, future))
+        return await future
+
+    async def _collect_batch(self) -> list:
+        loop = asyncio.get_running_loop()
+        batch = [await self._queue.get()]
+        deadline = loop.time() + self.max_delay
+        while len(batch) < self.max_batch_size:
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = await self._collect_batch()
+            # Поток мог отписаться, пока кадр стоял в очереди
+            for stream_id, _, _, future in batch:
+                if stream_id not in self.streams and not future.done():
+                    future.cancel()
+            batch = [item for item in batch if not item[3].done()]
+            if not batch:
+                continue
+
+            frames = [frame for _, frame, _, _ in batch]
+            rois = [roi for _, _, roi, _ in batch]
+            stream_ids = [stream_id for stream_id, _, _, _ in batch]
+            try:
+                results = await loop.run_in_executor(
+                    self._executor, partial(self.detector.detect_batch, frames, stream_ids, rois=rois)
+                )
+            except Exception as e:
+                for _, _, _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+
+            self.batches_run += 1
+            self.frames_run += len(batch)
+            for (_, _, _, future), detections in zip(batch, results):
+                if not future.done():
+                    future.set_result(detections)
+
+    def stats(self) -> dict:
+        return {
+            "streams": len(self.streams),
+            "batches": self.batches_run,
+            "avg_batch_size": round(self.frames_run / self.batches_run, 2) if self.batches_run else 0.0,
+        }
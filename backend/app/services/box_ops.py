@@ -0,0 +1,103 @@
+# backend/app/services/box_ops.py
+import numpy as np
+from typing import Optional, Tuple
+
+
+def iou_matrix(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """Попарный IoU боксов xyxy: (N, 4) x (M, 4) -> (N, M)."""
+    a = np.asarray(a, dtype=np.float32).reshape(-1, 4)
+    b = np.asarray(b, dtype=np.float32).reshape(-1, 4)
+    if len(a) == 0 or len(b) == 0:
+        return np.zeros((len(a), len(b)), dtype=np.float32)
+
+    lt = np.maximum(a[:, None, :2], b[None, :, :2])
+    rb = np.minimum(a[:, None, 2:], b[None, :, 2:])
+    wh = np.clip(rb - lt, 0, None)
+    inter = wh[..., 0] * wh[..., 1]
+
+    area_a = (a[:, 2] - a[:, 0]) * (a[:, 3] - a[:, 1])
+    area_b = (b[:, 2] - b[:, 0]) * (b[:, 3] - b[:, 1])
+    union = area_a[:, None] + area_b[None, :] - inter
+    return np.divide(inter, union, out=np.zeros_like(inter), where=union > 0)
+
+
+def nms(boxes: np.ndarray, scores: np.ndarray, iou_threshold: float = 0.5,
+        classes: Optional[np.ndarray] = None) -> np.ndarray:
+    """
+    Non-maximum suppression. Возвращает индексы оставленных боксов
+    по убыванию score. classes — NMS отдельно по каждому классу.
+    """
+    boxes = np.asarray(boxes, dtype=np.float32).reshape(-1, 4)
+    if len(boxes) == 0:
+        return np.zeros(0, dtype=int)
+    if classes is not None:
+        # Сдвигаем боксы разных классов так, чтобы они не пересекались
+        offset = np.asarray(classes, dtype=np.float32)[:, None] * (boxes.max() + 1)
+        boxes = boxes + offset
+
+    order = np.argsort(-np.asarray(scores))
+    ious = iou_matrix(boxes[order], boxes[order])
+    suppressed = np.zeros(len(order), dtype=bool)
+    for i in range(len(order)):
+        if suppressed[i]:
+            continue
+        suppressed[i + 1:] |= ious[i, i + 1:] > iou_threshold
+    return order[~suppressed]
+
+
+def fuse_boxes(anchor_boxes: np.ndarray, anchor_scores: np.ndarray,
+               extra_boxes: np.ndarray, extra_scores: np.ndarray,
+               iou_threshold: float = 0.5, mode: str = "wbf") -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Слияние двух наборов детекций одного класса.
+    anchor — основной набор (его порядок и индексы сохраняются),
+    extra — дополнительный; бокс extra, совпавший с anchor по IoU, поглощается:
+    - mode="nms": остаётся бокс anchor;
+    - mode="wbf": координаты усредняются с весами-уверенностями (weighted box fusion).
+    Возвращает (fused_anchor_boxes, fused_anchor_scores, индексы несовпавших extra).
+    """
+    anchor_boxes = np.asarray(anchor_boxes, dtype=np.float32).reshape(-1, 4)
+    anchor_scores = np.asarray(anchor_scores, dtype=np.float32).reshape(-1)
+    extra_boxes = np.asarray(extra_boxes, dtype=np.float32).reshape(-1, 4)
+    extra_scores = np.asarray(extra_scores, dtype=np.float32).reshape(-1)
+
+    ious = iou_matrix(extra_boxes, anchor_boxes)
+    if ious.shape[1] == 0:
+        return anchor_boxes, anchor_scores, np.arange(len(extra_boxes))
+
+    best = ious.argmax(axis=1)
+    matched = ious[np.arange(len(extra_boxes)), best] > iou_threshold
+    if mode != "wbf" or not matched.any():
+        return anchor_boxes, anchor_scores, np.flatnonzero(~matched)
+
+    # Кластер = бокс anchor + все совпавшие с ним extra
+    weights = np.zeros((len(anchor_boxes), len(extra_boxes)), dtype=np.float32)
+    weights[best[matched], np.flatnonzero(matched)] = extra_scores[matched]
+    total = anchor_scores + weights.sum(axis=1)
+    fused = (anchor_boxes * anchor_scores[:, None] + weights @ extra_boxes)
+    fused /= np.where(total > 0, total, 1.0)[:, None]
+    fused = np.where(total[:, None] > 0, fused, anchor_boxes)
+
+    cluster_max = np.where(weights > 0, weights, 0).max(axis=1)
+    scores = np.maximum(anchor_scores, cluster_max)
+    return fused, scores, np.flatnonzero(~matched)
+
+
+def greedy_match(scores: np.ndarray, threshold: float) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Жадное сопоставление один-к-одному по матрице сходства (N, M):
+    пары берутся по убыванию score, пока оба элемента свободны и score >= threshold.
+    Возвращает (индексы строк, индексы столбцов) совпавших пар.
+    """
+    rows, cols = np.nonzero(scores >= threshold)
+    order = np.argsort(-scores[rows, cols], kind="stable")
+    used_rows = np.zeros(scores.shape[0], dtype=bool)
+    used_cols = np.zeros(scores.shape[1], dtype=bool)
+    keep = []
+    for k in order:
+        r, c = rows[k], cols[k]
+        if not used_rows[r] and not used_cols[c]:
+            used_rows[r] = used_cols[c] = True
+            keep.append(k)
+    keep = np.asarray(keep, dtype=int)
+    return rows[keep], cols[keep]
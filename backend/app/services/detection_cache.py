@@ -0,0 +1,159 @@
+# backend/app/services/detection_cache.py
+import hashlib
+import json
+import os
+import shutil
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from app.core.config import settings
+from app.services.detections import CLASS_NAMES, DETECTION_DTYPE, DetectionBatch
+
+# Настройки, от которых зависят сырые детекции и кадры OCR: при их смене кеш не переиспользуется
+DETECTION_SETTINGS = (
+    "SAMPLING_MODE", "SAMPLING_TARGET_FPS", "SHARED_PREPROCESSING", "PPE_CASCADE_MODE",
+    "PERSON_FUSION_MODE", "P2_TILING", "P2_TILE_SIZE", "P2_TILE_OVERLAP", "P2_TILE_ROI",
+    "INFERENCE_BACKEND", "INFERENCE_INT8", "KEYFRAME_INTERVAL", "KEYFRAME_MIN_CONFIDENCE",
+    "KEYFRAME_NEW_OBJECT_MOTION", "TIMESTAMP_SYNC_SEC",
+    "TRACK_HIGH_THRESH", "TRACK_LOW_THRESH", "TRACK_NEW_THRESH", "TRACK_MIN_HITS",
+)
+HASH_CHUNK = 4 * 1024 * 1024
+CACHE_FORMAT = 4  # меняется вместе с форматом файлов кеша или смыслом полей (трекинг)
+WRITE_BUFFER_BYTES = 1024 * 1024
+
+
+def video_content_hash(path: str) -> str:
+    """
+    Хеш содержимого ролика: размер + начало, середина и конец файла.
+    Многочасовые архивы не читаются целиком, а переименование файла хеш не меняет.
+    """
+    size = os.path.getsize(path)
+    h = hashlib.blake2b(str(size).encode(), digest_size=16)
+    with open(path, "rb") as f:
+        for offset in (0, max(0, size // 2 - HASH_CHUNK // 2), max(0, size - HASH_CHUNK)):
+            f.seek(offset)
+            h.update(f.read(HASH_CHUNK))
+    return h.hexdigest()
+
+
+def model_version() -> str:
+    """Версия каскада: файлы весов (размер + mtime) и влияющие на детекции настройки."""
+    from app.services.detector import GodModeDetector
+
+    parts = []
+    for role, path in sorted(GodModeDetector.weight_paths().items()):
+        stat = os.stat(path) if os.path.exists(path) else None
+        parts.append(f"{role}:{os.path.basename(path)}:{stat.st_size if stat else 0}:{int(stat.st_mtime) if stat else 0}")
+    parts += [f"{name}={getattr(settings, name)}" for name in DETECTION_SETTINGS]
+    parts.append(f"format={CACHE_FORMAT}")
+    return hashlib.blake2b("|".join(parts).encode(), digest_size=8).hexdigest()
+
+
+def zones_key(video_id: int) -> str:
+    """
+    Геометрия запрещённых зон — часть ключа, если P2 режется по ним (P2_TILE_ROI=zone):
+    иначе после правки зон повтор взял бы детекции, нарезанные под старые зоны.
+    """
+    if not settings.P2_TILING or settings.P2_TILE_ROI != "zone":
+        return ""
+    from app.services.zones import RESTRICTED_ZONE_TYPES, zone_service
+
+    zones = sorted(
+        (z["name"], z["type"], z["points"]) for z in zone_service.list_zones(video_id)
+        if z["type"] in RESTRICTED_ZONE_TYPES
+    )
+    return "_z" + hashlib.blake2b(json.dumps(zones).encode(), digest_size=6).hexdigest()
+
+
+def cache_dir(video_path: str, video_id: int) -> str:
+    return os.path.join(settings.DETECTION_CACHE_DIR,
+                        f"{video_content_hash(video_path)}_{model_version()}{zones_key(video_id)}")
+
+
+def clear_cache(video_path: Optional[str] = None):
+    """Удаляет кеш ролика (все версии моделей и зон); без пути — весь кеш."""
+    root = settings.DETECTION_CACHE_DIR
+    if video_path is None:
+        shutil.rmtree(root, ignore_errors=True)
+        return
+    if not os.path.isfile(video_path) or not os.path.isdir(root):
+        return
+    prefix = video_content_hash(video_path) + "_"
+    for name in os.listdir(root):
+        if name.startswith(prefix):
+            shutil.rmtree(os.path.join(root, name), ignore_errors=True)
+
+
+class DetectionCacheWriter:
+    """
+    Пишет сырые детекции кадров (DetectionBatch) на диск по мере поступления:
+    detections.bin — подряд записи DETECTION_DTYPE, память не растёт с длиной ролика.
+    В close() дописываются только индекс (frame_ids.npy + offsets.npy) и meta.json с OCR.
+    Каталог появляется атомарно (rename), недописанный кеш никогда не читается.
+    """
+    def __init__(self, path: str):
+        self.path = path
+        self.tmp = f"{path}.{os.getpid()}.tmp"
+        shutil.rmtree(self.tmp, ignore_errors=True)
+        os.makedirs(self.tmp)
+        self._file = open(os.path.join(self.tmp, "detections.bin"), "wb", buffering=WRITE_BUFFER_BYTES)
+        self.frame_ids: List[int] = []
+        self.offsets: List[int] = [0]
+        self.ocr: Dict[str, object] = {}
+
+    def append(self, frame_id: int, detections: DetectionBatch):
+        # Байты пишутся сразу: дальше по пайплайну track_id переписываются восстановлением ID
+        self._file.write(detections.data.tobytes())
+        self.frame_ids.append(frame_id)
+        self.offsets.append(self.offsets[-1] + len(detections))
+
+    def record_ocr(self, kind: str, frame_id: int, value):
+        self.ocr[f"{kind}:{frame_id}"] = value
+
+    def close(self, meta: dict):
+        self._file.close()
+        np.save(os.path.join(self.tmp, "frame_ids.npy"), np.asarray(self.frame_ids, dtype=np.int64))
+        np.save(os.path.join(self.tmp, "offsets.npy"), np.asarray(self.offsets, dtype=np.int64))
+        meta = dict(meta, classes=list(CLASS_NAMES), ocr=self.ocr)
+        with open(os.path.join(self.tmp, "meta.json"), "w", encoding="utf-8") as f:
+            json.dump(meta, f, ensure_ascii=False)
+        shutil.rmtree(self.path, ignore_errors=True)
+        os.replace(self.tmp, self.path)
+
+    def discard(self):
+        """Задача прервана или её вход изменился — недописанный кеш удаляется."""
+        if not self._file.closed:
+            self._file.close()
+        shutil.rmtree(self.tmp, ignore_errors=True)
+
+
+class DetectionCache:
+    """Чтение кеша: массивы открываются через memmap, кадр — срез без разбора объектов."""
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(os.path.join(path, "meta.json"), encoding="utf-8") as f:
+            self.meta = json.load(f)
+        self.ocr = self.meta.get("ocr", {})
+        detections = os.path.join(path, "detections.bin")
+        # np.memmap не открывает пустой файл: ролик без единой детекции
+        self.detections = np.memmap(detections, dtype=DETECTION_DTYPE, mode="r") \
+            if os.path.getsize(detections) else np.zeros(0, dtype=DETECTION_DTYPE)
+        self.frame_ids = np.load(os.path.join(path, "frame_ids.npy"), mmap_mode="r")
+        self.offsets = np.load(os.path.join(path, "offsets.npy"), mmap_mode="r")
+
+    @classmethod
+    def open(cls, path: str) -> Optional["DetectionCache"]:
+        return cls(path) if os.path.exists(os.path.join(path, "meta.json")) else None
+
+    def __len__(self):
+        return len(self.frame_ids)
+
+    def frames(self) -> Iterator[Tuple[int, DetectionBatch]]:
+        for i, frame_id in enumerate(self.frame_ids):
+            # Копия среза: пайплайн правит track_id, а memmap открыт только на чтение
+            yield int(frame_id), DetectionBatch(np.array(self.detections[self.offsets[i]:self.offsets[i + 1]]))
+
+    def get_ocr(self, kind: str, frame_id: int):
+        return self.ocr.get(f"{kind}:{frame_id}")
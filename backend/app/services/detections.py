@@ -0,0 +1,100 @@
+# backend/app/services/detections.py
+from typing import Iterable, Optional
+
+import numpy as np
+
+# Классы — как у PPE-модели (id = индекс), люди P2/Pose идут под PERSON
+CLASS_NAMES = (
+    'boots', 'face_mask', 'face_nomask', 'glasses', 'goggles', 'hand_glove',
+    'hand_noglove', 'head_helmet', 'head_nohelmet', 'person', 'shoes', 'vest',
+)
+CLASS_IDS = {name: i for i, name in enumerate(CLASS_NAMES)}
+PERSON = CLASS_IDS['person']
+
+NO_TRACK = -2  # track_id=None (PPE); -1 — человек, которому трекер не дал ID
+NUM_KPTS = 17
+
+DETECTION_DTYPE = np.dtype([
+    ("box", np.float32, 4),
+    ("conf", np.float32),
+    ("cls", np.int16),
+    ("track_id", np.int32),
+    ("has_kpts", np.bool_),
+    ("kpts", np.float32, (NUM_KPTS, 3)),
+])
+
+
+class DetectionBatch:
+    """
+    Детекции одного кадра одним structured-массивом (DETECTION_DTYPE):
+    боксы xyxy в координатах кадра, уверенность, класс, трек и keypoints.
+    Фильтрация и индексация — маски numpy, без словаря на каждый объект.
+    """
+    __slots__ = ("data",)
+
+    def __init__(self, data: Optional[np.ndarray] = None):
+        self.data = data if data is not None else np.zeros(0, dtype=DETECTION_DTYPE)
+
+    @classmethod
+    def from_arrays(cls, boxes, conf, class_ids, track_ids=None, keypoints=None) -> "DetectionBatch":
+        n = len(conf)
+        data = np.zeros(n, dtype=DETECTION_DTYPE)
+        if n:
+            data["box"] = boxes
+            data["conf"] = conf
+            data["cls"] = class_ids
+            data["track_id"] = NO_TRACK if track_ids is None else track_ids
+            if keypoints is not None:
+                data["kpts"] = keypoints
+                data["has_kpts"] = True
+        return cls(data)
+
+    @classmethod
+    def concat(cls, batches: Iterable["DetectionBatch"]) -> "DetectionBatch":
+        parts = [b.data for b in batches if len(b)]
+        return cls(np.concatenate(parts) if parts else None)
+
+    def __len__(self):
+        return len(self.data)
+
+    def __getitem__(self, index) -> "DetectionBatch":
+        return DetectionBatch(np.atleast_1d(self.data[index]))
+
+    def copy(self) -> "DetectionBatch":
+        return DetectionBatch(self.data.copy())
+
+    @property
+    def boxes(self) -> np.ndarray:
+        return self.data["box"]
+
+    @property
+    def conf(self) -> np.ndarray:
+        return self.data["conf"]
+
+    @property
+    def cls(self) -> np.ndarray:
+        return self.data["cls"]
+
+    @property
+    def track_id(self) -> np.ndarray:
+        return self.data["track_id"]
+
+    @property
+    def has_kpts(self) -> np.ndarray:
+        return self.data["has_kpts"]
+
+    @property
+    def kpts(self) -> np.ndarray:
+        return self.data["kpts"]
+
+    @property
+    def centers(self) -> np.ndarray:
+        b = self.data["box"]
+        return np.stack([(b[:, 0] + b[:, 2]) / 2, (b[:, 1] + b[:, 3]) / 2], axis=1)
+
+    def persons(self) -> "DetectionBatch":
+        return self[self.data["cls"] == PERSON]
+
+    def objects(self) -> "DetectionBatch":
+        """Всё, кроме людей (экипировка)."""
+        return self[self.data["cls"] != PERSON]
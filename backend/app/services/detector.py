@@ -1,173 +1,466 @@
 # backend/app/services/detector.py
-from ultralytics import YOLO
+import numpy as np
 import os
+import threading
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
+from typing import Dict, Hashable, List, Optional
+
+from app.core.config import settings
+from app.services.model_registry import model_registry
+from app.services.model_runtime import load_model, resolve_device
+from app.services.box_ops import fuse_boxes, nms
+from app.services.detections import CLASS_NAMES, PERSON, DetectionBatch
+from app.services.preprocessing import FramePreprocessor, Letterbox, tile_grid
+from app.services.tracker import ObjectTracker
 
 
 class GodModeDetector:
-    def __init__(self):
+    # Входные разрешения моделей каскада
+    P2_IMGSZ = 1280
+    POSE_IMGSZ = 640
+    PPE_IMGSZ = 1280
+    PPE_CROP_IMGSZ = 320
+    # Запас вокруг человека для PPE: допуски ppe.MARGIN (40/60 px) + размер предмета
+    PPE_ROI_MARGIN = (64, 96)
+    PERSON_FUSION_IOU = 0.5
+    TILE_NMS_IOU = 0.5
+
+    @staticmethod
+    def weight_paths() -> dict:
+        """Пути к весам каскада (без загрузки моделей — нужны и для версии кеша детекций)."""
         # Определяем корневую папку проекта (Argus/)
         BASE_DIR = Path(__file__).resolve().parent.parent.parent.parent
+        return {
+            "ppe": str(BASE_DIR / 'data' / 'models' / 'argus_ppe_v12' / 'weights' / 'best.pt'),
+            "p2": str(BASE_DIR / 'scripts' / 'Argus_Train' / 'run_p2_lowmem_v215' / 'weights' / 'best.pt'),
+            "pose": 'yolo11n-pose.pt',  # Скачается автоматически
+        }
+
+    def __init__(self):
+        paths = self.weight_paths()
 
         # 1. PPE МОДЕЛЬ (Каски, жилеты, маски)
-        self.ppe_model_path = str(BASE_DIR / 'data' / 'models' / 'argus_ppe_v12' / 'weights' / 'best.pt')
+        self.ppe_model_path = paths["ppe"]
 
         if os.path.exists(self.ppe_model_path):
             print(f"⚡ LOADING PPE MODEL: {self.ppe_model_path}")
-            self.ppe_model = YOLO(self.ppe_model_path)
+            self.ppe_model = load_model(self.ppe_model_path, task="detect", imgsz=self.PPE_IMGSZ)
         else:
             print(f"⚠️ WARNING: PPE model not found at {self.ppe_model_path}")
             self.ppe_model = None
 
         # 2. P2 МОДЕЛЬ (Дальний детектор людей)
-        self.p2_model_path = str(BASE_DIR / 'scripts' / 'Argus_Train' / 'run_p2_lowmem_v215' / 'weights' / 'best.pt')
+        self.p2_model_path = paths["p2"]
 
         if os.path.exists(self.p2_model_path):
             print(f"⚡ LOADING P2 MODEL: {self.p2_model_path}")
-            self.p2_model = YOLO(self.p2_model_path)
+            self.p2_model = load_model(self.p2_model_path, task="detect", imgsz=self.P2_IMGSZ)
         else:
             print(f"⚠️ WARNING: P2 model not found at {self.p2_model_path}")
             self.p2_model = None
 
         # 3. POSE МОДЕЛЬ (Скелеты для аналитики действий)
-        self.pose_model_path = 'yolo11n-pose.pt'  # Скачается автоматически
+        self.pose_model_path = paths["pose"]
         print(f"⚡ LOADING POSE MODEL: {self.pose_model_path}")
-        self.pose_model = YOLO(self.pose_model_path)
-
-        self.class_map = {
-            0: 'boots', 1: 'face_mask', 2: 'face_nomask', 3: 'glasses',
-            4: 'goggles', 5: 'hand_glove', 6: 'hand_noglove', 7: 'head_helmet',
-            8: 'head_nohelmet', 9: 'person', 10: 'shoes', 11: 'vest'
-        }
-
-    def detect_with_slicing(self, frame, conf_threshold=0.35):
+        self.pose_model = load_model(self.pose_model_path, task="pose", imgsz=self.POSE_IMGSZ)
+
+        self.class_map = dict(enumerate(CLASS_NAMES))
+
+        # Общая предобработка: letterbox + тензор на каждое разрешение один раз на кадр
+        self.shared_preprocessing = settings.SHARED_PREPROCESSING
+        self.preprocessor = FramePreprocessor(stride=32, device=resolve_device())
+        # Каскад PPE: full — всегда весь кадр; roi — общий ROI вокруг людей;
+        # crops — батч кропов по людям. В roi/crops кадр без людей PPE не видит вовсе
+        self.ppe_cascade = settings.PPE_CASCADE_MODE
+        self.cascade_stats = Counter()
+        # Слияние людей P2 + Pose: nms — бокс Pose как есть, wbf — взвешенное усреднение
+        self.person_fusion = settings.PERSON_FUSION_MODE
+
+        # Тайлинг P2 (SAHI-подобный): перекрывающиеся тайлы одним батчем + полный кадр
+        self.tiling = settings.P2_TILING
+        self.tile_size = max(32, int(round(settings.P2_TILE_SIZE / 32)) * 32)
+        self.tile_overlap = settings.P2_TILE_OVERLAP
+
+        # Модели каскада можно гонять параллельно (torch отпускает GIL)
+        self._model_pool = ThreadPoolExecutor(max_workers=3, thread_name_prefix="cascade") \
+            if settings.PARALLEL_MODELS else None
+
+        # Трекинг вынесен из моделей: у каждого потока свой ObjectTracker (open_stream),
+        # поэтому параллельные видео делят веса, но не ID людей
+        self._streams: Dict[Hashable, ObjectTracker] = {}
+        self._streams_lock = threading.Lock()
+        # Predictor ultralytics не потокобезопасен: каскад моделей — один вызов за раз
+        self._infer_lock = threading.Lock()
+
+    @property
+    def input_sizes(self) -> List[int]:
+        sizes = [self.POSE_IMGSZ]
+        if self.p2_model is not None:
+            sizes.append(self.P2_IMGSZ)
+        if self.ppe_model is not None:
+            sizes.append(self.PPE_IMGSZ)
+        return sizes
+
+    def create_stream_tracker(self, frame_rate: int = 30) -> ObjectTracker:
+        """Отдельный трекер для одного потока (видео / сегмента / камеры)."""
+        return ObjectTracker(
+            frame_rate=frame_rate,
+            high_thresh=settings.TRACK_HIGH_THRESH,
+            low_thresh=settings.TRACK_LOW_THRESH,
+            new_track_thresh=settings.TRACK_NEW_THRESH,
+            min_hits=settings.TRACK_MIN_HITS,
+        )
+
+    def open_stream(self, stream_id: Hashable = None, frame_rate: int = 30):
+        """Новый контекст трекинга потока; повторное открытие сбрасывает его треки."""
+        with self._streams_lock:
+            self._streams[stream_id] = self.create_stream_tracker(frame_rate=frame_rate)
+
+    def close_stream(self, stream_id: Hashable = None):
+        with self._streams_lock:
+            self._streams.pop(stream_id, None)
+
+    def stream_tracker(self, stream_id: Hashable = None):
+        """Трекер потока (None — общий поток по умолчанию); создаётся при первом кадре."""
+        with self._streams_lock:
+            tracker = self._streams.get(stream_id)
+            if tracker is None:
+                tracker = self._streams[stream_id] = self.create_stream_tracker()
+            return tracker
+
+    def detect_with_slicing(self, frame, conf_threshold=0.35, roi=None, stream_id: Hashable = None) -> DetectionBatch:
         """
         Гибридный пайплайн:
-        - P2 Model: Находит ВСЕХ людей (дальние + ближние).
-        - Pose Model: Получает скелеты + трекинг.
-        - PPE Model: Находит экипировку.
+        - P2 Model: Находит ВСЕХ людей (дальние + ближние); при P2_TILING
+          дополнительно режет кадр на тайлы (только пересекающие roi, если задан).
+        - Pose Model: Получает скелеты.
+        - Трекинг: ObjectTracker потока stream_id по всем людям (Pose + P2).
+        - PPE Model: Находит экипировку (только там, где есть люди — см. PPE_CASCADE_MODE).
+        Предобработка общая: каждое разрешение готовится один раз на кадр.
+        """
+        lbs = self.preprocessor.prepare(frame, self.input_sizes) if self.shared_preprocessing else {}
+        p2_lb, pose_lb, ppe_lb = (lbs.get(self.P2_IMGSZ), lbs.get(self.POSE_IMGSZ), lbs.get(self.PPE_IMGSZ))
+
+        jobs = [
+            # 1. P2 DETECTION (Дальнобойный поиск людей)
+            lambda: self._p2_pass([frame], p2_lb.tensor if p2_lb else frame, [p2_lb], [roi])[0],
+            # 2. POSE (Люди + Скелеты), треки — ниже, трекером потока
+            lambda: self.pose_model.predict(
+                pose_lb.tensor if pose_lb else frame,
+                conf=0.5,
+                imgsz=self.POSE_IMGSZ,
+                verbose=False,
+                classes=[0]
+            )[0],
+        ]
+        if self.ppe_cascade == "full":
+            # 3. PPE DETECTION (Экипировка) — по всему кадру, параллельно с людьми
+            jobs.append(lambda: self._run_ppe(ppe_lb.tensor if ppe_lb else frame, conf_threshold))
+
+        with self._infer_lock:
+            results = self._run_models(*jobs)
+            p2, pose_results = results[0], results[1]
+
+            if self.ppe_cascade == "full":
+                ppe = self._extract_ppe(results[2][0] if results[2] else None, ppe_lb)
+            else:
+                # 3. PPE DETECTION — только вокруг найденных людей
+                persons = self._person_boxes(p2, pose_results, pose_lb)
+                ppe = self._ppe_cascade([frame], [persons], conf_threshold)[0]
+
+        return self._assemble(p2, pose_results, ppe, pose_lb, self.stream_tracker(stream_id))
+
+    def detect_batch(self, frames: List, stream_ids: List[Hashable], conf_threshold=0.35, rois=None) -> List[DetectionBatch]:
+        """
+        Батчевый вариант detect_with_slicing для нескольких потоков сразу:
+        каждая модель вызывается один раз на весь батч, а трекинг делается
+        трекером своего потока (stream_ids[i] для frames[i]).
+        Тайлы P2 всех кадров батча тоже уходят в модель одним вызовом.
         """
+        if not frames:
+            return []
+        rois = rois or [None] * len(frames)
 
-        combined_detections = []
+        lbs = [self.preprocessor.prepare(f, self.input_sizes) for f in frames] if self.shared_preprocessing else []
 
-        # 1. P2 DETECTION (Дальнобойный поиск людей)
-        # Если P2 модель есть, используем её для первичного поиска
-        people_boxes = []
+        def source(size):
+            # Кадры разных камер разного размера в один тензор не сложить — отдаём numpy
+            batch = FramePreprocessor.stack([lb[size] for lb in lbs]) if lbs else None
+            return batch if batch is not None else frames
 
-        if self.p2_model is not None:
-            p2_results = self.p2_model(
-                frame,
-                conf=0.25,
-                imgsz=1280,
+        p2_src, pose_src, ppe_src = source(self.P2_IMGSZ), source(self.POSE_IMGSZ), source(self.PPE_IMGSZ)
+
+        def lb_for(i, size, src):
+            return lbs[i][size] if src is not frames else None
+
+        jobs = [
+            lambda: self._p2_pass(frames, p2_src, [lb_for(i, self.P2_IMGSZ, p2_src) for i in range(len(frames))], rois),
+            lambda: self.pose_model.predict(
+                pose_src,
+                conf=0.5,
+                imgsz=self.POSE_IMGSZ,
                 verbose=False,
-                classes=[0]  # Только люди
-            )[0]
-
-            if p2_results.boxes:
-                people_boxes = p2_results.boxes.xyxy.cpu().numpy()
-
-        # 2. POSE TRACKING (Люди + Скелеты)
-        # Используем Pose модель для трекинга людей + скелеты
-        pose_results = self.pose_model.track(
-            frame,
-            persist=True,
-            tracker="bytetrack.yaml",
-            conf=0.5,
-            imgsz=640,
+                classes=[0]
+            ),
+        ]
+        if self.ppe_cascade == "full":
+            jobs.append(lambda: self._run_ppe(ppe_src, conf_threshold))
+        with self._infer_lock:
+            results = self._run_models(*jobs)
+            p2_batch, pose_batch = results[0], results[1]
+
+            if self.ppe_cascade == "full":
+                ppe_batch = [
+                    self._extract_ppe(results[2][i] if results[2] else None, lb_for(i, self.PPE_IMGSZ, ppe_src))
+                    for i in range(len(frames))
+                ]
+            else:
+                persons = [
+                    self._person_boxes(p2_batch[i], pose_batch[i], lb_for(i, self.POSE_IMGSZ, pose_src))
+                    for i in range(len(frames))
+                ]
+                ppe_batch = self._ppe_cascade(frames, persons, conf_threshold)
+
+        batch_detections = []
+        for i, frame in enumerate(frames):
+            batch_detections.append(self._assemble(
+                p2_batch[i],
+                pose_batch[i],
+                ppe_batch[i],
+                lb_for(i, self.POSE_IMGSZ, pose_src),
+                self.stream_tracker(stream_ids[i]),
+            ))
+        return batch_detections
+
+    def _p2_pass(self, frames: List, source, lbs: List, rois: List):
+        """
+        P2 по полным кадрам (+ тайлы при P2_TILING).
+        Возвращает для каждого кадра (boxes, conf) в координатах кадра или None.
+        """
+        results = self._run_p2(source)
+        p2 = [self._extract_p2(results[i] if results else None, lbs[i]) for i in range(len(frames))]
+        if self.tiling and self.p2_model is not None:
+            p2 = self._tile_p2(frames, p2, rois)
+        return p2
+
+    def _tile_p2(self, frames: List, p2: List, rois: List):
+        """
+        Тайловый проход P2: перекрывающиеся тайлы всех кадров одним батчем
+        в родном разрешении тайла, слияние с полным кадром через NMS.
+        """
+        tiles, owners = [], []  # owners: (индекс кадра, x0, y0)
+        for i, frame in enumerate(frames):
+            h, w = frame.shape[:2]
+            for x0, y0, x1, y1 in tile_grid(w, h, self.tile_size, self.tile_overlap, rois[i]):
+                tiles.append(frame[y0:y1, x0:x1])
+                owners.append((i, x0, y0))
+        if not tiles:
+            return p2
+
+        self.cascade_stats["p2_tiles"] += len(tiles)
+        source = self.preprocessor.tiles_to_tensor(tiles) if self.shared_preprocessing else tiles
+        results = self.p2_model(source, conf=0.25, imgsz=self.tile_size, verbose=False, classes=[0])
+
+        parts = defaultdict(list)
+        for i, item in enumerate(p2):
+            if item is not None:
+                parts[i].append(item)
+        for r, (i, x0, y0) in zip(results, owners):
+            if r.boxes:
+                boxes = r.boxes.xyxy.cpu().numpy() + np.array([x0, y0, x0, y0], dtype=np.float32)
+                parts[i].append((boxes, r.boxes.conf.cpu().numpy()))
+
+        out = list(p2)
+        for i, items in parts.items():
+            boxes = np.concatenate([b for b, _ in items])
+            conf = np.concatenate([c for _, c in items])
+            keep = nms(boxes, conf, self.TILE_NMS_IOU)
+            out[i] = (boxes[keep], conf[keep])
+        return out
+
+    def _person_boxes(self, p2, pose_results, pose_lb=None) -> np.ndarray:
+        """Все боксы людей (P2 + Pose) в координатах кадра — для гейта PPE."""
+        parts = []
+        if p2 is not None:
+            parts.append(p2[0])
+        if pose_results is not None and pose_results.boxes:
+            parts.append(_to_frame_boxes(pose_lb, pose_results.boxes.xyxy.cpu().numpy()))
+        return np.concatenate(parts) if parts else np.zeros((0, 4), dtype=np.float32)
+
+    def _ppe_regions(self, persons: np.ndarray, frame_shape) -> np.ndarray:
+        """Области кадра для PPE: общий ROI всех людей или отдельный кроп на человека."""
+        h, w = frame_shape[:2]
+        mx, my = self.PPE_ROI_MARGIN
+        if self.ppe_cascade == "roi":
+            persons = np.array([[persons[:, 0].min(), persons[:, 1].min(),
+                                 persons[:, 2].max(), persons[:, 3].max()]])
+        regions = persons + np.array([-mx, -my, mx, my], dtype=np.float32)
+        regions[:, [0, 2]] = regions[:, [0, 2]].clip(0, w)
+        regions[:, [1, 3]] = regions[:, [1, 3]].clip(0, h)
+        return regions.astype(int)
+
+    def _ppe_cascade(self, frames: List, persons_per_frame: List[np.ndarray], conf_threshold):
+        """
+        Каскад PPE: кадры без людей пропускаются целиком, для остальных модель
+        запускается одним батчем по кропам (общий ROI или кроп на человека).
+        Возвращает для каждого кадра (boxes, cls, conf) в координатах кадра или None.
+        """
+        out = [None] * len(frames)
+        if self.ppe_model is None:
+            return out
+
+        crops, owners = [], []  # owners: (индекс кадра, x0, y0)
+        for i, (frame, persons) in enumerate(zip(frames, persons_per_frame)):
+            if len(persons) == 0:
+                self.cascade_stats["ppe_skipped"] += 1
+                continue
+            for x0, y0, x1, y1 in self._ppe_regions(persons, frame.shape):
+                if x1 - x0 < 8 or y1 - y0 < 8:
+                    continue
+                crops.append(frame[y0:y1, x0:x1])
+                owners.append((i, x0, y0))
+
+        if not crops:
+            return out
+
+        if self.ppe_cascade == "roi":
+            # Та же плотность пикселей, что и при полном кадре на PPE_IMGSZ
+            scale = max(self.PPE_IMGSZ / max(f.shape[:2]) for f in frames)
+            side = max(max(c.shape[:2]) for c in crops) * scale
+            imgsz = min(self.PPE_IMGSZ, max(64, int(np.ceil(side / 32)) * 32))
+        else:
+            imgsz = self.PPE_CROP_IMGSZ
+
+        self.cascade_stats["ppe_runs"] += 1
+        self.cascade_stats["ppe_crops"] += len(crops)
+        results = self.ppe_model(crops, conf=conf_threshold, imgsz=imgsz, verbose=False)
+
+        parts = defaultdict(list)
+        for r, (i, x0, y0) in zip(results, owners):
+            if not r.boxes:
+                continue
+            boxes = r.boxes.xyxy.cpu().numpy() + np.array([x0, y0, x0, y0], dtype=np.float32)
+            parts[i].append((boxes, r.boxes.cls.cpu().numpy().astype(int), r.boxes.conf.cpu().numpy()))
+
+        for i, items in parts.items():
+            boxes = np.concatenate([b for b, _, _ in items])
+            cls = np.concatenate([c for _, c, _ in items])
+            conf = np.concatenate([c for _, _, c in items])
+            if len(items) > 1:
+                # Кропы соседних людей перекрываются — убираем дубликаты
+                keep = nms(boxes, conf, 0.5, classes=cls)
+                boxes, cls, conf = boxes[keep], cls[keep], conf[keep]
+            out[i] = (boxes, cls, conf)
+        return out
+
+    @staticmethod
+    def _extract_p2(p2_results, p2_lb=None):
+        if p2_results is None or not p2_results.boxes:
+            return None
+        return (
+            _to_frame_boxes(p2_lb, p2_results.boxes.xyxy.cpu().numpy()),
+            p2_results.boxes.conf.cpu().numpy(),
+        )
+
+    @staticmethod
+    def _extract_ppe(ppe_results, ppe_lb=None):
+        if ppe_results is None or not ppe_results.boxes:
+            return None
+        return (
+            _to_frame_boxes(ppe_lb, ppe_results.boxes.xyxy.cpu().numpy()),
+            ppe_results.boxes.cls.cpu().numpy().astype(int),
+            ppe_results.boxes.conf.cpu().numpy(),
+        )
+
+    def _run_models(self, *jobs):
+        """Запускает модели каскада последовательно или параллельно (PARALLEL_MODELS)."""
+        if self._model_pool is None:
+            return [job() for job in jobs]
+        futures = [self._model_pool.submit(job) for job in jobs]
+        return [f.result() for f in futures]
+
+    def _run_p2(self, source):
+        # Если P2 модель есть, используем её для первичного поиска
+        if self.p2_model is None:
+            return None
+        return self.p2_model(
+            source,
+            conf=0.25,
+            imgsz=self.P2_IMGSZ,
             verbose=False,
-            classes=[0]
-        )[0]
+            classes=[0]  # Только люди
+        )
+
+    def _run_ppe(self, source, conf_threshold):
+        if self.ppe_model is None:
+            return None
+        return self.ppe_model(
+            source,
+            conf=conf_threshold,
+            imgsz=self.PPE_IMGSZ,
+            verbose=False
+        )
+
+    def _assemble(self, p2, pose_results, ppe, pose_lb=None,
+                  tracker: Optional[ObjectTracker] = None) -> DetectionBatch:
+        """
+        Собирает детекции всех моделей в координатах исходного кадра.
+        pose_lb — letterbox, на котором считала Pose (None — модель видела сам кадр).
+        p2 — (boxes, conf), ppe — (boxes, cls, conf) уже в координатах кадра или None.
+        tracker — трекер потока: ID получают все люди, включая дальних из P2.
+        """
+        parts = []
 
-        # Собираем ЛЮДЕЙ из Pose модели (они будут иметь скелеты + ID)
+        # Собираем ЛЮДЕЙ из Pose модели (они будут иметь скелеты)
+        pose_boxes = np.zeros((0, 4), dtype=np.float32)
+        pose_conf = np.zeros(0, dtype=np.float32)
         if pose_results.boxes:
-            boxes = pose_results.boxes.xyxy.cpu().numpy()
-            track_ids = pose_results.boxes.id.cpu().numpy() if pose_results.boxes.id is not None else [-1] * len(boxes)
+            pose_boxes = _to_frame_boxes(pose_lb, pose_results.boxes.xyxy.cpu().numpy())
+            pose_conf = pose_results.boxes.conf.cpu().numpy()
+
+        # Люди из P2 (дальние планы) — со своими уверенностями
+        p2_boxes = np.zeros((0, 4), dtype=np.float32)
+        p2_conf = np.zeros(0, dtype=np.float32)
+        if p2 is not None:
+            p2_boxes, p2_conf = p2
+
+        # Одно векторное слияние вместо попарного IoU: P2, совпавшие с Pose,
+        # поглощаются (nms) или уточняют бокс Pose (wbf); остальные добавляются
+        fused_boxes, fused_conf, p2_only = fuse_boxes(
+            pose_boxes, pose_conf, p2_boxes, p2_conf,
+            iou_threshold=self.PERSON_FUSION_IOU, mode=self.person_fusion,
+        )
+
+        if len(pose_boxes):
             keypoints = pose_results.keypoints.data.cpu().numpy() if pose_results.keypoints is not None else None
+            if keypoints is not None and pose_lb is not None:
+                keypoints = pose_lb.points_to_frame(keypoints)
+            parts.append(DetectionBatch.from_arrays(fused_boxes, fused_conf, PERSON, -1, keypoints))
 
-            for i, box in enumerate(boxes):
-                track_id = int(track_ids[i])
-                kpts = keypoints[i].tolist() if keypoints is not None else None
-
-                combined_detections.append({
-                    "class_name": "person",
-                    "bbox": box.astype(int).tolist(),
-                    "confidence": float(pose_results.boxes.conf[i]),
-                    "track_id": track_id,
-                    "keypoints": kpts
-                })
-
-        # Добавляем людей из P2, которых не нашла Pose (дальние планы)
-        if len(people_boxes) > 0:
-            # Простая фильтрация дубликатов по IoU
-            existing_boxes = [d['bbox'] for d in combined_detections if d['class_name'] == 'person']
-            for p2_box in people_boxes:
-                is_duplicate = False
-                for ex_box in existing_boxes:
-                    # Проверка пересечения (упрощенная)
-                    iou = self._calculate_iou(p2_box, ex_box)
-                    if iou > 0.5:
-                        is_duplicate = True
-                        break
-
-                if not is_duplicate:
-                    combined_detections.append({
-                        "class_name": "person",
-                        "bbox": p2_box.astype(int).tolist(),
-                        "confidence": 0.0,  # P2 не имеет conf в этом контексте
-                        "track_id": -1,
-                        "keypoints": None
-                    })
-
-        # 3. PPE DETECTION (Экипировка)
-        if self.ppe_model is not None:
-            ppe_results = self.ppe_model(
-                frame,
-                conf=conf_threshold,
-                imgsz=1280,
-                verbose=False
-            )[0]
-
-            if ppe_results.boxes:
-                for box in ppe_results.boxes:
-                    cls_id = int(box.cls[0])
-                    cls_name = self.class_map.get(cls_id, "unknown")
-
-                    # Людей берем только из Pose/P2 моделей
-                    if cls_name == 'person':
-                        continue
-
-                    x1, y1, x2, y2 = box.xyxy[0].cpu().numpy().astype(int)
-
-                    combined_detections.append({
-                        "class_name": cls_name,
-                        "bbox": [x1, y1, x2, y2],
-                        "confidence": float(box.conf[0]),
-                        "track_id": None,
-                        "keypoints": None
-                    })
-
-        return combined_detections
+        if len(p2_only):
+            parts.append(DetectionBatch.from_arrays(p2_boxes[p2_only], p2_conf[p2_only], PERSON, -1))
 
-    def _calculate_iou(self, box1, box2):
-        """Простой расчет IoU для фильтрации дубликатов"""
-        x1_min, y1_min, x1_max, y1_max = box1[:4]
-        x2_min, y2_min, x2_max, y2_max = box2[:4]
+        if tracker is not None:
+            persons = DetectionBatch.concat(parts)
+            persons.data["track_id"] = tracker.update(persons.boxes, persons.conf)
+            parts = [persons]
 
-        inter_xmin = max(x1_min, x2_min)
-        inter_ymin = max(y1_min, y2_min)
-        inter_xmax = min(x1_max, x2_max)
-        inter_ymax = min(y1_max, y2_max)
+        if ppe is not None:
+            ppe_boxes, ppe_cls, ppe_conf = ppe
+            # Людей берем только из Pose/P2 моделей
+            keep = (ppe_cls != PERSON) & (ppe_cls >= 0) & (ppe_cls < len(CLASS_NAMES))
+            parts.append(DetectionBatch.from_arrays(ppe_boxes[keep], ppe_conf[keep], ppe_cls[keep]))
 
-        if inter_xmax < inter_xmin or inter_ymax < inter_ymin:
-            return 0.0
+        return DetectionBatch.concat(parts)
 
-        inter_area = (inter_xmax - inter_xmin) * (inter_ymax - inter_ymin)
-        box1_area = (x1_max - x1_min) * (y1_max - y1_min)
-        box2_area = (x2_max - x2_min) * (y2_max - y2_min)
-        union_area = box1_area + box2_area - inter_area
 
-        return inter_area / union_area if union_area > 0 else 0.0
+def _to_frame_boxes(lb: Optional[Letterbox], xyxy):
+    return lb.boxes_to_frame(xyxy) if lb is not None else xyxy
 
 
 # Singleton
-detector_instance = GodModeDetector()
+def get_detector() -> GodModeDetector:
+    """Общий детектор процесса: грузится при первом обращении или прогревом (model_registry)."""
+    return model_registry.get("detector")
@@ -0,0 +1,278 @@
+# backend/app/services/frame_reader.py
+import cv2
+import threading
+import numpy as np
+from typing import Iterator, List, Optional, Tuple
+
+
+class FrameRingBuffer:
+    """
+    Кольцевой буфер предвыделенных кадров между декодером и анализом.
+    - Декодер пишет прямо в слоты (без аллокаций на каждый кадр).
+    - Потребитель держит не больше одного слота, пока обрабатывает кадр.
+    """
+    def __init__(self, capacity: int = 8):
+        self.capacity = max(2, capacity)
+        self.slots: List[np.ndarray] = []
+        self.frame_ids: List[int] = [0] * self.capacity
+        self._head = 0   # следующий слот для записи
+        self._tail = 0   # следующий слот для чтения
+        self._count = 0  # заполненные слоты (включая удерживаемый потребителем)
+        self._closed = False
+        self._cond = threading.Condition()
+
+    def allocate(self, shape: Tuple[int, ...], dtype=np.uint8):
+        self.slots = [np.empty(shape, dtype=dtype) for _ in range(self.capacity)]
+
+    def acquire_write(self) -> Optional[int]:
+        """Ждёт свободный слот. None — буфер закрыт."""
+        with self._cond:
+            while self._count >= self.capacity and not self._closed:
+                self._cond.wait()
+            if self._closed:
+                return None
+            return self._head
+
+    def commit_write(self, frame_id: int):
+        with self._cond:
+            self.frame_ids[self._head] = frame_id
+            self._head = (self._head + 1) % self.capacity
+            self._count += 1
+            self._cond.notify_all()
+
+    def acquire_read(self) -> Optional[int]:
+        """Ждёт готовый кадр. None — декодер закончил и буфер пуст."""
+        with self._cond:
+            while self._count == 0 and not self._closed:
+                self._cond.wait()
+            if self._count == 0:
+                return None
+            return self._tail
+
+    def release_read(self):
+        with self._cond:
+            self._tail = (self._tail + 1) % self.capacity
+            self._count -= 1
+            self._cond.notify_all()
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+
+class ThreadedFrameReader:
+    """
+    Декодирует видео в отдельном потоке и складывает кадры в FrameRingBuffer.
+    cv2 отпускает GIL на время декодирования, поэтому декод идёт параллельно
+    с инференсом в основном потоке.
+    """
+    def __init__(self, source, buffer_size: int = 8, start_frame: int = 0, end_frame: Optional[int] = None,
+                 sampler=None):
+        self.source = source
+        self.cap = cv2.VideoCapture(source)
+        # frame_id у нас 1-based: после seek на позицию N первый кадр имеет id N+1
+        self.start_frame = start_frame
+        self.end_frame = end_frame
+        if start_frame > 0:
+            self.cap.set(cv2.CAP_PROP_POS_FRAMES, start_frame)
+        self.width = int(self.cap.get(cv2.CAP_PROP_FRAME_WIDTH)) or 1920
+        self.height = int(self.cap.get(cv2.CAP_PROP_FRAME_HEIGHT)) or 1080
+        self.fps = self.cap.get(cv2.CAP_PROP_FPS) or 25
+        # Сэмплер решает в потоке декодера, какие кадры декодировать (см. frame_sampler)
+        self.sampler = sampler
+        if sampler is not None:
+            sampler.set_fps(self.fps)
+        self.buffer = FrameRingBuffer(buffer_size)
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+    def start(self) -> "ThreadedFrameReader":
+        self._thread = threading.Thread(target=self._decode_loop, name="frame-decoder", daemon=True)
+        self._thread.start()
+        return self
+
+    def _decode_loop(self):
+        frame_id = self.start_frame
+        try:
+            while not self._stop.is_set():
+                if self.end_frame is not None and frame_id >= self.end_frame:
+                    break
+                frame_id += 1
+
+                # Кадр не нужен анализу — только grab(), без декодирования
+                if self.sampler is not None and not self.sampler.should_decode(frame_id):
+                    if not self.cap.grab():
+                        break
+                    self.sampler.grabbed += 1
+                    continue
+
+                idx = self.buffer.acquire_write()
+                if idx is None:
+                    break
+
+                if not self.buffer.slots:
+                    # Первый декодированный кадр определяет реальный размер слотов
+                    ret, img = self.cap.read()
+                    if not ret:
+                        break
+                    self.buffer.allocate(img.shape, img.dtype)
+                    np.copyto(self.buffer.slots[idx], img)
+                else:
+                    slot = self.buffer.slots[idx]
+                    ret, img = self.cap.read(slot)
+                    if not ret:
+                        break
+                    if img is not slot:
+                        # Поток сменил разрешение — переразмещать буфер не будем
+                        if img.shape != slot.shape:
+                            img = cv2.resize(img, (slot.shape[1], slot.shape[0]))
+                        np.copyto(slot, img)
+
+                if self.sampler is not None:
+                    self.sampler.decoded += 1
+                    self.sampler.observe(frame_id, self.buffer.slots[idx])
+                self.buffer.commit_write(frame_id)
+        finally:
+            self.buffer.close()
+
+    def frames(self) -> Iterator[Tuple[int, np.ndarray]]:
+        """
+        Выдаёт (frame_id, frame). Кадр — это слот буфера: он валиден только
+        до следующей итерации, копируйте, если нужно хранить дольше.
+        """
+        while True:
+            idx = self.buffer.acquire_read()
+            if idx is None:
+                return
+            try:
+                yield self.buffer.frame_ids[idx], self.buffer.slots[idx]
+            finally:
+                self.buffer.release_read()
+
+    def release(self):
+        self._stop.set()
+        self.buffer.close()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+        self.cap.release()
+
+
+class LiveFrameReader:
+    """
+    Чтение живого потока (RTSP / USB-камера) по принципу "последний кадр побеждает".
+    - Поток-читатель постоянно вычитывает камеру, чтобы не копилась задержка.
+    - Если анализ не успевает, старые кадры затираются и считаются в frames_dropped.
+    - При обрыве — переподключение с экспоненциальной паузой.
+    Тройная буферизация: back (пишет читатель) / latest / front (у потребителя),
+    кадры меняются местами без копирования.
+    """
+    def __init__(self, source, reconnect_delay: float = 1.0, max_reconnect_delay: float = 30.0):
+        # "0", "1" -> индекс устройства, остальное — URL
+        self.source = int(source) if isinstance(source, str) and source.isdigit() else source
+        self.reconnect_delay = reconnect_delay
+        self.max_reconnect_delay = max_reconnect_delay
+        self.width, self.height, self.fps = 1920, 1080, 25
+
+        self.frames_read = 0
+        self.frames_dropped = 0
+        self.reconnects = 0
+        self.connected = False
+
+        self._back: Optional[np.ndarray] = None
+        self._latest: Optional[np.ndarray] = None
+        self._front: Optional[np.ndarray] = None
+        self._latest_id = 0
+        self._has_new = False
+        self._cond = threading.Condition()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> "LiveFrameReader":
+        self._thread = threading.Thread(target=self._read_loop, name="live-reader", daemon=True)
+        self._thread.start()
+        return self
+
+    def _open(self):
+        cap = cv2.VideoCapture(self.source)
+        if not cap.isOpened():
+            cap.release()
+            return None
+        self.width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)) or self.width
+        self.height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)) or self.height
+        self.fps = cap.get(cv2.CAP_PROP_FPS) or self.fps
+        return cap
+
+    def _read_loop(self):
+        delay = self.reconnect_delay
+        while not self._stop.is_set():
+            cap = self._open()
+            if cap is None:
+                print(f"⚠️ LIVE: cannot open {self.source}, retry in {delay:.1f}s")
+                self._stop.wait(delay)
+                delay = min(delay * 2, self.max_reconnect_delay)
+                self.reconnects += 1
+                continue
+
+            self.connected = True
+            try:
+                while not self._stop.is_set():
+                    ret, img = cap.read(self._back)
+                    if not ret:
+                        break
+                    self._back = img
+                    delay = self.reconnect_delay
+                    self._publish()
+            finally:
+                self.connected = False
+                cap.release()
+
+            if not self._stop.is_set():
+                print(f"⚠️ LIVE: stream {self.source} lost, reconnect in {delay:.1f}s")
+                self._stop.wait(delay)
+                delay = min(delay * 2, self.max_reconnect_delay)
+                self.reconnects += 1
+
+        with self._cond:
+            self._cond.notify_all()
+
+    def _publish(self):
+        with self._cond:
+            self._back, self._latest = self._latest, self._back
+            self.frames_read += 1
+            if self._has_new:
+                # Предыдущий кадр так и не забрали — он устарел
+                self.frames_dropped += 1
+            self._latest_id = self.frames_read
+            self._has_new = True
+            self._cond.notify_all()
+
+    def next_frame(self, timeout: float = 1.0) -> Optional[Tuple[int, np.ndarray]]:
+        """
+        Забирает самый свежий кадр (блокирует до timeout).
+        Возвращённый массив валиден до следующего вызова.
+        """
+        with self._cond:
+            if not self._has_new:
+                self._cond.wait(timeout)
+            if not self._has_new:
+                return None
+            self._front, self._latest = self._latest, self._front
+            self._has_new = False
+            return self._latest_id, self._front
+
+    def stats(self) -> dict:
+        return {
+            "source": str(self.source),
+            "connected": self.connected,
+            "frames_read": self.frames_read,
+            "frames_dropped": self.frames_dropped,
+            "reconnects": self.reconnects,
+        }
+
+    def release(self):
+        self._stop.set()
+        with self._cond:
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
@@ -0,0 +1,124 @@
+# backend/app/services/frame_sampler.py
+import math
+import cv2
+import numpy as np
+
+
+class FixedFrameSampler:
+    """Классическое прореживание: анализируем каждый stride-й кадр."""
+    def __init__(self, stride: int = 3):
+        self.stride = max(1, stride)
+        self.decoded = 0
+        self.grabbed = 0
+
+    def set_fps(self, fps: float):
+        pass
+
+    def should_decode(self, frame_id: int) -> bool:
+        return frame_id % self.stride == 0
+
+    def observe(self, frame_id: int, frame: np.ndarray):
+        pass
+
+    def stats(self) -> dict:
+        return {"mode": "fixed", "stride": self.stride, "decoded": self.decoded, "grabbed": self.grabbed}
+
+
+class AdaptiveFrameSampler:
+    """
+    Адаптивное прореживание по энергии движения.
+    - Энергия движения: доля изменившихся пикселей на маленькой серой копии кадра
+      относительно предыдущего декодированного кадра.
+    - Пустой/статичный двор -> шаг растёт до max_stride (редкий анализ),
+      движение людей -> шаг падает до min_stride (плотный анализ).
+    - Бюджет target_fps: "токены" копятся со временем видео (до burst_sec секунд
+      запаса), каждый анализируемый кадр тратит один. Пока токенов нет, шаг
+      не опускается ниже того, что бюджет может оплатить.
+    Вызывается из потока декодера: пропущенные кадры только grab(), без декода.
+    """
+    THUMB_SIZE = (160, 90)
+    PIXEL_DIFF_THRESHOLD = 25
+
+    def __init__(
+        self,
+        base_stride: int = 3,
+        min_stride: int = 1,
+        max_stride_sec: float = 1.0,
+        target_fps: float = 6.0,
+        burst_sec: float = 5.0,
+        motion_low: float = 0.003,
+        motion_high: float = 0.02,
+    ):
+        self.base_stride = base_stride
+        self.min_stride = min_stride
+        self.max_stride_sec = max_stride_sec
+        self.target_fps = target_fps
+        self.burst_sec = burst_sec
+        self.motion_low = motion_low
+        self.motion_high = motion_high
+
+        self.fps = 25.0
+        self.max_stride = max(base_stride, int(self.fps * max_stride_sec))
+        self.stride = base_stride
+        self.tokens = target_fps * burst_sec
+        self.motion = 0.0
+
+        self._prev_thumb = None
+        self._last_frame_id = 0
+        self._next_decode = 0
+        self.decoded = 0
+        self.grabbed = 0
+
+    def set_fps(self, fps: float):
+        self.fps = fps or 25.0
+        self.max_stride = max(self.base_stride, int(self.fps * self.max_stride_sec))
+
+    def should_decode(self, frame_id: int) -> bool:
+        return frame_id >= self._next_decode
+
+    def motion_energy(self, frame: np.ndarray) -> float:
+        thumb = cv2.resize(frame, self.THUMB_SIZE, interpolation=cv2.INTER_AREA)
+        thumb = cv2.cvtColor(thumb, cv2.COLOR_BGR2GRAY)
+        thumb = cv2.GaussianBlur(thumb, (5, 5), 0)
+        prev, self._prev_thumb = self._prev_thumb, thumb
+        if prev is None:
+            return 1.0  # первый кадр — считаем "движение", чтобы начать плотно
+        diff = cv2.absdiff(thumb, prev)
+        return float(np.count_nonzero(diff > self.PIXEL_DIFF_THRESHOLD)) / diff.size
+
+    def observe(self, frame_id: int, frame: np.ndarray):
+        """Вызывается для каждого декодированного кадра: пересчитывает шаг."""
+        # Сглаживаем, чтобы шаг не "дребезжал" между соседними кадрами
+        energy = self.motion_energy(frame)
+        self.motion = energy if self._last_frame_id == 0 else 0.5 * self.motion + 0.5 * energy
+
+        if self.motion >= self.motion_high:
+            stride = self.min_stride
+        elif self.motion <= self.motion_low:
+            stride = min(self.max_stride, self.stride * 2)
+        else:
+            stride = self.base_stride
+
+        # Бюджет: начисляем токены за прошедшее время видео, списываем за этот кадр
+        elapsed = frame_id - self._last_frame_id
+        self._last_frame_id = frame_id
+        self.tokens = min(self.tokens + elapsed / self.fps * self.target_fps,
+                          self.target_fps * self.burst_sec)
+        self.tokens -= 1.0
+        if self.tokens < 1.0:
+            wait_frames = math.ceil((1.0 - self.tokens) * self.fps / self.target_fps)
+            stride = max(stride, wait_frames)
+
+        self.stride = max(self.min_stride, min(stride, self.max_stride))
+        self._next_decode = frame_id + self.stride
+
+    def stats(self) -> dict:
+        total = self.decoded + self.grabbed
+        return {
+            "mode": "adaptive",
+            "stride": self.stride,
+            "motion": round(self.motion, 4),
+            "decoded": self.decoded,
+            "grabbed": self.grabbed,
+            "analyzed_ratio": round(self.decoded / total, 3) if total else 0.0,
+        }
@@ -0,0 +1,69 @@
+# backend/app/services/ghost_tracks.py
+from collections import OrderedDict
+from typing import Dict, Optional, Set, Tuple
+
+
+class GhostTrackStore:
+    """
+    Последние позиции треков ("призраки") для восстановления ID после обрыва трекинга.
+    - Запись живёт ttl кадров с последнего обновления, затем вытесняется
+      (OrderedDict в порядке обновления: протухшие всегда в начале).
+    - Поиск ближайшего призрака в радиусе идёт по равномерной сетке с ячейкой = радиус:
+      достаточно проверить 3x3 соседних ячейки.
+    Стоимость кадра зависит от числа живых треков, а не от длины ролика.
+    """
+    def __init__(self, ttl: int = 30, radius: float = 150.0):
+        self.ttl = ttl
+        self.radius = radius
+        self._tracks: "OrderedDict[int, Tuple[float, float, int]]" = OrderedDict()
+        self._grid: Dict[Tuple[int, int], Set[int]] = {}
+
+    def __len__(self):
+        return len(self._tracks)
+
+    def __contains__(self, track_id: int):
+        return track_id in self._tracks
+
+    def _cell(self, x: float, y: float) -> Tuple[int, int]:
+        return int(x // self.radius), int(y // self.radius)
+
+    def _remove(self, track_id: int):
+        x, y, _ = self._tracks.pop(track_id)
+        cell = self._cell(x, y)
+        bucket = self._grid[cell]
+        bucket.discard(track_id)
+        if not bucket:
+            del self._grid[cell]
+
+    def evict(self, frame_id: int):
+        """Выбрасывает треки, не обновлявшиеся ttl кадров и больше."""
+        while self._tracks:
+            track_id, (_, _, last_frame) = next(iter(self._tracks.items()))
+            if frame_id - last_frame < self.ttl:
+                break
+            self._remove(track_id)
+
+    def update(self, track_id: int, x: float, y: float, frame_id: int):
+        if track_id in self._tracks:
+            self._remove(track_id)
+        self._tracks[track_id] = (x, y, frame_id)
+        self._grid.setdefault(self._cell(x, y), set()).add(track_id)
+
+    def nearest(self, x: float, y: float, frame_id: int) -> Optional[int]:
+        """Ближайший живой призрак строго ближе radius или None."""
+        self.evict(frame_id)
+        cx, cy = self._cell(x, y)
+        best, best_dist = None, self.radius
+        for gx in (cx - 1, cx, cx + 1):
+            for gy in (cy - 1, cy, cy + 1):
+                for track_id in self._grid.get((gx, gy), ()):
+                    tx, ty, _ = self._tracks[track_id]
+                    dist = ((x - tx) ** 2 + (y - ty) ** 2) ** 0.5
+                    # При равенстве — меньший ID (детерминированно, независимо от порядка в ячейке)
+                    if dist < best_dist or (dist == best_dist and best is not None and track_id < best):
+                        best, best_dist = track_id, dist
+        return best
+
+    def clear(self):
+        self._tracks.clear()
+        self._grid.clear()
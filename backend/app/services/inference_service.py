@@ -6,10 +6,12 @@ import threading
 import os
 import numpy as np
 from datetime import datetime
-from ultralytics import YOLO
 from sahi import AutoDetectionModel
 from sahi.predict import get_sliced_prediction
 
+from app.services.activity import classify_poses
+from app.services.model_runtime import load_model, resolve_device
+
 # ================= КОНФИГУРАЦИЯ МОДЕЛЕЙ =================
 MODEL_P2_PATH = r'../scripts/Argus_Train/run_p2_lowmem_v215/weights/best.pt'
 MODEL_PPE_PATH = r'../data/models/argus_ppe_v12/weights/best.pt'
@@ -76,23 +78,8 @@ def enhance_image(image):
 def classify_pose(keypoints):
     if keypoints is None or len(keypoints) == 0:
         return "Unknown"
-    kps = keypoints[0] if len(keypoints.shape) > 1 else keypoints
-    nose = kps[0]
-    left_shoulder = kps[5]
-    right_shoulder = kps[6]
-    left_hip = kps[11]
-    right_hip = kps[12]
-    visible = sum([1 for kp in [nose, left_shoulder, right_shoulder, left_hip, right_hip]
-                   if len(kp) > 2 and kp[2] > 0.5])
-    if visible < 3:
-        return "Unknown"
-    if len(nose) > 1 and len(left_hip) > 1:
-        vertical_diff = left_hip[1] - nose[1]
-        if vertical_diff < 20:
-            return "Fallen"
-        if len(left_shoulder) > 1 and left_shoulder[1] < nose[1] - 30:
-            return "Working"
-    return "Standing"
+    kps = keypoints[0] if len(keypoints.shape) > 2 else keypoints
+    return classify_poses(kps)[0]
 
 
 # ================= ИНИЦИАЛИЗАЦИЯ =================
@@ -126,23 +113,23 @@ def load_models():
             model_type='yolov8',
             model_path=MODEL_P2_PATH,
             confidence_threshold=CONF_THRESH,
-            device="cuda:0"
+            device=resolve_device()
         )
         logging.info(f"✅ P2-Detector (SAHI Mode) загружен: {MODEL_P2_PATH}")
     else:
-        model_p2 = YOLO(MODEL_P2_PATH)
+        model_p2 = load_model(MODEL_P2_PATH, task="detect")
         logging.info(f"✅ P2-Detector (Standard) загружен: {MODEL_P2_PATH}")
 
     # Модель 2: PPE
     try:
-        model_ppe = YOLO(MODEL_PPE_PATH)
+        model_ppe = load_model(MODEL_PPE_PATH, task="detect")
         logging.info(f"✅ PPE-Checker загружен: {MODEL_PPE_PATH}")
     except Exception as e:
         logging.warning(f"⚠️ PPE-модель не найдена: {e}")
         model_ppe = None
 
     # Модель 3: Pose
-    model_pose = YOLO(MODEL_POSE_PATH)
+    model_pose = load_model(MODEL_POSE_PATH, task="pose")
     logging.info(f"✅ Pose-Estimator загружен: {MODEL_POSE_PATH}")
 
     return model_p2, model_ppe, model_pose
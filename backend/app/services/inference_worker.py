@@ -0,0 +1,166 @@
+# backend/app/services/inference_worker.py
+import asyncio
+import multiprocessing as mp
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional
+
+from sqlalchemy import update
+
+from app.core.config import settings
+from app.db.session import AsyncSessionLocal
+from app.db.models import VideoFile
+from app.services.model_registry import model_registry
+
+# Свой event loop у каждого воркер-процесса: asyncpg-соединения движка
+# привязаны к loop'у, поэтому между задачами его не пересоздаём.
+_worker_loop: Optional[asyncio.AbstractEventLoop] = None
+# Барьер прогрева: проверка готовности занимает каждый воркер пула, а не один и тот же
+_ready_barrier = None
+READY_BARRIER_TIMEOUT_SEC = 600
+
+
+def warmup_models() -> list:
+    return [name.strip() for name in settings.MODEL_WARMUP.split(",") if name.strip()]
+
+
+def fork_safe() -> bool:
+    """
+    fork допустим, только если все модели на CPU: предзагрузка в родителе поднимает CUDA,
+    а CUDA-контекст в fork-потомке не работает.
+    Детектор на onnx/openvino и так на CPU, но EasyOCR — это torch: CPU для всех
+    моделей гарантирует только INFERENCE_DEVICE=cpu.
+    """
+    return settings.INFERENCE_DEVICE == "cpu"
+
+
+def _worker_init(ready_barrier=None):
+    """Выполняется один раз в каждом воркере: поднимаем loop и прогреваем модели в фоне."""
+    global _worker_loop, _ready_barrier
+    _ready_barrier = ready_barrier
+    _worker_loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(_worker_loop)
+    # При fork модели уже унаследованы от родителя — прогрев ничего не грузит
+    model_registry.warm_up(warmup_models(), background=True)
+
+
+def _worker_ready() -> dict:
+    """Ждёт прогрева моделей в воркере и возвращает их статус вместе с pid воркера."""
+    model_registry.warm_up(warmup_models(), background=False)
+    if _ready_barrier is not None:
+        # Держим воркер, пока остальные не возьмут свою проверку
+        try:
+            _ready_barrier.wait(timeout=READY_BARRIER_TIMEOUT_SEC)
+        except threading.BrokenBarrierError:
+            pass
+    return {"pid": os.getpid(), "models": model_registry.status()}
+
+
+def _run_video_job(video_path: str, video_id: int, use_cache: bool = True) -> dict:
+    from app.services.video_stream import SmartVideoProcessor
+
+    # Зоны процессор берёт из снимков API (zone_service.sync) — и при старте, и по ходу задачи
+    processor = SmartVideoProcessor(video_path, video_id, use_cache=use_cache)
+    return _worker_loop.run_until_complete(processor.process())
+
+
+class InferenceWorkerPool:
+    """
+    Пул процессов для тяжёлого инференса (YOLO, EasyOCR, декодирование).
+    API только отправляет задачи и асинхронно ждёт результат,
+    поэтому event loop FastAPI не блокируется.
+    """
+    def __init__(self, max_workers: int = 1, start_method: str = "spawn"):
+        self.max_workers = max_workers
+        if start_method == "fork" and not fork_safe():
+            print("⚠️ INFERENCE POOL: fork needs INFERENCE_DEVICE=cpu (CUDA breaks in forked workers), using spawn")
+            start_method = "spawn"
+        self.start_method = start_method
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._start_lock = threading.Lock()
+        # pid воркера -> статус его моделей
+        self.worker_models: Optional[dict] = None
+
+    def start(self):
+        with self._start_lock:
+            if self._executor is None:
+                if self.start_method == "fork":
+                    # Грузим веса в родителе до fork: воркеры делят их copy-on-write
+                    model_registry.warm_up(warmup_models(), background=False)
+                    model_registry.freeze_for_fork()
+                print(f"⚡ INFERENCE POOL: starting {self.max_workers} worker(s) ({self.start_method})")
+                ctx = mp.get_context(self.start_method)
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.max_workers,
+                    mp_context=ctx,
+                    initializer=_worker_init,
+                    initargs=(ctx.Barrier(self.max_workers),),
+                )
+        return self
+
+    async def warm_up(self):
+        """Фоновый старт пула + прогрев моделей в каждом воркере (для /health)."""
+        await asyncio.to_thread(self.start)
+        try:
+            reports = await asyncio.gather(*[self.run(_worker_ready) for _ in range(self.max_workers)])
+            self.worker_models = {r["pid"]: r["models"] for r in reports}
+        except Exception as e:
+            print(f"⚠️ INFERENCE POOL: warm-up failed: {e}")
+            self.worker_models = {"error": str(e)}
+
+    def status(self) -> dict:
+        models = self.worker_models if self.worker_models is not None and "error" not in self.worker_models else {}
+        return {
+            "started": self._executor is not None,
+            "workers": self.max_workers,
+            "start_method": self.start_method,
+            "models": self.worker_models,
+            # Готов пул целиком: ответили все воркеры, и у каждого прогреты все модели
+            "ready": len(models) == self.max_workers and all(
+                worker.get(name, {}).get("status") == "ready"
+                for worker in models.values() for name in warmup_models()
+            ),
+        }
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    async def run(self, fn, *args):
+        if self._executor is None:
+            await asyncio.to_thread(self.start)
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, fn, *args)
+
+    async def process_video(self, video_path: str, video_id: int, use_cache: bool = True) -> dict:
+        return await self.run(_run_video_job, video_path, video_id, use_cache)
+
+
+inference_pool = InferenceWorkerPool(
+    max_workers=settings.INFERENCE_WORKERS,
+    start_method=settings.INFERENCE_MP_START,
+)
+
+
+async def start_video_processing_task(video_path: str, video_id: int, segments: int = 1, use_cache: bool = True):
+    """
+    Точка входа для BackgroundTasks: видео уходит в пул воркеров.
+    segments > 1 — архивный режим: ролик режется на сегменты и анализируется параллельно.
+    use_cache — повторный анализ по сохранённым детекциям, если они есть (только segments=1).
+    """
+    try:
+        if segments > 1:
+            from app.services.segment_processing import process_video_segmented
+            result = await process_video_segmented(video_path, video_id, segments)
+        else:
+            result = await inference_pool.process_video(video_path, video_id, use_cache)
+    except Exception as e:
+        print(f"🔥 INFERENCE JOB FAILED: Video {video_id}: {e}")
+        return
+
+    print(f"✅ INFERENCE JOB DONE: {result}")
+    async with AsyncSessionLocal() as db:
+        await db.execute(update(VideoFile).where(VideoFile.id == video_id).values(processed=1))
+        await db.commit()
@@ -0,0 +1,143 @@
+# backend/app/services/keyframe.py
+from collections import Counter
+from typing import Optional
+
+import cv2
+import numpy as np
+
+from app.services.detections import PERSON, DetectionBatch
+
+
+class KeyframePropagator:
+    """
+    Детекция только на ключевых кадрах + перенос боксов оптическим потоком между ними.
+    - Ключевой кадр: полный каскад моделей, боксы запоминаются.
+    - Промежуточный кадр: сетка точек в каждом боксе переносится sparse LK-потоком
+      (с проверкой вперёд-назад), бокс сдвигается на медианное смещение и
+      масштабируется по разбросу точек. Keypoints сдвигаются вместе с боксом.
+    - Детекция форсируется, если у человека осталось мало надёжных точек
+      (уверенность переноса < min_confidence) или движение появилось там,
+      где известных объектов нет (в кадр кто-то вошёл).
+    Поток считается на уменьшенной серой копии кадра.
+    """
+    FLOW_WIDTH = 640
+    GRID = 4  # точек на сторону бокса
+    FB_MAX_ERROR = 1.0  # допустимая ошибка вперёд-назад, px (в масштабе FLOW_WIDTH)
+    PIXEL_DIFF_THRESHOLD = 25
+    LK_PARAMS = dict(
+        winSize=(21, 21),
+        maxLevel=3,
+        criteria=(cv2.TERM_CRITERIA_EPS | cv2.TERM_CRITERIA_COUNT, 20, 0.03),
+    )
+
+    def __init__(self, interval: int = 3, min_confidence: float = 0.5, new_object_motion: float = 0.002):
+        self.interval = max(1, interval)
+        self.min_confidence = min_confidence
+        self.new_object_motion = new_object_motion
+        self._prev_gray: Optional[np.ndarray] = None
+        self._scale = 1.0
+        self._detections = DetectionBatch()
+        self._since_key = 0
+        self.stats = Counter()
+
+    def due(self) -> bool:
+        """Пора ли делать полную детекцию по расписанию."""
+        return self._prev_gray is None or self._since_key >= self.interval - 1
+
+    def keyframe(self, frame: np.ndarray, detections: DetectionBatch):
+        """Запоминает кадр и детекции полного каскада."""
+        self._prev_gray = self._gray(frame)
+        self._detections = detections
+        self._since_key = 0
+        self.stats["keyframes"] += 1
+
+    def propagate(self, frame: np.ndarray) -> Optional[DetectionBatch]:
+        """
+        Переносит последние детекции на новый кадр.
+        None — перенос ненадёжен, нужна полная детекция.
+        """
+        gray = self._gray(frame)
+        boxes = self._detections.boxes * self._scale
+
+        new_boxes = boxes.copy()
+        confidence = np.ones(len(boxes), dtype=np.float32)
+        if len(boxes):
+            new_boxes, confidence = self._flow_boxes(self._prev_gray, gray, boxes)
+
+        persons = self._detections.cls == PERSON
+        if persons.any() and confidence[persons].min() < self.min_confidence:
+            self.stats["forced_low_confidence"] += 1
+            return None
+        if self._motion_outside(self._prev_gray, gray, new_boxes):
+            self.stats["forced_new_object"] += 1
+            return None
+
+        # Мелкие объекты (PPE) без надёжных точек просто теряем до ключевого кадра
+        keep = confidence >= self.min_confidence
+        propagated = self._detections[keep].copy()
+        new_boxes = new_boxes[keep] / self._scale
+        shift = new_boxes - propagated.boxes
+        propagated.data["box"] = new_boxes
+        # Keypoints сдвигаются вместе с центром бокса (у строк без скелета там нули)
+        kpts = propagated.data["kpts"]
+        kpts[..., 0] += np.where(propagated.has_kpts, (shift[:, 0] + shift[:, 2]) / 2, 0)[:, None]
+        kpts[..., 1] += np.where(propagated.has_kpts, (shift[:, 1] + shift[:, 3]) / 2, 0)[:, None]
+
+        self._prev_gray = gray
+        self._detections = propagated
+        self._since_key += 1
+        self.stats["propagated"] += 1
+        return propagated
+
+    def _gray(self, frame: np.ndarray) -> np.ndarray:
+        w = frame.shape[1]
+        self._scale = min(1.0, self.FLOW_WIDTH / w)
+        if self._scale < 1.0:
+            frame = cv2.resize(frame, None, fx=self._scale, fy=self._scale, interpolation=cv2.INTER_AREA)
+        return cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+
+    def _grid(self, boxes: np.ndarray) -> np.ndarray:
+        """GRID x GRID точек во внутренней части каждого бокса: (B, G*G, 2)."""
+        t = np.linspace(0.2, 0.8, self.GRID, dtype=np.float32)
+        gx, gy = np.meshgrid(t, t)
+        w = (boxes[:, 2] - boxes[:, 0])[:, None]
+        h = (boxes[:, 3] - boxes[:, 1])[:, None]
+        xs = boxes[:, 0:1] + gx.ravel()[None] * w
+        ys = boxes[:, 1:2] + gy.ravel()[None] * h
+        return np.stack([xs, ys], axis=-1)
+
+    def _flow_boxes(self, prev: np.ndarray, cur: np.ndarray, boxes: np.ndarray):
+        pts0 = self._grid(boxes)
+        flat = pts0.reshape(-1, 1, 2)
+        pts1, st, _ = cv2.calcOpticalFlowPyrLK(prev, cur, flat, None, **self.LK_PARAMS)
+        back, st_back, _ = cv2.calcOpticalFlowPyrLK(cur, prev, pts1, None, **self.LK_PARAMS)
+
+        fb_error = np.linalg.norm(back - flat, axis=-1).reshape(len(boxes), -1)
+        good = (st.reshape(len(boxes), -1) == 1) & (st_back.reshape(len(boxes), -1) == 1)
+        good &= fb_error < self.FB_MAX_ERROR
+        pts1 = pts1.reshape(pts0.shape)
+        confidence = good.mean(axis=1)
+
+        new_boxes = boxes.copy()
+        for i in np.flatnonzero(good.sum(axis=1) >= 2):
+            p0, p1 = pts0[i][good[i]], pts1[i][good[i]]
+            dx, dy = np.median(p1 - p0, axis=0)
+            # Масштаб: как изменился разброс точек вокруг их центра
+            spread0 = np.median(np.linalg.norm(p0 - p0.mean(axis=0), axis=1))
+            spread1 = np.median(np.linalg.norm(p1 - p1.mean(axis=0), axis=1))
+            scale = np.clip(spread1 / spread0, 0.8, 1.25) if spread0 > 1e-3 else 1.0
+            cx, cy = (boxes[i, 0] + boxes[i, 2]) / 2 + dx, (boxes[i, 1] + boxes[i, 3]) / 2 + dy
+            hw, hh = (boxes[i, 2] - boxes[i, 0]) * scale / 2, (boxes[i, 3] - boxes[i, 1]) * scale / 2
+            new_boxes[i] = (cx - hw, cy - hh, cx + hw, cy + hh)
+        return new_boxes, confidence
+
+    def _motion_outside(self, prev: np.ndarray, cur: np.ndarray, boxes: np.ndarray) -> bool:
+        """Есть ли заметное движение вне известных объектов (новый человек в кадре)."""
+        diff = cv2.absdiff(cv2.GaussianBlur(cur, (5, 5), 0), cv2.GaussianBlur(prev, (5, 5), 0))
+        moving = diff > self.PIXEL_DIFF_THRESHOLD
+        h, w = moving.shape
+        for x1, y1, x2, y2 in boxes:
+            # Запас 20%: края движущегося человека не должны считаться "новым объектом"
+            mx, my = (x2 - x1) * 0.2, (y2 - y1) * 0.2
+            moving[max(0, int(y1 - my)):min(h, int(y2 + my)), max(0, int(x1 - mx)):min(w, int(x2 + mx))] = False
+        return np.count_nonzero(moving) / moving.size > self.new_object_motion
@@ -0,0 +1,82 @@
+# backend/app/services/live_streams.py
+import asyncio
+import traceback
+from typing import Dict, List, Optional, Tuple
+
+from app.core.config import settings
+
+
+class LiveStreamManager:
+    """
+    Держит запущенные live-потоки (RTSP / камеры) внутри процесса API.
+    Инференс всех камер идёт через общий BatchInferenceScheduler в отдельном
+    потоке, так что event loop остаётся свободным.
+    Модели грузятся при старте первого потока (или заранее, API_MODEL_WARMUP).
+    """
+    def __init__(self):
+        self.streams: Dict[int, Tuple[object, asyncio.Task]] = {}
+        self._scheduler = None
+
+    def _get_scheduler(self):
+        if self._scheduler is None:
+            from app.services.batch_scheduler import BatchInferenceScheduler
+            from app.services.detector import get_detector
+
+            self._scheduler = BatchInferenceScheduler(
+                get_detector(),
+                max_batch_size=settings.LIVE_BATCH_SIZE,
+                max_delay_ms=settings.LIVE_BATCH_DELAY_MS,
+            )
+        return self._scheduler
+
+    async def start(self, video_id: int, source: str, camera_id: Optional[str] = None):
+        from app.services.detector import get_detector
+        from app.services.video_stream import SmartVideoProcessor
+
+        # Первый поток грузит модели — вне event loop
+        await asyncio.to_thread(get_detector)
+
+        processor = SmartVideoProcessor(
+            source,
+            video_id,
+            batch_scheduler=self._get_scheduler(),
+            live=True,
+            camera_id=camera_id or f"CAM-{video_id:02d}",
+        )
+        task = asyncio.create_task(processor.process_live())
+        task.add_done_callback(lambda t, vid=video_id: self._on_done(vid, t))
+        self.streams[video_id] = (processor, task)
+        return processor
+
+    def _on_done(self, video_id: int, task: asyncio.Task):
+        """Поток завершился: убираем его из списка, падение пайплайна — в лог."""
+        self.streams.pop(video_id, None)
+        if task.cancelled():
+            return
+        error = task.exception()
+        if error is not None:
+            print(f"❌ Live stream {video_id} crashed: {error!r}")
+            traceback.print_exception(type(error), error, error.__traceback__)
+
+    async def stop(self, video_id: int) -> Optional[dict]:
+        entry = self.streams.get(video_id)
+        if entry is None:
+            return None
+        processor, task = entry
+        processor.stop()
+        await asyncio.gather(task, return_exceptions=True)
+        return processor.live_stats()
+
+    async def stop_all(self):
+        for video_id in list(self.streams):
+            await self.stop(video_id)
+
+    def status(self) -> List[dict]:
+        result = [processor.live_stats() for processor, _ in self.streams.values()]
+        if self._scheduler is not None:
+            for item in result:
+                item["batching"] = self._scheduler.stats()
+        return result
+
+
+live_manager = LiveStreamManager()
@@ -0,0 +1,99 @@
+# backend/app/services/model_registry.py
+import gc
+import importlib
+import threading
+import time
+from typing import Callable, Dict, Iterable, Optional
+
+
+class ModelRegistry:
+    """
+    Ленивый реестр тяжёлых моделей (YOLO-каскад, EasyOCR, трекер).
+    - Модель создаётся при первом get() или фоновым прогревом warm_up().
+    - Параллельные get() одной модели ждут одну загрузку, а не грузят её дважды.
+    - status() отдаёт готовность для /health.
+    Фабрики задаются строкой "module:attr", поэтому импорт реестра
+    не тянет за собой torch / ultralytics / easyocr.
+    """
+    def __init__(self):
+        self._factories: Dict[str, object] = {}
+        self._instances: Dict[str, object] = {}
+        self._locks: Dict[str, threading.Lock] = {}
+        self._status: Dict[str, str] = {}
+        self._errors: Dict[str, str] = {}
+        self._load_sec: Dict[str, float] = {}
+        self._warmup_thread: Optional[threading.Thread] = None
+
+    def register(self, name: str, factory):
+        """factory — вызываемый объект или строка 'module:attr'."""
+        self._factories[name] = factory
+        self._locks[name] = threading.Lock()
+        self._status[name] = "pending"
+
+    def _resolve(self, factory) -> Callable:
+        if callable(factory):
+            return factory
+        module, attr = factory.split(":")
+        return getattr(importlib.import_module(module), attr)
+
+    def get(self, name: str):
+        instance = self._instances.get(name)
+        if instance is not None:
+            return instance
+
+        with self._locks[name]:
+            if name in self._instances:
+                return self._instances[name]
+            self._status[name] = "loading"
+            started = time.perf_counter()
+            try:
+                instance = self._resolve(self._factories[name])()
+            except Exception as e:
+                self._status[name] = "failed"
+                self._errors[name] = str(e)
+                raise
+            self._load_sec[name] = round(time.perf_counter() - started, 2)
+            self._instances[name] = instance
+            self._status[name] = "ready"
+            self._errors.pop(name, None)
+            print(f"⚡ MODEL REGISTRY: '{name}' ready in {self._load_sec[name]}s")
+            return instance
+
+    def warm_up(self, names: Optional[Iterable[str]] = None, background: bool = True):
+        """Загружает модели заранее; background=True — в daemon-потоке, не блокируя старт."""
+        names = list(names or self._factories)
+
+        def run():
+            for name in names:
+                try:
+                    self.get(name)
+                except Exception as e:
+                    print(f"⚠️ MODEL REGISTRY: '{name}' failed to load: {e}")
+
+        if not background:
+            run()
+            return None
+        if self._warmup_thread is None or not self._warmup_thread.is_alive():
+            self._warmup_thread = threading.Thread(target=run, name="model-warmup", daemon=True)
+            self._warmup_thread.start()
+        return self._warmup_thread
+
+    def freeze_for_fork(self):
+        """
+        Перед fork(): переносим все живые объекты (в т.ч. веса) в постоянное
+        поколение GC, чтобы сборщик в дочерних процессах не трогал их заголовки
+        и страницы с весами оставались общими copy-on-write.
+        """
+        gc.collect()
+        gc.freeze()
+
+    def status(self) -> dict:
+        return {
+            name: {"status": state, "load_sec": self._load_sec.get(name), "error": self._errors.get(name)}
+            for name, state in self._status.items()
+        }
+
+
+model_registry = ModelRegistry()
+model_registry.register("detector", "app.services.detector:GodModeDetector")
+model_registry.register("ocr", "app.services.ocr_service:OCRService")
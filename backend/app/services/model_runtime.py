@@ -0,0 +1,225 @@
+# backend/app/services/model_runtime.py
+"""
+Рантайм моделей: один вход для загрузки всех YOLO-весов проекта.
+
+INFERENCE_BACKEND:
+- torch    — веса .pt как есть (GPU, если есть);
+- onnx     — экспорт в ONNX + ONNX Runtime на CPU;
+- openvino — экспорт в OpenVINO IR (самый быстрый вариант для Intel CPU на edge-боксах).
+
+INFERENCE_INT8 — квантизация в INT8 с калибровкой на реальных кадрах
+из INT8_CALIBRATION_DIR (см. collect_calibration_frames).
+Экспорт делается один раз и кешируется рядом с исходными весами
+(в имени — версия весов, см. weights_tag).
+
+Ручной экспорт всех моделей:
+    python -m app.services.model_runtime --calib-video data/videos/sample.mp4
+"""
+import argparse
+import glob
+import hashlib
+import os
+import re
+import shutil
+from pathlib import Path
+from typing import Optional
+
+import cv2
+import numpy as np
+import torch
+from ultralytics import YOLO
+
+from app.core.config import settings
+
+BACKENDS = ("torch", "onnx", "openvino")
+CALIBRATION_IMAGE_EXTS = (".jpg", ".jpeg", ".png")
+
+
+def resolve_device(device: Optional[str] = None) -> str:
+    """
+    INFERENCE_DEVICE=auto -> cuda:0, если есть GPU, иначе cpu.
+    ONNX/OpenVINO в этом проекте работают на CPU.
+    """
+    if settings.INFERENCE_BACKEND != "torch":
+        return "cpu"
+    device = device or settings.INFERENCE_DEVICE
+    if device == "auto":
+        return "cuda:0" if torch.cuda.is_available() else "cpu"
+    return device
+
+
+def load_model(weights: str, task: Optional[str] = None, imgsz: int = 640,
+               backend: Optional[str] = None, int8: Optional[bool] = None) -> YOLO:
+    """
+    Загружает модель через выбранный рантайм.
+    imgsz — основное входное разрешение (для экспорта; вход остаётся динамическим).
+    """
+    backend = backend or settings.INFERENCE_BACKEND
+    int8 = settings.INFERENCE_INT8 if int8 is None else int8
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown INFERENCE_BACKEND '{backend}', expected one of {BACKENDS}")
+
+    if backend == "torch":
+        model = YOLO(weights, task=task)
+        model.overrides["device"] = resolve_device()
+        return model
+
+    exported = export_model(weights, backend, imgsz=imgsz, int8=int8)
+    print(f"⚡ RUNTIME: {backend}{' INT8' if int8 else ''} -> {exported}")
+    model = YOLO(exported, task=task)
+    model.overrides["device"] = "cpu"
+    return model
+
+
+def weights_tag(weights: str) -> str:
+    """Версия весов (размер + mtime): переобученный .pt получает новый экспорт, а не старый из кеша."""
+    if not os.path.exists(weights):
+        return "0" * 8  # ultralytics скачает веса сам; после скачивания экспорт обновится
+    stat = os.stat(weights)
+    return hashlib.blake2b(f"{stat.st_size}:{stat.st_mtime_ns}".encode(), digest_size=4).hexdigest()
+
+
+def exported_path(weights: str, backend: str, int8: bool = False, tag: Optional[str] = None) -> Path:
+    """Кешированный экспорт рядом с .pt; в имени — версия весов."""
+    src = Path(weights)
+    tag = tag or weights_tag(weights)
+    if backend == "onnx":
+        return src.with_name(f"{src.stem}.{tag}{'.int8' if int8 else ''}.onnx")
+    return src.with_name(f"{src.stem}_{tag}{'_int8' if int8 else ''}_openvino_model")
+
+
+def _remove_stale_exports(target: Path, tag: str):
+    """Экспорты прошлых версий тех же весов (того же рантайма и точности) больше не нужны."""
+    prefix, suffix = target.name.split(tag, 1)
+    stale = re.compile(re.escape(prefix) + r"[0-9a-f]{8}" + re.escape(suffix))
+    for path in target.parent.iterdir():
+        if path != target and stale.fullmatch(path.name):
+            shutil.rmtree(path) if path.is_dir() else path.unlink()
+
+
+def export_model(weights: str, backend: str, imgsz: int = 640, int8: bool = False) -> str:
+    """Экспортирует веса в ONNX/OpenVINO (с кешем по версии весов). Возвращает путь к экспорту."""
+    tag = weights_tag(weights)
+    target = exported_path(weights, backend, int8, tag)
+    if target.exists():
+        return str(target)
+
+    model = YOLO(weights)
+    if backend == "openvino":
+        kwargs = {}
+        if int8:
+            # NNCF-калибровка на датасете из реальных кадров
+            kwargs = {"int8": True, "data": calibration_dataset_yaml(model.names)}
+        exported = model.export(format="openvino", imgsz=imgsz, dynamic=True, half=False, **kwargs)
+        shutil.rmtree(target, ignore_errors=True)
+        os.replace(exported, target)
+    else:
+        fp32 = model.export(format="onnx", imgsz=imgsz, dynamic=True, simplify=True)
+        if int8:
+            quantize_onnx_int8(fp32, str(target), imgsz)
+            os.remove(fp32)
+        else:
+            os.replace(fp32, target)
+    _remove_stale_exports(target, tag)
+    return str(target)
+
+
+def calibration_images(limit: int = 300) -> list:
+    root = settings.INT8_CALIBRATION_DIR
+    if not root or not os.path.isdir(root):
+        raise FileNotFoundError(
+            f"INT8 calibration needs sample frames in INT8_CALIBRATION_DIR (got '{root}'); "
+            f"see collect_calibration_frames()"
+        )
+    files = sorted(f for f in glob.glob(os.path.join(root, "*")) if f.lower().endswith(CALIBRATION_IMAGE_EXTS))
+    if not files:
+        raise FileNotFoundError(f"No calibration images in {root}")
+    return files[:limit]
+
+
+def calibration_dataset_yaml(names: dict) -> str:
+    """Минимальный dataset.yaml для калибровки ultralytics: кадры без разметки."""
+    import yaml
+
+    images = calibration_images()
+    root = os.path.abspath(os.path.dirname(images[0]))
+    path = os.path.join(root, "calibration.yaml")
+    with open(path, "w", encoding="utf-8") as f:
+        yaml.safe_dump({"path": root, "train": ".", "val": ".", "names": dict(names)}, f, allow_unicode=True)
+    return path
+
+
+def _letterbox_nchw(image: np.ndarray, imgsz: int) -> np.ndarray:
+    h, w = image.shape[:2]
+    ratio = min(imgsz / h, imgsz / w)
+    new_w, new_h = int(round(w * ratio)), int(round(h * ratio))
+    resized = cv2.resize(image, (new_w, new_h), interpolation=cv2.INTER_LINEAR)
+    top, left = (imgsz - new_h) // 2, (imgsz - new_w) // 2
+    canvas = np.full((imgsz, imgsz, 3), 114, dtype=np.uint8)
+    canvas[top:top + new_h, left:left + new_w] = resized
+    return (canvas[..., ::-1].transpose(2, 0, 1)[None] / 255.0).astype(np.float32)
+
+
+def quantize_onnx_int8(src: str, dst: str, imgsz: int):
+    """Статическая INT8-квантизация ONNX Runtime с калибровкой на кадрах камер."""
+    import onnx
+    from onnxruntime.quantization import CalibrationDataReader, QuantType, quantize_static
+
+    input_name = onnx.load(src, load_external_data=False).graph.input[0].name
+
+    class FrameReader(CalibrationDataReader):
+        def __init__(self):
+            self.files = iter(calibration_images())
+
+        def get_next(self):
+            path = next(self.files, None)
+            if path is None:
+                return None
+            return {input_name: _letterbox_nchw(cv2.imread(path), imgsz)}
+
+    # Головы детектора (Concat/Mul в конце графа) чувствительны к квантизации — оставляем их в FP32
+    quantize_static(src, dst, FrameReader(), activation_type=QuantType.QUInt8, weight_type=QuantType.QInt8,
+                    nodes_to_exclude=_detect_head_nodes(src), per_channel=True)
+
+
+def _detect_head_nodes(path: str) -> list:
+    import onnx
+
+    graph = onnx.load(path, load_external_data=False).graph
+    # Голова — последний модуль модели (/model.N/...), N зависит от архитектуры
+    layers = [int(m.group(1)) for m in (re.search(r"/model\.(\d+)/", n.name) for n in graph.node) if m]
+    if not layers:
+        return []
+    head = f"/model.{max(layers)}/"
+    return [n.name for n in graph.node if head in n.name and n.op_type in ("Concat", "Mul", "Sigmoid", "Split")]
+
+
+def collect_calibration_frames(video_path: str, out_dir: Optional[str] = None, count: int = 300) -> str:
+    """Равномерно выбирает count кадров из ролика в каталог калибровки."""
+    out_dir = out_dir or settings.INT8_CALIBRATION_DIR
+    os.makedirs(out_dir, exist_ok=True)
+    cap = cv2.VideoCapture(video_path)
+    total = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    for i, frame_id in enumerate(np.linspace(0, max(total - 1, 0), count, dtype=int)):
+        cap.set(cv2.CAP_PROP_POS_FRAMES, int(frame_id))
+        ret, frame = cap.read()
+        if ret:
+            cv2.imwrite(os.path.join(out_dir, f"calib_{i:04d}.jpg"), frame)
+    cap.release()
+    return out_dir
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export Argus models for CPU inference")
+    parser.add_argument("--backend", default="openvino", choices=BACKENDS[1:])
+    parser.add_argument("--int8", action="store_true", default=settings.INFERENCE_INT8)
+    parser.add_argument("--calib-video", help="Собрать кадры калибровки из этого ролика")
+    args = parser.parse_args()
+
+    if args.calib_video:
+        collect_calibration_frames(args.calib_video)
+    # Детектор при загрузке сам экспортирует все свои модели через load_model
+    settings.INFERENCE_BACKEND = args.backend
+    settings.INFERENCE_INT8 = args.int8
+    from app.services.model_registry import model_registry
+    model_registry.warm_up(["detector"], background=False)
@@ -2,14 +2,60 @@
 import easyocr
 import cv2
 import re
-from typing import Optional, Tuple
+import numpy as np
+from datetime import datetime
+from typing import Callable, List, Optional, Tuple
+
+from app.core.config import settings
+from app.services.model_registry import model_registry
+
+DATE_RE = re.compile(r'\d{4}-\d{2}-\d{2}')
+TIME_RE = re.compile(r'\d{2}:\d{2}:\d{2}')
+GLYPH_SIZE = (16, 24)  # (w, h) нормализованного символа
+GLYPH_MIN_SCORE = 0.8  # минимальная корреляция с шаблоном цифры
+
+
+def timestamp_roi(frame) -> np.ndarray:
+    """Левый верхний угол кадра (оверлей с часами), серый + CLAHE."""
+    h, w, _ = frame.shape
+    roi = frame[0:int(h * 0.15), 0:int(w * 0.6)]
+
+    gray = cv2.cvtColor(roi, cv2.COLOR_BGR2GRAY)
+    clahe = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8, 8))
+    return clahe.apply(gray)
+
+
+def timestamp_from_texts(texts: List[str]) -> Optional[str]:
+    """Собирает 'YYYY-MM-DDHH:MM:SS' или 'HH:MM:SS' из прочитанных строк оверлея."""
+    date_part = None
+    time_part = None
+
+    for t in texts:
+        # Ищем дату YYYY-MM-DD
+        m_date = DATE_RE.search(t)
+        if m_date:
+            date_part = m_date.group(0)
+
+        # Ищем время HH:MM:SS
+        m_time = TIME_RE.search(t)
+        if m_time:
+            time_part = m_time.group(0)
+
+    if date_part and time_part:
+        # Вернём без пробела, дальше парсим как "%Y-%m-%d%H:%M:%S"
+        return f"{date_part}{time_part}"
+    if time_part:
+        return time_part
+
+    return None
 
 
 class OCRService:
     def __init__(self):
         print("⚡ INITIALIZING OCR SERVICE (EasyOCR)...")
         # Добавляем русский, убираем лишние ограничения
-        self.reader = easyocr.Reader(['ru', 'en'], gpu=True)
+        # GPU, если есть — кроме INFERENCE_DEVICE=cpu (нужно и для fork-пула)
+        self.reader = easyocr.Reader(['ru', 'en'], gpu=settings.INFERENCE_DEVICE != "cpu")
 
     def extract_timestamp(self, frame) -> Optional[str]:
         """
@@ -19,38 +65,21 @@ class OCRService:
         - или просто 'HH:MM:SS'.
         Возвращает строку (без пробела между датой и временем) либо None.
         """
-        h, w, _ = frame.shape
-        roi = frame[0:int(h * 0.15), 0:int(w * 0.6)]
-
-        gray = cv2.cvtColor(roi, cv2.COLOR_BGR2GRAY)
-        clahe = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8, 8))
-        gray = clahe.apply(gray)
+        return self.read_timestamp(timestamp_roi(frame))[0]
 
-        texts = self.reader.readtext(gray, detail=0, allowlist='0123456789:- ')
-
-        date_part = None
-        time_part = None
-
-        for text in texts:
+    def read_timestamp(self, gray) -> Tuple[Optional[str], List[Tuple[list, str]]]:
+        """
+        EasyOCR по подготовленному ROI времени (timestamp_roi).
+        Кроме строки времени возвращает поля оверлея [(bbox, текст)] с датой/временем —
+        по ним TimestampReader учит шаблоны цифр.
+        """
+        results = self.reader.readtext(gray, detail=1, allowlist='0123456789:- ')
+        fields = []
+        for bbox, text, _conf in results:
             t = text.replace('.', ':').strip()
-
-            # Ищем дату YYYY-MM-DD
-            m_date = re.search(r'\d{4}-\d{2}-\d{2}', t)
-            if m_date:
-                date_part = m_date.group(0)
-
-            # Ищем время HH:MM:SS
-            m_time = re.search(r'\d{2}:\d{2}:\d{2}', t)
-            if m_time:
-                time_part = m_time.group(0)
-
-        if date_part and time_part:
-            # Вернём без пробела, дальше парсим как "%Y-%m-%d%H:%M:%S"
-            return f"{date_part}{time_part}"
-        if time_part:
-            return time_part
-
-        return None
+            if DATE_RE.search(t) or TIME_RE.search(t):
+                fields.append((bbox, t))
+        return timestamp_from_texts([t for _, t in fields]), fields
 
 
     def extract_train_number(self, frame, bbox):
@@ -256,4 +285,163 @@ class OCRService:
         return best_model, best_num, conf
 
 
-ocr_instance = OCRService()
+def _ink(gray: np.ndarray, rect: Tuple[int, int, int, int]) -> np.ndarray:
+    """Бинарная маска текста поля (Otsu); текст — меньшинство пикселей, независимо от цвета оверлея."""
+    x1, y1, x2, y2 = rect
+    _, ink = cv2.threshold(gray[y1:y2, x1:x2], 0, 1, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+    return 1 - ink if ink.mean() > 0.5 else ink
+
+
+def _spans(ink: np.ndarray) -> List[Tuple[int, int]]:
+    """Символы поля — участки столбцов с текстом между пустыми столбцами (шум в 1 пиксель отброшен)."""
+    cols = np.concatenate([[False], ink.any(axis=0), [False]])
+    edges = np.flatnonzero(cols[1:] != cols[:-1])
+    return [(int(s), int(e)) for s, e in zip(edges[::2], edges[1::2]) if ink[:, s:e].sum() >= 2]
+
+
+def _glyphs(ink: np.ndarray, spans: List[Tuple[int, int]]) -> Optional[np.ndarray]:
+    """
+    Символы по столбцам spans: обрезаны по тексту, приведены к GLYPH_SIZE,
+    центрированы и нормированы — корреляция с шаблоном становится скалярным произведением.
+    (K, w*h); None — в каком-то слоте нет текста.
+    """
+    glyphs = []
+    for start, end in spans:
+        piece = ink[:, start:end]
+        rows, cols = np.flatnonzero(piece.any(axis=1)), np.flatnonzero(piece.any(axis=0))
+        if len(rows) == 0:
+            return None
+        piece = piece[rows[0]:rows[-1] + 1, cols[0]:cols[-1] + 1].astype(np.float32)
+        glyph = cv2.resize(piece, GLYPH_SIZE, interpolation=cv2.INTER_AREA).ravel()
+        glyph -= glyph.mean()
+        glyphs.append(glyph / max(float(np.linalg.norm(glyph)), 1e-6))
+    return np.array(glyphs, dtype=np.float32).reshape(-1, GLYPH_SIZE[0] * GLYPH_SIZE[1])
+
+
+def _slots(spans: List[Tuple[int, int]], width: int) -> List[Tuple[int, int]]:
+    """Знакоместа: символы обучающего кадра, расширенные до середины промежутков между ними."""
+    bounds = [0] + [(spans[i][1] + spans[i + 1][0]) // 2 for i in range(len(spans) - 1)] + [width]
+    return list(zip(bounds[:-1], bounds[1:]))
+
+
+def _clock_seconds(text: str) -> Tuple[float, bool]:
+    """Секунды по строке времени и флаг "с датой"; ValueError — нечитаемо."""
+    if len(text) > 8:
+        return (datetime.strptime(text, "%Y-%m-%d%H:%M:%S") - datetime(1970, 1, 1)).total_seconds(), True
+    t = datetime.strptime(text, "%H:%M:%S")
+    return float(t.hour * 3600 + t.minute * 60 + t.second), False
+
+
+class TimestampReader:
+    """
+    Быстрое чтение часов оверлея одного потока.
+    - Первое успешное чтение EasyOCR задаёт раскладку полей (bbox + текст) и
+      шаблоны увиденных цифр.
+    - Дальше поля режутся на символы и цифры распознаются корреляцией с шаблонами
+      (микросекунды вместо детектора+распознавателя EasyOCR).
+    - Результат сверяется с экстраполированными часами (прошлое чтение + прошедшее
+      время потока); при расхождении или незнакомой цифре — EasyOCR, не чаще fallback_sec,
+      и переобучение шаблонов по его ответу.
+    """
+    def __init__(self, fallback_sec: float = 10.0, tolerance_sec: float = 2.0,
+                 ocr: Optional[Callable[[], "OCRService"]] = None):
+        self.fallback_sec = fallback_sec
+        self.tolerance_sec = tolerance_sec
+        self._ocr = ocr or get_ocr
+        self.templates = np.zeros((10, GLYPH_SIZE[0] * GLYPH_SIZE[1]), dtype=np.float32)
+        self.known = np.zeros(10, dtype=bool)
+        # Поля оверлея: (rect в координатах ROI, текст поля при обучении, знакоместа символов)
+        self.fields: List[Tuple[Tuple[int, int, int, int], str, List[Tuple[int, int]]]] = []
+        self._clock: Optional[Tuple[float, str]] = None  # (время потока, прочитанная строка)
+        self._last_fallback: Optional[float] = None
+        self.stats = {"template": 0, "rejected": 0, "easyocr": 0}
+
+    def read(self, frame, t: float) -> Optional[str]:
+        """Время оверлея кадра; t — секунды потока (от начала ролика или старта live)."""
+        gray = timestamp_roi(frame)
+        if self.fields:
+            text = self._decode(gray)
+            if text is not None and self._consistent(text, t):
+                self.stats["template"] += 1
+                self._clock = (t, text)
+                return text
+            self.stats["rejected"] += 1
+
+        if self._last_fallback is not None and t - self._last_fallback < self.fallback_sec:
+            return None
+        self._last_fallback = t
+        self.stats["easyocr"] += 1
+        text, fields = self._ocr().read_timestamp(gray)
+        if text:
+            self._learn(gray, fields)
+            self._clock = (t, text)
+        return text
+
+    def _learn(self, gray: np.ndarray, fields: List[Tuple[list, str]]):
+        h, w = gray.shape[:2]
+        learned = []
+        for bbox, text in fields:
+            pts = np.asarray(bbox, dtype=np.float32).reshape(-1, 2)
+            # Запас в пару пикселей: bbox EasyOCR бывает впритык к символам
+            x1, y1 = np.maximum(np.floor(pts.min(axis=0)).astype(int) - 2, 0)
+            x2, y2 = np.minimum(np.ceil(pts.max(axis=0)).astype(int) + 2, (w, h))
+            rect = (int(x1), int(y1), int(x2), int(y2))
+            chars = text.replace(" ", "")
+            ink = _ink(gray, rect)
+            spans = _spans(ink)
+            if len(spans) != len(chars):
+                # Символы слиплись/распались: на шаблоны такое поле не разобрать
+                self.fields = []
+                return
+            for ch, glyph in zip(chars, _glyphs(ink, spans)):
+                if ch.isdigit():
+                    self.templates[int(ch)] = glyph
+                    self.known[int(ch)] = True
+            learned.append((rect, text, _slots(spans, ink.shape[1])))
+        self.fields = learned
+
+    def _decode(self, gray: np.ndarray) -> Optional[str]:
+        texts = []
+        for rect, pattern, slots in self.fields:
+            chars = pattern.replace(" ", "")
+            ink = _ink(gray, rect)
+            spans = _spans(ink)
+            # Слипшиеся цифры (44, 11...) не разрезать по пустым столбцам — берём знакоместа
+            glyphs = _glyphs(ink, spans if len(spans) == len(chars) else slots)
+            if glyphs is None:
+                return None
+            digit_pos = [i for i, ch in enumerate(chars) if ch.isdigit()]
+            # Все цифры поля против всех шаблонов одной матрицей (K, 10)
+            scores = glyphs[digit_pos] @ self.templates.T
+            scores[:, ~self.known] = -np.inf
+            best = scores.argmax(axis=1)
+            if (scores[np.arange(len(best)), best] < GLYPH_MIN_SCORE).any():
+                return None
+            decoded = list(chars)
+            for i, digit in zip(digit_pos, best):
+                decoded[i] = str(digit)
+            # Пробелы поля — на прежних местах
+            decoded_iter = iter(decoded)
+            texts.append("".join(" " if ch == " " else next(decoded_iter) for ch in pattern))
+        return timestamp_from_texts(texts)
+
+    def _consistent(self, text: str, t: float) -> bool:
+        if self._clock is None:
+            return False
+        last_t, last_text = self._clock
+        try:
+            seconds, dated = _clock_seconds(text)
+            last_seconds, last_dated = _clock_seconds(last_text)
+        except ValueError:
+            return False
+        if dated != last_dated:
+            return False
+        diff = seconds - (last_seconds + (t - last_t))
+        if not dated:  # только время суток: переход через полночь
+            diff = (diff + 43200) % 86400 - 43200
+        return abs(diff) <= self.tolerance_sec + 0.01 * abs(t - last_t)
+
+
+def get_ocr() -> OCRService:
+    """Общий EasyOCR процесса: грузится при первом обращении или прогревом (model_registry)."""
+    return model_registry.get("ocr")
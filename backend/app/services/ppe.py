@@ -0,0 +1,102 @@
+# backend/app/services/ppe.py
+from typing import Tuple
+
+import numpy as np
+
+from app.services.box_ops import greedy_match
+from app.services.detections import CLASS_IDS
+
+# Классы экипировки, означающие нарушение у человека, которому предмет принадлежит
+PPE_VIOLATIONS = {
+    CLASS_IDS['head_nohelmet']: "no_helmet",
+    CLASS_IDS['face_nomask']: "no_mask",
+    CLASS_IDS['hand_noglove']: "no_glove",
+}
+VIOLATION_NAMES = tuple(PPE_VIOLATIONS.values())
+# Части тела, которые у человека одни: голова в каске и голова без каски конкурируют
+# за одного и того же человека (руки — по две, их назначаем просто ближайшему)
+SINGLE_PARTS = (
+    (CLASS_IDS['head_helmet'], CLASS_IDS['head_nohelmet']),
+    (CLASS_IDS['face_mask'], CLASS_IDS['face_nomask']),
+)
+MARGIN = (40, 60)  # допуск центра предмета за бокс человека, px по x и y
+
+
+def containment(person_boxes: np.ndarray, object_boxes: np.ndarray,
+                margin: Tuple[float, float] = MARGIN) -> np.ndarray:
+    """(P, O): центр предмета внутри бокса человека, расширенного на margin."""
+    mx, my = margin
+    o_cx = ((object_boxes[:, 0] + object_boxes[:, 2]) / 2)[None, :]
+    o_cy = ((object_boxes[:, 1] + object_boxes[:, 3]) / 2)[None, :]
+    px1, py1, px2, py2 = (person_boxes[:, k:k + 1] for k in range(4))
+    return (px1 - mx < o_cx) & (o_cx < px2 + mx) & (py1 - my < o_cy) & (o_cy < py2 + my)
+
+
+def affinity(person_boxes: np.ndarray, object_boxes: np.ndarray,
+             margin: Tuple[float, float] = MARGIN) -> np.ndarray:
+    """
+    (P, O): насколько предмет "свой" для человека, (0, 1] для вложенных пар и -1 для прочих.
+    Мера — близость центра предмета к вертикальной оси человека: у стоящих рядом
+    людей боксы перекрываются, но голова/лицо/руки лежат ближе к оси своего.
+    """
+    mx, _ = margin
+    o_cx = ((object_boxes[:, 0] + object_boxes[:, 2]) / 2)[None, :]
+    p_cx = ((person_boxes[:, 0] + person_boxes[:, 2]) / 2)[:, None]
+    half_w = ((person_boxes[:, 2] - person_boxes[:, 0]) / 2)[:, None] + mx
+    score = 1.0 - np.abs(o_cx - p_cx) / np.maximum(half_w, 1e-6)
+    return np.where(containment(person_boxes, object_boxes, margin), score, -1.0)
+
+
+def assign_objects(person_boxes: np.ndarray, object_boxes: np.ndarray, object_cls: np.ndarray,
+                   margin: Tuple[float, float] = MARGIN) -> np.ndarray:
+    """
+    Владелец каждого предмета: индекс человека (O,), -1 — ничей.
+    Предмет достаётся одному человеку (лучшая affinity), а не всем, кто рядом;
+    головы и лица дополнительно распределяются один-к-одному (у человека одна голова),
+    чтобы чужая голова не перетянулась к соседу.
+    """
+    person_boxes = np.asarray(person_boxes, dtype=np.float32).reshape(-1, 4)
+    object_boxes = np.asarray(object_boxes, dtype=np.float32).reshape(-1, 4)
+    owner = np.full(len(object_boxes), -1, dtype=np.intp)
+    if len(person_boxes) == 0 or len(object_boxes) == 0:
+        return owner
+
+    scores = affinity(person_boxes, object_boxes, margin)
+    best = scores.argmax(axis=0)
+    owner = np.where(scores[best, np.arange(len(object_boxes))] >= 0, best, -1)
+
+    for part in SINGLE_PARTS:
+        idx = np.flatnonzero(np.isin(object_cls, part))
+        if len(idx) == 0:
+            continue
+        rows, cols = greedy_match(scores[:, idx], 0.0)
+        owner[idx] = -1
+        owner[idx[cols]] = rows
+    return owner
+
+
+def violation_flags(person_boxes: np.ndarray, object_boxes: np.ndarray, object_cls: np.ndarray,
+                    one_to_one: bool = True, margin: Tuple[float, float] = MARGIN) -> np.ndarray:
+    """
+    (P, len(VIOLATION_NAMES)): у человека есть предмет-нарушение.
+    one_to_one=False — как раньше: предмет засчитывается каждому, в чей бокс попал центр.
+    one_to_one=True — только владельцу из assign_objects.
+    """
+    person_boxes = np.asarray(person_boxes, dtype=np.float32).reshape(-1, 4)
+    object_boxes = np.asarray(object_boxes, dtype=np.float32).reshape(-1, 4)
+    object_cls = np.asarray(object_cls).reshape(-1)
+    flags = np.zeros((len(person_boxes), len(VIOLATION_NAMES)), dtype=bool)
+    if len(person_boxes) == 0 or len(object_boxes) == 0:
+        return flags
+
+    if not one_to_one:
+        near = containment(person_boxes, object_boxes, margin)
+        for v, cls_id in enumerate(PPE_VIOLATIONS):
+            flags[:, v] = (near & (object_cls == cls_id)[None, :]).any(axis=1)
+        return flags
+
+    owner = assign_objects(person_boxes, object_boxes, object_cls, margin)
+    for v, cls_id in enumerate(PPE_VIOLATIONS):
+        hit = (object_cls == cls_id) & (owner >= 0)
+        flags[owner[hit], v] = True
+    return flags
@@ -0,0 +1,113 @@
+# backend/app/services/preprocessing.py
+import cv2
+import numpy as np
+import torch
+from typing import Dict, Iterable, List, Optional
+
+
+class Letterbox:
+    """
+    Кадр, приведённый к входу модели: resize с сохранением пропорций + паддинг
+    до кратности stride (как LetterBox(auto=True) в ultralytics).
+    Хранит и uint8-картинку, и готовый тензор BCHW/RGB/float 0..1.
+    """
+    __slots__ = ("image", "tensor", "ratio", "pad")
+
+    def __init__(self, image: np.ndarray, tensor: torch.Tensor, ratio: float, pad: tuple):
+        self.image = image
+        self.tensor = tensor
+        self.ratio = ratio
+        self.pad = pad  # (left, top)
+
+    def boxes_to_frame(self, xyxy: np.ndarray) -> np.ndarray:
+        """Боксы из координат letterbox обратно в координаты исходного кадра."""
+        out = np.asarray(xyxy, dtype=np.float32).copy()
+        out[:, [0, 2]] = (out[:, [0, 2]] - self.pad[0]) / self.ratio
+        out[:, [1, 3]] = (out[:, [1, 3]] - self.pad[1]) / self.ratio
+        return out
+
+    def points_to_frame(self, points: np.ndarray) -> np.ndarray:
+        """Точки (..., 2+) — например, keypoints (N, 17, 3)."""
+        out = np.asarray(points, dtype=np.float32).copy()
+        out[..., 0] = (out[..., 0] - self.pad[0]) / self.ratio
+        out[..., 1] = (out[..., 1] - self.pad[1]) / self.ratio
+        return out
+
+
+class FramePreprocessor:
+    """
+    Общая предобработка кадра для всего каскада моделей.
+    Каждое разрешение строится один раз на кадр; меньшие разрешения
+    ресайзятся из уже уменьшенной копии, а не из полного 1080p кадра.
+    """
+    PAD_VALUE = (114, 114, 114)
+
+    def __init__(self, stride: int = 32, device: Optional[str] = None):
+        self.stride = stride
+        self.device = torch.device(device or ("cuda:0" if torch.cuda.is_available() else "cpu"))
+
+    def prepare(self, frame: np.ndarray, sizes: Iterable[int]) -> Dict[int, Letterbox]:
+        h, w = frame.shape[:2]
+        src = frame
+        result: Dict[int, Letterbox] = {}
+
+        for size in sorted(set(sizes), reverse=True):
+            ratio = min(size / h, size / w)
+            new_w, new_h = int(round(w * ratio)), int(round(h * ratio))
+            if (src.shape[1], src.shape[0]) != (new_w, new_h):
+                src = cv2.resize(src, (new_w, new_h), interpolation=cv2.INTER_LINEAR)
+
+            pad_w = (-new_w) % self.stride
+            pad_h = (-new_h) % self.stride
+            left, top = pad_w // 2, pad_h // 2
+            image = cv2.copyMakeBorder(src, top, pad_h - top, left, pad_w - left,
+                                       cv2.BORDER_CONSTANT, value=self.PAD_VALUE)
+            result[size] = Letterbox(image, self._to_tensor(image), ratio, (left, top))
+
+        return result
+
+    def _to_tensor(self, image: np.ndarray) -> torch.Tensor:
+        # BGR HWC uint8 -> RGB CHW float, одно копирование на разрешение
+        chw = np.ascontiguousarray(image[..., ::-1].transpose(2, 0, 1))
+        return torch.from_numpy(chw).to(self.device).float().div_(255.0).unsqueeze(0)
+
+    @staticmethod
+    def stack(letterboxes: List[Letterbox]) -> Optional[torch.Tensor]:
+        """Батч тензоров одного разрешения (None, если формы кадров различаются)."""
+        shapes = {lb.tensor.shape for lb in letterboxes}
+        if len(shapes) != 1:
+            return None
+        return torch.cat([lb.tensor for lb in letterboxes], dim=0)
+
+    def tiles_to_tensor(self, tiles: List[np.ndarray]) -> torch.Tensor:
+        """Тайлы одного размера -> один батч-тензор BCHW (одно копирование на батч)."""
+        batch = np.ascontiguousarray(np.stack(tiles)[..., ::-1].transpose(0, 3, 1, 2))
+        return torch.from_numpy(batch).to(self.device).float().div_(255.0)
+
+
+def tile_grid(width: int, height: int, tile: int, overlap: float = 0.2,
+              rois: Optional[np.ndarray] = None) -> np.ndarray:
+    """
+    Сетка перекрывающихся тайлов tile x tile (xyxy, int), покрывающая кадр;
+    последний ряд/столбец прижат к краю. rois (R, 4) — оставить только тайлы,
+    пересекающие хотя бы одну область. Кадр меньше тайла не режется.
+    """
+    if width < tile or height < tile:
+        return np.zeros((0, 4), dtype=int)
+
+    step = max(1, int(tile * (1.0 - overlap)))
+
+    def starts(size):
+        pos = np.arange(0, size - tile + 1, step)
+        return pos if pos[-1] == size - tile else np.append(pos, size - tile)
+
+    gx, gy = np.meshgrid(starts(width), starts(height))
+    x0, y0 = gx.ravel(), gy.ravel()
+    tiles = np.stack([x0, y0, x0 + tile, y0 + tile], axis=1)
+
+    if rois is not None:
+        rois = np.asarray(rois, dtype=np.float32).reshape(-1, 4)
+        hit = ((tiles[:, None, 0] < rois[None, :, 2]) & (tiles[:, None, 2] > rois[None, :, 0])
+               & (tiles[:, None, 1] < rois[None, :, 3]) & (tiles[:, None, 3] > rois[None, :, 1]))
+        tiles = tiles[hit.any(axis=1)]
+    return tiles
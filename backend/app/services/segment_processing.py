@@ -0,0 +1,187 @@
+# backend/app/services/segment_processing.py
+import asyncio
+import cv2
+import numpy as np
+from typing import Dict, List, Tuple
+
+from app.db.session import AsyncSessionLocal
+from app.db.models import SafetyEvent, TrainEvent
+from app.services.box_ops import iou_matrix
+from app.services.inference_worker import inference_pool
+from app.services.trajectory_store import trajectory_store
+
+# Сколько кадров перед началом сегмента прогоняем "вхолостую":
+# прогрев трекера + общие кадры с хвостом предыдущего сегмента для склейки ID
+SEGMENT_PREROLL_FRAMES = 75
+# Минимальный средний IoU, чтобы считать треки на стыке одним человеком
+STITCH_IOU_THRESHOLD = 0.3
+# Окно дедупликации одинаковых событий одного трека (секунды видео)
+EVENT_DEDUP_WINDOW_SEC = 1.5
+
+
+def split_into_segments(total_frames: int, segments: int) -> List[Tuple[int, int]]:
+    """Делит ролик на (start_frame, end_frame] примерно равной длины."""
+    segments = max(1, min(segments, total_frames // (SEGMENT_PREROLL_FRAMES * 2) or 1))
+    step = total_frames // segments
+    bounds = []
+    for i in range(segments):
+        start = i * step
+        end = total_frames if i == segments - 1 else (i + 1) * step
+        bounds.append((start, end))
+    return bounds
+
+
+def _run_segment_job(video_path: str, video_id: int, start: int, end: int) -> dict:
+    """Выполняется в воркере пула: анализ сегмента без записи в БД."""
+    from app.services import inference_worker
+    from app.services.video_stream import SmartVideoProcessor
+
+    processor = SmartVideoProcessor(
+        video_path,
+        video_id,
+        start_frame=start,
+        end_frame=end,
+        preroll_frames=SEGMENT_PREROLL_FRAMES,
+        collect_results=True,
+    )
+    inference_worker._worker_loop.run_until_complete(processor.process())
+    return {
+        "start": start,
+        "end": end,
+        "events": processor.collected_events,
+        "train_events": processor.collected_train_events,
+        "boundary_tracks": processor.boundary_tracks,
+        "workers": processor.worker_summary(),
+    }
+
+
+def _match_boundary_tracks(prev_seg: dict, next_seg: dict) -> Dict[int, int]:
+    """
+    Сопоставляет локальные ID следующего сегмента с ID предыдущего
+    по среднему IoU на общих кадрах перекрытия.
+    Возвращает next_local_id -> prev_local_id.
+    """
+    common = set(prev_seg["boundary_tracks"]) & set(next_seg["boundary_tracks"])
+    if not common:
+        return {}
+
+    iou_sum: Dict[Tuple[int, int], float] = {}
+    for fid in common:
+        prev_tracks = prev_seg["boundary_tracks"][fid]
+        next_tracks = next_seg["boundary_tracks"][fid]
+        ious = iou_matrix([box for _, box in prev_tracks], [box for _, box in next_tracks])
+        for i, j in zip(*np.nonzero(ious)):
+            key = (prev_tracks[i][0], next_tracks[j][0])
+            iou_sum[key] = iou_sum.get(key, 0.0) + float(ious[i, j])
+
+    # Жадно: пары с наибольшим средним IoU, каждый трек используется один раз
+    mapping: Dict[int, int] = {}
+    used_prev = set()
+    for (prev_id, next_id), total in sorted(iou_sum.items(), key=lambda kv: kv[1], reverse=True):
+        if total / len(common) < STITCH_IOU_THRESHOLD:
+            break
+        if prev_id in used_prev or next_id in mapping:
+            continue
+        mapping[next_id] = prev_id
+        used_prev.add(prev_id)
+    return mapping
+
+
+def merge_segment_results(results: List[dict]) -> dict:
+    """
+    Склеивает результаты сегментов:
+    - сквозные track_id через границы сегментов (track_maps: начало сегмента -> локальный -> сквозной),
+    - объединённые истории WorkerState,
+    - дедуплицированные SafetyEvent и TrainEvent.
+    """
+    results = sorted(results, key=lambda r: r["start"])
+    next_global_id = 1
+    prev_map: Dict[int, int] = {}  # локальный ID предыдущего сегмента -> глобальный
+    events: List[dict] = []
+    workers: Dict[int, dict] = {}
+    track_maps: Dict[int, Dict[int, int]] = {}
+
+    for i, seg in enumerate(results):
+        stitched = _match_boundary_tracks(results[i - 1], seg) if i > 0 else {}
+        local_ids = set(seg["workers"]) | {e["track_id"] for e in seg["events"]}
+        for fid_tracks in seg["boundary_tracks"].values():
+            local_ids.update(tid for tid, _ in fid_tracks)
+
+        seg_map: Dict[int, int] = {}
+        for local_id in sorted(local_ids):
+            if local_id in stitched and stitched[local_id] in prev_map:
+                seg_map[local_id] = prev_map[stitched[local_id]]
+            else:
+                seg_map[local_id] = next_global_id
+                next_global_id += 1
+
+        for local_id, info in seg["workers"].items():
+            gid = seg_map[local_id]
+            merged = workers.setdefault(gid, {"risk_score": 0, "state": "Unknown", "zone": "Safe"})
+            merged["risk_score"] += info["risk_score"]
+            merged["state"] = info["state"]
+            merged["zone"] = info["zone"]
+
+        for ev in seg["events"]:
+            events.append({**ev, "track_id": seg_map[ev["track_id"]]})
+
+        track_maps[seg["start"]] = seg_map
+        prev_map = seg_map
+
+    # Дедупликация: одно и то же нарушение одного трека в пределах окна
+    events.sort(key=lambda e: (e["track_id"], e["event_type"], e["video_timestamp"]))
+    deduped: List[dict] = []
+    for ev in events:
+        last = deduped[-1] if deduped else None
+        if (last is not None and last["track_id"] == ev["track_id"]
+                and last["event_type"] == ev["event_type"]
+                and ev["video_timestamp"] - last["video_timestamp"] < EVENT_DEDUP_WINDOW_SEC):
+            continue
+        deduped.append(ev)
+    deduped.sort(key=lambda e: e["video_timestamp"])
+
+    # Поезда: оставляем самое раннее прибытие каждого состава
+    train_events: Dict[str, dict] = {}
+    for seg in results:
+        for te in seg["train_events"]:
+            known = train_events.get(te["full_train_id"])
+            if known is None or te["frame_number"] < known["frame_number"]:
+                train_events[te["full_train_id"]] = te
+
+    return {"events": deduped, "train_events": list(train_events.values()), "workers": workers,
+            "track_maps": track_maps}
+
+
+async def process_video_segmented(video_path: str, video_id: int, segments: int) -> dict:
+    """
+    Параллельный анализ длинного ролика: сегменты уходят в пул воркеров,
+    результаты склеиваются и пишутся в БД одной транзакцией.
+    """
+    cap = cv2.VideoCapture(video_path)
+    total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    cap.release()
+    if total_frames <= 0:
+        return await inference_pool.process_video(video_path, video_id)
+
+    bounds = split_into_segments(total_frames, segments)
+    print(f"⚡ SEGMENTED PIPELINE: Video {video_id}, {total_frames} frames -> {len(bounds)} segments")
+    trajectory_store.clear(video_id)
+
+    results = await asyncio.gather(*[
+        inference_pool.run(_run_segment_job, video_path, video_id, start, end)
+        for start, end in bounds
+    ])
+    merged = merge_segment_results(results)
+    # Сегменты писали траектории с локальными ID — переводим в сквозные, как у событий
+    await asyncio.to_thread(trajectory_store.remap_tracks, video_id, merged["track_maps"])
+
+    async with AsyncSessionLocal() as db:
+        for fields in merged["train_events"]:
+            db.add(TrainEvent(**fields))
+        for fields in merged["events"]:
+            db.add(SafetyEvent(**fields))
+        await db.commit()
+
+    print(f"✅ SEGMENTED ANALYSIS COMPLETE: {len(merged['events'])} events, {len(merged['workers'])} workers")
+    return {"video_id": video_id, "frames": total_frames, "events": len(merged["events"]),
+            "segments": len(bounds)}
@@ -1,44 +1,123 @@
 # backend/app/services/tracker.py
-from ultralytics import YOLO
 import numpy as np
-from typing import List, Dict, Any
+
+from app.services.box_ops import greedy_match, iou_matrix
 
 
 class ObjectTracker:
-    def __init__(self, model_path: str = "yolo11n.pt"):
-        print(f"Initializing Tracker with {model_path}...")
-        self.model = YOLO(model_path)
-
-    def track_frame(self, frame: np.ndarray) -> List[Dict[str, Any]]:
-        """
-        Запускает трекинг на одном кадре.
-        Возвращает детекции + track_id.
-        """
-        # persist=True важен для трекинга видеопотока!
-        results = self.model.track(
-            frame,
-            persist=True,
-            tracker="bytetrack.yaml",
-            verbose=False,
-            classes=[0]  # Только люди пока
-        )[0]
-
-        tracked_objects = []
-
-        if results.boxes and results.boxes.id is not None:
-            boxes = results.boxes.xyxy.cpu().numpy().astype(int)
-            track_ids = results.boxes.id.cpu().numpy().astype(int)
-            confs = results.boxes.conf.cpu().numpy()
-
-            for box, track_id, conf in zip(boxes, track_ids, confs):
-                tracked_objects.append({
-                    "track_id": int(track_id),
-                    "bbox": box.tolist(),  # [x1, y1, x2, y2]
-                    "confidence": float(conf),
-                    "class_name": "person"
-                })
-
-        return tracked_objects
-
-
-tracker_instance = ObjectTracker()
+    """
+    Лёгкий трекер в стиле ByteTrack/SORT на чистом numpy, не привязанный к модели:
+    принимает боксы любого детектора (Pose, P2, тайлы) и раздаёт им ID.
+    - Движение: бокс + скорость (сглаженная разница предсказания и детекции).
+    - Сопоставление по IoU в два этапа (ByteTrack): уверенные детекции со всеми
+      подтверждёнными треками, затем слабые — с оставшимися треками, видимыми на прошлом кадре.
+    - Новый трек — из несопоставленной детекции с score >= new_track_thresh; он пробный,
+      пока не наберёт min_hits попаданий подряд (одиночный ложняк тайлов ID не получает),
+      и удаляется при первом же пропуске.
+    - Подтверждённый трек без детекций живёт max_age обновлений
+      (track_buffer кадров при 30 FPS, как в bytetrack.yaml).
+    ID уникальны в пределах трекера, начинаются с 1 и выдаются при подтверждении;
+    -1 — детекция без трека (в т.ч. пробного).
+    """
+    def __init__(
+        self,
+        frame_rate: int = 30,
+        high_thresh: float = 0.5,
+        low_thresh: float = 0.1,
+        new_track_thresh: float = 0.6,
+        min_hits: int = 3,
+        match_iou: float = 0.2,
+        track_buffer: int = 30,
+        velocity_smoothing: float = 0.5,
+    ):
+        self.high_thresh = high_thresh
+        self.low_thresh = low_thresh
+        self.new_track_thresh = new_track_thresh
+        self.min_hits = max(1, min_hits)
+        self.match_iou = match_iou
+        self.max_age = max(1, int(frame_rate / 30.0 * track_buffer))
+        self.velocity_smoothing = velocity_smoothing
+        self.reset()
+
+    def reset(self):
+        self.boxes = np.zeros((0, 4), dtype=np.float32)
+        self.velocity = np.zeros((0, 4), dtype=np.float32)
+        self.ids = np.zeros(0, dtype=np.int32)  # 0 — пробный трек, ID ещё не выдан
+        self.misses = np.zeros(0, dtype=np.int32)  # обновлений подряд без детекции
+        self.hits = np.zeros(0, dtype=np.int32)  # попаданий подряд (важно только пробным)
+        self._next_id = 1
+
+    def __len__(self):
+        """Число подтверждённых треков."""
+        return int((self.ids > 0).sum())
+
+    def update(self, boxes: np.ndarray, scores: np.ndarray) -> np.ndarray:
+        """Один кадр: боксы xyxy (N, 4) и уверенности (N,) -> ID треков (N,)."""
+        boxes = np.asarray(boxes, dtype=np.float32).reshape(-1, 4)
+        scores = np.asarray(scores, dtype=np.float32).reshape(-1)
+        track_ids = np.full(len(boxes), -1, dtype=np.int32)
+
+        predicted = self.boxes + self.velocity
+        confirmed = np.flatnonzero(self.ids > 0)
+        tentative = np.flatnonzero(self.ids == 0)
+        det_idx = np.zeros(0, dtype=int)
+        trk_idx = np.zeros(0, dtype=int)
+
+        # 1. Уверенные детекции — со всеми подтверждёнными треками (включая потерянные)
+        high = np.flatnonzero(scores >= self.high_thresh)
+        rows, cols = greedy_match(iou_matrix(predicted[confirmed], boxes[high]), self.match_iou)
+        trk_idx, det_idx = np.append(trk_idx, confirmed[rows]), np.append(det_idx, high[cols])
+
+        # 2. Слабые детекции — только с треками, видимыми на прошлом кадре
+        low = np.flatnonzero((scores >= self.low_thresh) & (scores < self.high_thresh))
+        free = np.setdiff1d(confirmed[self.misses[confirmed] == 0], trk_idx)
+        rows, cols = greedy_match(iou_matrix(predicted[free], boxes[low]), self.match_iou)
+        trk_idx, det_idx = np.append(trk_idx, free[rows]), np.append(det_idx, low[cols])
+
+        # 3. Пробные треки — с оставшимися уверенными детекциями
+        rest = np.setdiff1d(high, det_idx)
+        rows, cols = greedy_match(iou_matrix(predicted[tentative], boxes[rest]), self.match_iou)
+        trk_idx, det_idx = np.append(trk_idx, tentative[rows]), np.append(det_idx, rest[cols])
+
+        # Обновление совпавших: коррекция скорости на ошибку предсказания
+        error = boxes[det_idx] - predicted[trk_idx]
+        self.velocity[trk_idx] += self.velocity_smoothing * error
+        predicted[trk_idx] = boxes[det_idx]
+        self.boxes = predicted
+        self.misses += 1
+        self.misses[trk_idx] = 0
+        self.hits[trk_idx] += 1
+        # Без детекций скорость затухает: потерянный трек не улетает из кадра
+        self.velocity[self.misses > 0] *= 0.8
+
+        # Пробные, набравшие min_hits подряд, получают ID
+        self._confirm()
+        track_ids[det_idx] = self.ids[trk_idx]
+
+        # Потерянные дольше max_age и пробные с пропуском — удаляем
+        alive = np.where(self.ids > 0, self.misses <= self.max_age, self.misses == 0)
+        self._keep(alive)
+
+        # 4. Новые (пробные) треки из несопоставленных детекций, уверенных для старта
+        new = np.setdiff1d(np.flatnonzero(scores >= self.new_track_thresh), det_idx)
+        if len(new):
+            n = len(new)
+            self.boxes = np.concatenate([self.boxes, boxes[new]])
+            self.velocity = np.concatenate([self.velocity, np.zeros((n, 4), dtype=np.float32)])
+            self.ids = np.concatenate([self.ids, np.zeros(n, dtype=np.int32)])
+            self.misses = np.concatenate([self.misses, np.zeros(n, dtype=np.int32)])
+            self.hits = np.concatenate([self.hits, np.ones(n, dtype=np.int32)])
+            # min_hits=1 — трек подтверждается сразу, как в исходном SORT
+            self._confirm()
+            track_ids[new] = self.ids[-n:]
+        return np.where(track_ids > 0, track_ids, -1).astype(np.int32)
+
+    def _confirm(self):
+        ready = np.flatnonzero((self.ids == 0) & (self.hits >= self.min_hits))
+        if len(ready):
+            self.ids[ready] = np.arange(self._next_id, self._next_id + len(ready), dtype=np.int32)
+            self._next_id += len(ready)
+
+    def _keep(self, mask: np.ndarray):
+        self.boxes, self.velocity = self.boxes[mask], self.velocity[mask]
+        self.ids, self.misses, self.hits = self.ids[mask], self.misses[mask], self.hits[mask]
@@ -5,7 +5,7 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
 
 from app.db.models import TrainEvent, VideoFile
-from app.services.ocr_service import ocr_instance
+from app.services.ocr_service import TimestampReader, get_ocr
 from app.services.train_tracker import TrainTracker
 
 
@@ -17,6 +17,8 @@ async def process_trains_for_video(
     departure_timeout: int = 30 # секунд без поезда до departure
 ):
     tracker = TrainTracker(departure_timeout=departure_timeout)
+    # Часы — шаблонами цифр; EasyOCR, как и раньше, на каждом кадре без сверенного времени
+    timestamps = TimestampReader(fallback_sec=0.0)
 
     cap = cv2.VideoCapture(video_path)
     fps = cap.get(cv2.CAP_PROP_FPS) or 25
@@ -39,7 +41,7 @@ async def process_trains_for_video(
             continue
 
         # 1) OCR времени в левом верхнем углу
-        ts_str = ocr_instance.extract_timestamp(frame)
+        ts_str = timestamps.read(frame, frame_idx / fps)
         if not ts_str:
             continue
 
@@ -55,7 +57,7 @@ async def process_trains_for_video(
 
         # 2) OCR номера поезда (берём весь кадр как bbox)
         h, w, _ = frame.shape
-        train_info = ocr_instance.extract_train_number(frame, (0, 0, w, h))
+        train_info = get_ocr().extract_train_number(frame, (0, 0, w, h))
         if not train_info:
             # если поезда нет в кадре, всё равно нужно проверить departures
             for dep in tracker.check_departures(video_ts):
@@ -0,0 +1,193 @@
+# backend/app/services/trajectory_store.py
+import itertools
+import os
+import shutil
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from app.core.config import settings
+from app.services.zones import CompiledPolygon
+
+PARTITION_SEC = 3600  # партиция = час реального времени
+GRID = 32  # пространственный индекс: сетка GRID x GRID по нормированным координатам
+FLUSH_ROWS = 50_000
+EPOCH = datetime(1970, 1, 1)
+
+TRAJECTORY_DTYPE = np.dtype([
+    ("cell", np.uint16),   # ячейка сетки: строки чанка отсортированы по ней
+    ("t", np.float64),     # реальное время кадра, сек. от EPOCH
+    ("segment", np.int32), # начальный кадр сегмента, пока ID локальны для него; 0 — сквозные ID
+    ("track_id", np.int32),
+    ("x", np.float32),     # точка ног, нормированные координаты кадра
+    ("y", np.float32),
+])
+
+
+def _to_seconds(dt: datetime) -> float:
+    if dt.tzinfo is not None:  # время процессора — наивное UTC/локальное время камеры
+        dt = dt.astimezone(timezone.utc).replace(tzinfo=None)
+    return (dt - EPOCH).total_seconds()
+
+
+def _cells(x: np.ndarray, y: np.ndarray) -> np.ndarray:
+    gx = np.clip((x * GRID).astype(np.int32), 0, GRID - 1)
+    gy = np.clip((y * GRID).astype(np.int32), 0, GRID - 1)
+    return (gy * GRID + gx).astype(np.uint16)
+
+
+class TrajectoryWriter:
+    """
+    Копит точки ног треков одного процессора и сбрасывает их чанками
+    в часовые партиции: <TRAJECTORY_DIR>/<video_id>/<час>/<чанк>.npy.
+    Чанк отсортирован по ячейке сетки — это и есть пространственный индекс.
+    Имена чанков уникальны (pid + счётчик): сегменты пишут параллельно без блокировок.
+    """
+    _seq = itertools.count()
+
+    def __init__(self, video_id: int, segment: int = 0, root: Optional[str] = None):
+        self.video_id = video_id
+        self.segment = segment
+        self.root = root or settings.TRAJECTORY_DIR
+        self._chunks: List[np.ndarray] = []
+        self._rows = 0
+
+    def append(self, when: datetime, track_ids: np.ndarray, feet_norm: np.ndarray):
+        n = len(track_ids)
+        if n == 0:
+            return
+        rows = np.zeros(n, dtype=TRAJECTORY_DTYPE)
+        rows["t"] = _to_seconds(when)
+        rows["segment"] = self.segment
+        rows["track_id"] = track_ids
+        rows["x"], rows["y"] = feet_norm[:, 0], feet_norm[:, 1]
+        rows["cell"] = _cells(rows["x"], rows["y"])
+        self._chunks.append(rows)
+        self._rows += n
+        if self._rows >= FLUSH_ROWS:
+            self.flush()
+
+    def flush(self):
+        if not self._chunks:
+            return
+        rows = np.concatenate(self._chunks)
+        self._chunks, self._rows = [], 0
+        hours = (rows["t"] // PARTITION_SEC).astype(np.int64)
+        for hour in np.unique(hours):
+            part = rows[hours == hour]
+            part = part[np.argsort(part["cell"], kind="stable")]
+            directory = os.path.join(self.root, str(self.video_id), str(hour))
+            os.makedirs(directory, exist_ok=True)
+            name = f"{os.getpid()}-{next(self._seq)}.npy"
+            tmp = os.path.join(directory, name + ".tmp")
+            with open(tmp, "wb") as f:
+                np.save(f, part)
+            os.replace(tmp, os.path.join(directory, name))
+
+
+class TrajectoryStore:
+    """
+    Ретроспективные запросы "кто был в полигоне за интервал времени" по
+    сохранённым траекториям — без видео и нейросетей.
+    Партиции отбираются по времени, внутри чанка — срезы по ячейкам сетки,
+    попавшим в bbox полигона; точная проверка — только для этих строк.
+    """
+    def __init__(self, root: Optional[str] = None):
+        self.root = root or settings.TRAJECTORY_DIR
+
+    def clear(self, video_id: Optional[int] = None):
+        """Удаляет траектории видео; без video_id — все."""
+        target = self.root if video_id is None else os.path.join(self.root, str(video_id))
+        shutil.rmtree(target, ignore_errors=True)
+
+    def _chunk_paths(self, video_id: int, t_from: Optional[float] = None, t_to: Optional[float] = None):
+        """Чанки видео в часовых партициях, пересекающих [t_from, t_to] (None — без границы)."""
+        base = os.path.join(self.root, str(video_id))
+        if not os.path.isdir(base):
+            return
+        for hour in sorted(int(h) for h in os.listdir(base) if h.lstrip("-").isdigit()):
+            if (t_from is None or t_from // PARTITION_SEC <= hour) and (t_to is None or hour <= t_to // PARTITION_SEC):
+                directory = os.path.join(base, str(hour))
+                for name in sorted(os.listdir(directory)):
+                    if name.endswith(".npy"):
+                        yield os.path.join(directory, name)
+
+    def _chunks(self, video_id: int, t_from: float, t_to: float):
+        for path in self._chunk_paths(video_id, t_from, t_to):
+            yield np.load(path, mmap_mode="r")
+
+    def remap_tracks(self, video_id: int, track_maps: Dict[int, Dict[int, int]]):
+        """
+        Сегментный прогон: локальные ID сегментов -> сквозные ID склейки
+        (segment_processing.merge_segment_results). Правка на месте через memmap,
+        порядок строк (сортировка по ячейке) не меняется; переназначенные строки
+        получают segment=0. ID без пары в карте остаются локальными.
+        """
+        for path in self._chunk_paths(video_id):
+            chunk = np.load(path, mmap_mode="r+")
+            for segment, mapping in track_maps.items():
+                rows = np.flatnonzero(chunk["segment"] == segment)
+                if len(rows) == 0 or not mapping:
+                    continue
+                local_ids = chunk["track_id"][rows]
+                lut = np.full(max(max(mapping), int(local_ids.max())) + 1, -1, dtype=np.int32)
+                lut[list(mapping)] = list(mapping.values())
+                global_ids = lut[local_ids]
+                known = global_ids >= 0
+                chunk["track_id"][rows[known]] = global_ids[known]
+                chunk["segment"][rows[known]] = 0
+            chunk.flush()
+            del chunk
+
+    def query(self, video_id: int, polygon: List[List[float]], start: datetime, end: datetime) -> List[dict]:
+        """
+        Треки, чья точка ног была внутри полигона (нормированные координаты) в [start, end].
+        Возвращает по треку: первое/последнее время внутри и число точек, по времени входа.
+        """
+        t_from, t_to = _to_seconds(start), _to_seconds(end)
+        poly = np.asarray(polygon, dtype=np.float64)
+        compiled = CompiledPolygon(poly)
+        x1, y1 = np.clip((poly.min(axis=0) * GRID).astype(int), 0, GRID - 1)
+        x2, y2 = np.clip((poly.max(axis=0) * GRID).astype(int), 0, GRID - 1)
+        # Ячейки одной строки сетки идут подряд: по диапазону на строку
+        cell_ranges = [(gy * GRID + x1, gy * GRID + x2 + 1) for gy in range(y1, y2 + 1)]
+
+        matched = []
+        for chunk in self._chunks(video_id, t_from, t_to):
+            bounds = np.searchsorted(chunk["cell"], np.asarray(cell_ranges, dtype=np.uint16).ravel())
+            for lo, hi in bounds.reshape(-1, 2):
+                if lo == hi:
+                    continue
+                rows = np.asarray(chunk[lo:hi])
+                rows = rows[(rows["t"] >= t_from) & (rows["t"] <= t_to)]
+                if len(rows):
+                    matched.append(rows[compiled.contains(np.stack([rows["x"], rows["y"]], axis=1))])
+        if not matched:
+            return []
+
+        # Агрегация по треку (сегмент, track_id) одним проходом
+        rows = np.concatenate(matched)
+        keys = np.stack([rows["segment"], rows["track_id"]], axis=1)
+        unique, inverse = np.unique(keys, axis=0, return_inverse=True)
+        inverse = inverse.reshape(-1)
+        first = np.full(len(unique), np.inf)
+        last = np.full(len(unique), -np.inf)
+        np.minimum.at(first, inverse, rows["t"])
+        np.maximum.at(last, inverse, rows["t"])
+        counts = np.bincount(inverse, minlength=len(unique))
+
+        result = [
+            {
+                "segment": int(segment),
+                "track_id": int(track_id),
+                "first_seen": EPOCH + timedelta(seconds=float(f)),
+                "last_seen": EPOCH + timedelta(seconds=float(l)),
+                "points": int(n),
+            }
+            for (segment, track_id), f, l, n in zip(unique, first, last, counts)
+        ]
+        return sorted(result, key=lambda r: r["first_seen"])
+
+
+trajectory_store = TrajectoryStore()
@@ -1,27 +1,30 @@
-import cv2
+import time
 import asyncio
 import numpy as np
 from datetime import datetime, timedelta
-from collections import deque, defaultdict
-from typing import Dict, Tuple, List
+from collections import defaultdict
+from contextlib import nullcontext
+from typing import Callable, Dict, Tuple, List, Optional
 
-from app.services.detector import detector_instance
+from app.services.detector import get_detector
 from app.db.session import AsyncSessionLocal
 from app.db.models import SafetyEvent, TrainEvent
-from app.services.zones import zone_service
-from app.services.ocr_service import ocr_instance
+from app.services.zones import RESTRICTED_ZONE_TYPES, SAFE_ZONE, Zone, zone_service
+from app.services.ocr_service import TimestampReader, get_ocr
 from app.services.train_tracker import TrainTracker
+from app.services.frame_reader import ThreadedFrameReader, LiveFrameReader
+from app.services.frame_sampler import FixedFrameSampler, AdaptiveFrameSampler
+from app.services.batch_scheduler import BatchInferenceScheduler
+from app.services.keyframe import KeyframePropagator
+from app.services.detection_cache import DetectionCache, DetectionCacheWriter, cache_dir, zones_key
+from app.services.detections import DetectionBatch
+from app.services.ghost_tracks import GhostTrackStore
+from app.services.worker_state import WorkerState, WorkerStateStore
+from app.services.trajectory_store import TrajectoryWriter, trajectory_store
+from app.services.ppe import VIOLATION_NAMES, violation_flags
+from app.core.config import settings
 
-
-class WorkerState:
-    def __init__(self, track_id):
-        self.track_id = track_id
-        self.positions = deque(maxlen=30)
-        self.keypoints_history = deque(maxlen=30)
-        self.state = "Unknown"
-        self.zone = "Safe"
-        self.violation_buffer = defaultdict(lambda: deque(maxlen=10))
-        self.risk_score = 0
+FRAME_STRIDE = 3  # базовый шаг анализа кадров видеофайла
 
 
 async def start_video_processing_task(video_path: str, video_id: int):
@@ -30,271 +33,568 @@ async def start_video_processing_task(video_path: str, video_id: int):
 
 
 class SmartVideoProcessor:
-    def __init__(self, video_path: str, video_db_id: int):
+    def __init__(
+        self,
+        video_path: str,
+        video_db_id: int,
+        start_frame: int = 0,
+        end_frame: Optional[int] = None,
+        preroll_frames: int = 0,
+        collect_results: bool = False,
+        batch_scheduler: Optional[BatchInferenceScheduler] = None,
+        live: bool = False,
+        camera_id: str = "CAM-01",
+        use_cache: bool = True,
+    ):
         self.video_path = video_path
         self.video_db_id = video_db_id
-        self.workers: Dict[int, WorkerState] = {}
-        self.last_alert_time: Dict[int, float] = defaultdict(float)
-        self.ghost_tracks: Dict[int, Tuple[float, float, int]] = {}
+
+        # Диапазон кадров (для сегментной обработки): (start_frame, end_frame]
+        self.start_frame = start_frame
+        self.end_frame = end_frame
+        self.preroll_frames = preroll_frames if start_frame > 0 else 0
+        # collect_results=True: события не пишутся в БД, а копятся в памяти
+        self.collect_results = collect_results
+        self.collected_events: List[dict] = []
+        self.collected_train_events: List[dict] = []
+        self.boundary_tracks: Dict[int, List[Tuple[int, List[int]]]] = {}
+        self.events_count = 0
+
+        # Общий батчер для нескольких потоков (камер) в одном процессе
+        self.batch_scheduler = batch_scheduler
+        self.stream_id = f"{video_db_id}:{start_frame}"
+
+        # Live-режим (RTSP / камера): анализируем каждый доставленный кадр,
+        # прореживание делает сам LiveFrameReader (старые кадры выбрасываются).
+        # Для файлов прореживает сэмплер в потоке декодера (см. _make_sampler)
+        self.live = live
+        self.camera_id = camera_id
+        # Кеш сырых детекций: повторный анализ проигрывает только правила и зоны
+        self.use_cache = use_cache and settings.DETECTION_CACHE and not live and not collect_results
+        self.cache_writer: Optional[DetectionCacheWriter] = None
+        self.replay: Optional[DetectionCache] = None
+        self._last_run: Dict[str, int] = defaultdict(int)
+        self.live_reader: Optional[LiveFrameReader] = None
+        self._live_started = 0.0
+        self._stop_requested = False
+        self.frames_analyzed = 0
+
+        # Каскад моделей только на ключевых кадрах, между ними — перенос боксов потоком
+        self.keyframes = KeyframePropagator(
+            interval=settings.KEYFRAME_INTERVAL,
+            min_confidence=settings.KEYFRAME_MIN_CONFIDENCE,
+            new_object_motion=settings.KEYFRAME_NEW_OBJECT_MOTION,
+        ) if settings.KEYFRAME_INTERVAL > 1 else None
+
+        self.frame_w, self.frame_h, self.fps = 1920, 1080, 25
+        # Состояния треков: ограничены по памяти, ушедшие треки вытесняются
+        self.worker_summaries: Dict[int, dict] = {}
+        self.workers = WorkerStateStore(
+            idle_sec=settings.WORKER_IDLE_SEC,
+            max_bytes=settings.WORKER_STATE_MAX_MB * 1024 * 1024,
+            on_evict=self._flush_worker,
+        )
+        # Призраки треков для восстановления ID: живут 30 кадров, поиск в радиусе 150px
+        self.ghost_tracks = GhostTrackStore(ttl=30, radius=150)
+        # Траектории (точка ног во времени) для ретроспективных запросов по полигону
+        self.trajectories = TrajectoryWriter(video_db_id, segment=start_frame) \
+            if settings.TRAJECTORY_STORE else None
 
         # OCR State
         self.current_real_time = "00:00:00"
-        # Датасет записан 2022-03-20, стартуем от полуночи
-        self.video_start_dt: datetime | None = datetime(2022, 3, 20, 0, 0, 0)
+        # Часы оверлея: шаблоны цифр + сверка с ходом часов, EasyOCR — только при расхождении
+        self.timestamp_reader = TimestampReader(fallback_sec=settings.TIMESTAMP_OCR_FALLBACK_SEC)
+        # Датасет записан 2022-03-20, стартуем от полуночи (live — от текущего времени)
+        self.video_start_dt: datetime | None = None if live else datetime(2022, 3, 20, 0, 0, 0)
         self.current_video_dt = None
         self.train_tracker = TrainTracker(departure_timeout=30)
 
         # ФЛАГ: найден ли поезд?
         self.train_found_session = False
 
-    def check_zone(self, bbox, frame_w, frame_h):
-        foot_x = int((bbox[0] + bbox[2]) / 2)
-        foot_y = int(bbox[3])
-        return zone_service.check_point(self.video_db_id, foot_x, foot_y, frame_w, frame_h)
-
-    def analyze_complex_activity(self, worker: WorkerState, bbox, kpts):
-        center = ((bbox[0] + bbox[2]) / 2, (bbox[1] + bbox[3]) / 2)
-        worker.positions.append(center)
-
-        if kpts is not None:
-            worker.keypoints_history.append(np.array(kpts))
-
-        if len(worker.positions) < 5:
-            return "Анализ..."
-
-        positions = np.array(worker.positions)
-        dist = np.linalg.norm(positions[-1] - positions[0])
-        movement_intensity = dist
-
-        current_state = "Стоит" if movement_intensity < 10 else "Идет"
-
-        if kpts is None:
-            return current_state
-
-        hands_active = False
-        if len(worker.keypoints_history) > 5:
-            past_kpts = np.array(worker.keypoints_history)
-            wrists = past_kpts[:, [9, 10], :2]
-            if np.mean(np.std(wrists, axis=0)) > 2.0:
-                hands_active = True
+        # Зоны могли измениться в API-процессе (задача идёт в воркере пула)
+        zone_service.sync(video_db_id)
+
+    @staticmethod
+    def feet_points(boxes: np.ndarray) -> np.ndarray:
+        """Точка ног (центр низа бокса) для всех боксов: (N, 2)."""
+        return np.stack([(boxes[:, 0] + boxes[:, 2]) / 2, boxes[:, 3]], axis=1)
+
+    def check_zones(self, boxes: np.ndarray, frame_w, frame_h) -> List[Optional[Zone]]:
+        """Зоны всех людей кадра по точке ног — одним вызовом."""
+        feet = self.feet_points(boxes).astype(np.int32)
+        return zone_service.locate_points(self.video_db_id, feet, frame_w, frame_h)
+
+    def _flush_trajectories(self):
+        if self.trajectories is not None:
+            self.trajectories.flush()
+
+    def check_spatial_logic(self, persons: DetectionBatch, ppe_objects: DetectionBatch) -> np.ndarray:
+        """(P, V): нарушения экипировки каждого человека — все пары человек/предмет за один проход."""
+        return violation_flags(persons.boxes, ppe_objects.boxes, ppe_objects.cls,
+                               one_to_one=settings.PPE_ONE_TO_ONE)
+
+    def _cache_path(self) -> Optional[str]:
+        """Каталог кеша детекций; нечитаемый файл — прогон без кеша, ридер сам завершит его."""
+        if not self.use_cache:
+            return None
+        try:
+            return cache_dir(self.video_path, self.video_db_id)
+        except OSError as e:
+            print(f"⚠️ Detection cache disabled for video {self.video_db_id}: {e}")
+            return None
+
+    async def process(self) -> dict:
+        # Полный прогон (и повтор из кеша) пишет траектории видео заново;
+        # сегменты чистит и склеивает segment_processing
+        if self.trajectories is not None and not self.collect_results:
+            trajectory_store.clear(self.video_db_id)
+
+        cache_path = self._cache_path()
+        if cache_path is not None:
+            cache = DetectionCache.open(cache_path)
+            if cache is not None:
+                return await self._replay(cache)
 
-        if movement_intensity > 20.0:
-            return "Идет"
-        elif hands_active:
-            return "Работает"
-
-        box_h = bbox[3] - bbox[1]
-        box_w = bbox[2] - bbox[0]
-        if box_w > box_h * 0.8 and movement_intensity < 10:
-            return "Сидит"
-
-        return "Стоит"
-
-    def check_spatial_logic(self, person_box, object_box):
-        px1, py1, px2, py2 = person_box
-        ox1, oy1, ox2, oy2 = object_box
-        o_cx, o_cy = (ox1 + ox2) / 2, (oy1 + oy2) / 2
-        return (px1 - 40 < o_cx < px2 + 40) and (py1 - 60 < o_cy < py2 + 60)
-
-    async def process(self):
         print(f"🚀 ENTERPRISE PIPELINE STARTED: Video {self.video_db_id}")
-        cap = cv2.VideoCapture(self.video_path)
-        frame_w = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)) or 1920
-        frame_h = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)) or 1080
-        fps = cap.get(cv2.CAP_PROP_FPS) or 25
+        # Декодер в отдельном потоке: cap.read() идёт параллельно с инференсом
+        sampler = self._make_sampler()
+        reader = ThreadedFrameReader(
+            self.video_path,
+            buffer_size=settings.DECODE_BUFFER_SIZE,
+            start_frame=max(0, self.start_frame - self.preroll_frames),
+            end_frame=self.end_frame,
+            sampler=sampler,
+        ).start()
+        self.frame_w = reader.width
+        self.frame_h = reader.height
+        self.fps = reader.fps
+
+        self._open_tracking()
+        if cache_path is not None:
+            self.cache_writer = DetectionCacheWriter(cache_path)
+            cache_zones = zones_key(self.video_db_id)
+
+        frame_id = 0
+        # В режиме сегментов БД не трогаем: результаты забирает merge-шаг
+        session_ctx = nullcontext() if self.collect_results else AsyncSessionLocal()
+
+        try:
+            async with session_ctx as db:
+                for frame_id, frame in reader.frames():
+                    await self.process_frame(db, frame_id, frame)
+
+                    if db is not None and self._due("commit", frame_id, self.fps):
+                        await db.commit()
+                        await asyncio.sleep(0.001)
+
+                if db is not None:
+                    await db.commit()
 
-        async with AsyncSessionLocal() as db:
-            frame_id = 0
-            while cap.isOpened():
-                ret, frame = cap.read()
-                if not ret:
-                    break
-                frame_id += 1
-                current_ts = frame_id / fps  # секунды от начала ролика
-
-                # Инициализируем базовое время, если ещё не было
-                if self.video_start_dt is None:
-                    self.video_start_dt = datetime.utcnow()
-
-                # Fallback-время кадра: от старта + current_ts
-                video_dt = self.video_start_dt + timedelta(seconds=current_ts)
-
-                OCR_INTERVAL_SEC = 10  # Проверяем OCR раз в 10 секунд
-
-                if frame_id % int(fps * OCR_INTERVAL_SEC) == 0:
-                    ts = ocr_instance.extract_timestamp(frame)
-                    if ts:
-                        self.current_real_time = ts
-                        try:
-                            if len(ts) > 8:
-                                real_dt = datetime.strptime(ts, "%Y-%m-%d%H:%M:%S")
-                            else:
-                                base_date = self.video_start_dt.date()
-                                real_dt = datetime.strptime(
-                                    base_date.strftime("%Y-%m-%d") + ts,
-                                    "%Y-%m-%d%H:%M:%S",
-                                )
-                            self.video_start_dt = real_dt - timedelta(seconds=current_ts)
-                            video_dt = real_dt
-                            self.current_video_dt = real_dt
-                        except ValueError:
-                            pass
-
-                if video_dt is not None:
-                    self.current_video_dt = video_dt
+            if self.cache_writer is not None:
+                if zones_key(self.video_db_id) != cache_zones:
+                    # Зоны, по которым резался P2, поменялись посреди прогона — детекции смешанные
+                    print(f"♻️ DETECTION CACHE SKIPPED: zones changed during run (video {self.video_db_id})")
+                    self.cache_writer.discard()
                 else:
-                    video_dt = self.current_video_dt
-
-                if frame_id % 3 != 0: continue
-
-                # 1. AI INFERENCE (Детекция людей)
-                detections = detector_instance.detect_with_slicing(frame)
-
-                # Фильтруем людей
-                raw_objects = [d for d in detections if d["class_name"] == "person"]
-                ppe_objects = [d for d in detections if d["class_name"] not in ["person", "train"]]
-
-                # 2. ID RECOVERY (Трекинг людей)
-                raw_objects.sort(key=lambda x: x['track_id'] if x['track_id'] is not None else 999999)
-                final_objects = []
-                used_ids = set()
-
-                for p in raw_objects:
-                    if p['track_id'] is None: continue
-                    tid = p['track_id']
-                    bbox = p['bbox']
-                    cx, cy = (bbox[0] + bbox[2]) / 2, (bbox[1] + bbox[3]) / 2
-                    recovered_id = tid
-                    min_dist = 10000
-                    match_ghost = None
-                    for gid, (gx, gy, gframe) in self.ghost_tracks.items():
-                        if frame_id - gframe < 30:
-                            dist = ((cx - gx) ** 2 + (cy - gy) ** 2) ** 0.5
-                            if dist < 150 and dist < min_dist:
-                                min_dist = dist
-                                match_ghost = gid
-                    if match_ghost is not None:
-                        if match_ghost < recovered_id:
-                            recovered_id = match_ghost
-                        elif recovered_id != match_ghost and recovered_id in used_ids:
-                            recovered_id = match_ghost
-                    p['track_id'] = recovered_id
-                    if recovered_id not in used_ids:
-                        used_ids.add(recovered_id)
-                        final_objects.append(p)
-                        self.ghost_tracks[recovered_id] = (cx, cy, frame_id)
-
-                final_persons = [o for o in final_objects if o["class_name"] == "person"]
-
-                # --- ЛОГИКА ПОЕЗДА (Full-Frame OCR) ---
-                # Работаем только если поезд ЕЩЕ НЕ БЫЛ НАЙДЕН в этой сессии
-                if not self.train_found_session and frame_id % int(fps) == 0:
-                    h, w, _ = frame.shape
-                    train_info = ocr_instance.extract_train_from_full_frame(frame)
-
-                    if train_info:
-                        print(f"[DEBUG] full-frame train OCR={train_info}")
-                        model, number, conf = train_info
-
-                        # Нормализация
-                        if model == "Э20": model = "ЭП20"
-                        if not model.startswith("Э"):
-                            model = "Э" + model
-
-                        train_id = f"{model}-{number}"
-
-                        evt = self.train_tracker.update_presence(train_id, video_dt, frame_id)
-                        if evt and evt["event_type"] == "arrival":
-                            print(f"🚂 ARRIVAL {train_id} at {video_dt} (video {self.video_db_id})")
-                            te = TrainEvent(
-                                video_id=self.video_db_id,
-                                train_model=model,
-                                train_number=number,
-                                full_train_id=train_id,
-                                event_type="arrival",
-                                timestamp=video_dt,
-                                frame_number=frame_id,
-                                bbox_x1=None, bbox_y1=None, bbox_x2=None, bbox_y2=None,
-                                confidence=conf,
-                            )
-                            db.add(te)
-                            await db.commit()
-                            await db.refresh(te)
-
-                            # ВАЖНО: Ставим флаг, что поезд найден.
-                            # Больше OCR делать не будем, но цикл продолжится!
-                            print("✅ Поезд записан. Выключаем поиск поездов, продолжаем анализ людей.")
-                            self.train_found_session = True
-
-                # --- ЛОГИКА ЛЮДЕЙ (ПРОДОЛЖАЕТ РАБОТАТЬ) ---
-                for person in final_persons:
-                    tid = person["track_id"]
-                    bbox = person["bbox"]
-                    kpts = person.get("keypoints")
-
-                    if tid not in self.workers: self.workers[tid] = WorkerState(tid)
-                    worker = self.workers[tid]
-
-                    zone = self.check_zone(bbox, frame_w, frame_h)
-                    worker.zone = zone
-                    activity = self.analyze_complex_activity(worker, bbox, kpts)
-                    worker.state = activity
-
-                    violations = []
-                    if kpts is not None:
-                        if (bbox[2] - bbox[0]) > (bbox[3] - bbox[1]) * 1.2: violations.append("fall_detected")
-
-                    for obj in ppe_objects:
-                        if self.check_spatial_logic(bbox, obj['bbox']):
-                            if obj['class_name'] == 'head_nohelmet':
-                                violations.append("no_helmet")
-                            elif obj['class_name'] == 'face_nomask':
-                                violations.append("no_mask")
-                            elif obj['class_name'] == 'hand_noglove':
-                                violations.append("no_glove")
-
-                    violations = list(set(violations))
-                    if zone == "Danger Zone": violations.append("zone_intrusion")
-
-                    if violations:
-                        points = 0
-                        for v in violations:
-                            worker.violation_buffer[v].append(True)
-                            points += 10 if v == 'no_helmet' else 5
-                        worker.risk_score += points
-
-                        stable_violation = None
-                        for v in violations:
-                            if sum(worker.violation_buffer[v]) >= 2:
-                                stable_violation = v
-                                break
-
-                        if stable_violation:
-                            import time
-                            now = time.time()
-                            if now - self.last_alert_time[tid] > 1.5:
-                                print(f"🚨 INCIDENT: Worker #{tid} | {activity} in {zone} | {violations}")
-                                event = SafetyEvent(
-                                    timestamp=datetime.utcnow(),
-                                    video_timestamp=current_ts,
-                                    real_time=self.current_real_time,
-                                    camera_id="CAM-01",
-                                    event_type=stable_violation,
-                                    confidence=person["confidence"],
-                                    bbox=person["bbox"],
-                                    track_id=tid,
-                                    video_id=self.video_db_id,
-                                    action=activity,
-                                    zone=zone
-                                )
-                                db.add(event)
-                                self.last_alert_time[tid] = now
-                                for v in violations: worker.violation_buffer[v].clear()
-
-                if frame_id % int(fps) == 0:
+                    self.cache_writer.close({"fps": self.fps, "width": self.frame_w, "height": self.frame_h,
+                                             "video_id": self.video_db_id})
+                self.cache_writer = None
+        finally:
+            if self.cache_writer is not None:
+                self.cache_writer.discard()
+            reader.release()
+            self._close_tracking()
+            self._flush_trajectories()
+
+        print(f"✅ ENTERPRISE ANALYSIS COMPLETE: {sampler.stats()}")
+        return {"video_id": self.video_db_id, "frames": frame_id, "events": self.events_count,
+                "sampling": sampler.stats(),
+                "keyframes": dict(self.keyframes.stats) if self.keyframes else None}
+
+    async def _replay(self, cache: DetectionCache) -> dict:
+        """Повторный анализ по кешу: ни декодирования, ни нейросетей — только логика."""
+        print(f"♻️ REPLAY FROM DETECTION CACHE: Video {self.video_db_id} ({len(cache)} frames, {cache.path})")
+        self.replay = cache
+        self.fps = cache.meta["fps"]
+        self.frame_w, self.frame_h = cache.meta["width"], cache.meta["height"]
+
+        frame_id = 0
+        async with AsyncSessionLocal() as db:
+            for frame_id, detections in cache.frames():
+                await self.process_frame(db, frame_id, None, detections)
+                if self._due("commit", frame_id, self.fps * 10):
                     await db.commit()
-                    await asyncio.sleep(0.001)
-
             await db.commit()
-            cap.release()
-        print("✅ ENTERPRISE ANALYSIS COMPLETE")
+        self._flush_trajectories()
+
+        print(f"✅ REPLAY COMPLETE: {self.events_count} events")
+        return {"video_id": self.video_db_id, "frames": frame_id, "events": self.events_count, "replay": True}
+
+    async def _ocr(self, kind: str, frame_id: int, read: Callable, frame):
+        """OCR через кеш: при повторном анализе результат берётся из кеша (EasyOCR не грузится)."""
+        if self.replay is not None:
+            return self.replay.get_ocr(kind, frame_id)
+        value = await self._run_blocking(read, frame)
+        if self.cache_writer is not None:
+            self.cache_writer.record_ocr(kind, frame_id, value)
+        return value
+
+    def _make_sampler(self):
+        # Сегменты склеиваются по общим кадрам, поэтому там шаг только фиксированный
+        if settings.SAMPLING_MODE == "adaptive" and not self.collect_results:
+            return AdaptiveFrameSampler(
+                base_stride=FRAME_STRIDE,
+                target_fps=settings.SAMPLING_TARGET_FPS,
+            )
+        return FixedFrameSampler(FRAME_STRIDE)
+
+    def _due(self, key: str, frame_id: int, interval: float) -> bool:
+        """Периодические действия по номеру кадра, устойчивые к пропускам кадров."""
+        if frame_id - self._last_run[key] >= interval:
+            self._last_run[key] = frame_id
+            return True
+        return False
+
+    async def process_live(self) -> dict:
+        """
+        Headless-обработка живого потока до вызова stop().
+        Всегда анализируется самый свежий кадр, отставшие отбрасываются.
+        """
+        print(f"📡 LIVE PIPELINE STARTED: {self.video_path} (video {self.video_db_id})")
+        self.live_reader = LiveFrameReader(self.video_path).start()
+        self._live_started = time.monotonic()
+
+        self._open_tracking()
+
+        frame_id = 0
+        try:
+            async with AsyncSessionLocal() as db:
+                while not self._stop_requested:
+                    # Ожидание кадра — в отдельном потоке, чтобы не держать event loop
+                    item = await asyncio.to_thread(self.live_reader.next_frame, 1.0)
+                    if item is None:
+                        continue
+                    frame_id, frame = item
+                    self.frame_w, self.frame_h = frame.shape[1], frame.shape[0]
+                    self.fps = self.live_reader.fps
+                    await self.process_frame(db, frame_id, frame)
+
+                    if self._due("commit", frame_id, self.fps):
+                        await db.commit()
+                await db.commit()
+        finally:
+            self.live_reader.release()
+            self._close_tracking()
+            self._flush_trajectories()
+
+        print(f"🛑 LIVE PIPELINE STOPPED: {self.live_stats()}")
+        return {"video_id": self.video_db_id, "frames": frame_id, "events": self.events_count}
+
+    def stop(self):
+        self._stop_requested = True
+
+    def live_stats(self) -> dict:
+        stats = self.live_reader.stats() if self.live_reader else {}
+        stats.update({
+            "video_id": self.video_db_id,
+            "camera_id": self.camera_id,
+            "frames_analyzed": self.frames_analyzed,
+            "events": self.events_count,
+            "workers": self.workers.stats(),
+        })
+        return stats
+
+    async def _run_blocking(self, fn, *args):
+        # В live-режиме процессор живёт в event loop API — тяжёлый OCR уносим в поток
+        if self.live:
+            return await asyncio.to_thread(fn, *args)
+        return fn(*args)
+
+    @staticmethod
+    def _merge_summary(summaries: Dict[int, dict], worker: WorkerState):
+        summary = worker.summary()
+        prev = summaries.get(worker.track_id)
+        if prev is not None:
+            # Трек вернулся после вытеснения: риск копится, состояние — последнее
+            summary["risk_score"] += prev["risk_score"]
+        summaries[worker.track_id] = summary
+
+    def _flush_worker(self, worker: WorkerState):
+        """Итоги вытесняемого трека (нужны только сегментной обработке)."""
+        if self.collect_results:
+            self._merge_summary(self.worker_summaries, worker)
+
+    def worker_summary(self) -> Dict[int, dict]:
+        """Агрегаты всех треков: уже вытесненные + живые."""
+        result = {tid: dict(summary) for tid, summary in self.worker_summaries.items()}
+        for _, worker in self.workers.items():
+            self._merge_summary(result, worker)
+        return result
+
+    def _in_preroll(self, frame_id: int) -> bool:
+        return frame_id <= self.start_frame
+
+    def _record_boundary_tracks(self, frame_id: int, persons: DetectionBatch):
+        """Запоминаем боксы треков в зонах перекрытия сегментов (для склейки ID)."""
+        if not self.collect_results:
+            return
+        near_start = frame_id <= self.start_frame
+        near_end = self.end_frame is not None and frame_id > self.end_frame - self.preroll_frames
+        if near_start or near_end:
+            tracked = persons[persons.track_id >= 0]  # пробные треки ID ещё не получили
+            self.boundary_tracks[frame_id] = list(zip(tracked.track_id.tolist(), tracked.boxes.tolist()))
+
+    async def _store_safety_event(self, db, fields: dict):
+        self.events_count += 1
+        if db is None:
+            self.collected_events.append(fields)
+        else:
+            db.add(SafetyEvent(**fields))
+
+    async def _store_train_event(self, db, fields: dict):
+        if db is None:
+            self.collected_train_events.append(fields)
+            return
+        te = TrainEvent(**fields)
+        db.add(te)
+        await db.commit()
+        await db.refresh(te)
+
+    def _tile_roi(self) -> Optional[np.ndarray]:
+        """Области тайлинга P2: bbox запрещённых зон в пикселях, (R, 4) (P2_TILE_ROI=zone)."""
+        if not get_detector().tiling or settings.P2_TILE_ROI != "zone":
+            return None
+        rois = []
+        # Запас на рост человека: люди у края зоны стоят ногами внутри, телом снаружи
+        pad = 0.1 * self.frame_h
+        for zone in zone_service.list_zones(self.video_db_id):
+            if zone["type"] not in RESTRICTED_ZONE_TYPES or len(zone["points"]) < 3:
+                continue
+            pts = np.asarray(zone["points"], dtype=np.float32) * (self.frame_w, self.frame_h)
+            rois.append([*(pts.min(axis=0) - pad), *(pts.max(axis=0) + pad)])
+        return np.array(rois, dtype=np.float32) if rois else None
+
+    def _open_tracking(self):
+        """
+        Свой контекст трекинга на поток: веса моделей общие, а ID людей
+        параллельно обрабатываемых видео/камер не смешиваются.
+        """
+        if self.batch_scheduler is not None:
+            self.batch_scheduler.register_stream(self.stream_id, frame_rate=int(self.fps))
+        else:
+            get_detector().open_stream(self.stream_id, frame_rate=int(self.fps))
+
+    def _close_tracking(self):
+        if self.batch_scheduler is not None:
+            self.batch_scheduler.unregister_stream(self.stream_id)
+        else:
+            get_detector().close_stream(self.stream_id)
+
+    async def _detect(self, frame) -> DetectionBatch:
+        roi = self._tile_roi()
+        if self.batch_scheduler is not None:
+            return await self.batch_scheduler.detect(self.stream_id, frame, roi)
+        return await self._run_blocking(get_detector().detect_with_slicing, frame, 0.35, roi, self.stream_id)
+
+    async def _detect_or_propagate(self, frame) -> DetectionBatch:
+        """Полная детекция на ключевых кадрах, перенос оптическим потоком между ними."""
+        if self.keyframes is None:
+            return await self._detect(frame)
+        if not self.keyframes.due():
+            detections = await self._run_blocking(self.keyframes.propagate, frame)
+            if detections is not None:
+                return detections
+        detections = await self._detect(frame)
+        self.keyframes.keyframe(frame, detections)
+        return detections
+
+    async def process_frame(self, db, frame_id: int, frame, detections: Optional[DetectionBatch] = None):
+        fps = self.fps
+        frame_w, frame_h = self.frame_w, self.frame_h
+        if self.live:
+            current_ts = time.monotonic() - self._live_started  # секунды от старта потока
+        else:
+            current_ts = frame_id / fps  # секунды от начала ролика
+
+        # Инициализируем базовое время, если ещё не было
+        if self.video_start_dt is None:
+            self.video_start_dt = datetime.utcnow()
+
+        # Fallback-время кадра: от старта + current_ts
+        video_dt = self.video_start_dt + timedelta(seconds=current_ts)
+
+        if self._due("ocr", frame_id, fps * settings.TIMESTAMP_SYNC_SEC):
+            ts = await self._ocr("ts", frame_id, lambda f: self.timestamp_reader.read(f, current_ts), frame)
+            if ts:
+                self.current_real_time = ts
+                try:
+                    if len(ts) > 8:
+                        real_dt = datetime.strptime(ts, "%Y-%m-%d%H:%M:%S")
+                    else:
+                        base_date = self.video_start_dt.date()
+                        real_dt = datetime.strptime(
+                            base_date.strftime("%Y-%m-%d") + ts,
+                            "%Y-%m-%d%H:%M:%S",
+                        )
+                    self.video_start_dt = real_dt - timedelta(seconds=current_ts)
+                    video_dt = real_dt
+                    self.current_video_dt = real_dt
+                except ValueError:
+                    pass
+
+        if video_dt is not None:
+            self.current_video_dt = video_dt
+        else:
+            video_dt = self.current_video_dt
+
+        self.frames_analyzed += 1
+        if self._due("zones", frame_id, fps):
+            zone_service.sync(self.video_db_id)
+
+        # 1. AI INFERENCE (Детекция людей)
+        if detections is None:
+            detections = await self._detect_or_propagate(frame)
+            if self.cache_writer is not None:
+                self.cache_writer.append(frame_id, detections)
+
+        # Фильтруем людей (без трека — не восстанавливаем и не учитываем)
+        persons = detections.persons()
+        persons = persons[persons.track_id >= 0]
+        ppe_objects = detections.objects()
+
+        # 2. ID RECOVERY (Трекинг людей)
+        persons = persons[np.argsort(persons.track_id, kind="stable")]
+        centers = persons.centers
+        track_ids = persons.track_id
+        keep = np.zeros(len(persons), dtype=bool)
+        used_ids = set()
+
+        for i in range(len(persons)):
+            tid = int(track_ids[i])
+            cx, cy = float(centers[i, 0]), float(centers[i, 1])
+            recovered_id = tid
+            match_ghost = self.ghost_tracks.nearest(cx, cy, frame_id)
+            if match_ghost is not None:
+                if match_ghost < recovered_id:
+                    recovered_id = match_ghost
+                elif recovered_id != match_ghost and recovered_id in used_ids:
+                    recovered_id = match_ghost
+            track_ids[i] = recovered_id
+            if recovered_id not in used_ids:
+                used_ids.add(recovered_id)
+                keep[i] = True
+                self.ghost_tracks.update(recovered_id, cx, cy, frame_id)
+
+        final_persons = persons[keep]
+        self._record_boundary_tracks(frame_id, final_persons)
+
+        # Pre-roll сегмента: только прогреваем трекер, события пишет предыдущий сегмент
+        if self._in_preroll(frame_id):
+            return
+
+        # --- ЛОГИКА ПОЕЗДА (Full-Frame OCR) ---
+        # Работаем только если поезд ЕЩЕ НЕ БЫЛ НАЙДЕН в этой сессии
+        if not self.train_found_session and self._due("train", frame_id, fps):
+            train_info = await self._ocr("train", frame_id, lambda f: get_ocr().extract_train_from_full_frame(f), frame)
+
+            if train_info:
+                print(f"[DEBUG] full-frame train OCR={train_info}")
+                model, number, conf = train_info
+
+                # Нормализация
+                if model == "Э20": model = "ЭП20"
+                if not model.startswith("Э"):
+                    model = "Э" + model
+
+                train_id = f"{model}-{number}"
+
+                evt = self.train_tracker.update_presence(train_id, video_dt, frame_id)
+                if evt and evt["event_type"] == "arrival":
+                    print(f"🚂 ARRIVAL {train_id} at {video_dt} (video {self.video_db_id})")
+                    await self._store_train_event(db, dict(
+                        video_id=self.video_db_id,
+                        train_model=model,
+                        train_number=number,
+                        full_train_id=train_id,
+                        event_type="arrival",
+                        timestamp=video_dt,
+                        frame_number=frame_id,
+                        bbox_x1=None, bbox_y1=None, bbox_x2=None, bbox_y2=None,
+                        confidence=conf,
+                    ))
+
+                    # ВАЖНО: Ставим флаг, что поезд найден.
+                    # Больше OCR делать не будем, но цикл продолжится!
+                    print("✅ Поезд записан. Выключаем поиск поездов, продолжаем анализ людей.")
+                    self.train_found_session = True
+
+        # --- ЛОГИКА ЛЮДЕЙ (ПРОДОЛЖАЕТ РАБОТАТЬ) ---
+        # Экипировка рядом с каждым человеком — одной матрицей (люди x объекты)
+        ppe_flags = self.check_spatial_logic(final_persons, ppe_objects)
+        # Активность всех людей кадра — один векторный проход по общей истории треков
+        workers = [self.workers.get(int(tid), current_ts) for tid in final_persons.track_id]
+        slots = np.array([w.slot for w in workers], dtype=np.intp)
+        self.workers.activity.update(slots, final_persons.centers, final_persons.kpts, final_persons.has_kpts)
+        activities, fallen = self.workers.activity.classify(slots, final_persons.boxes, final_persons.has_kpts)
+        zones = self.check_zones(final_persons.boxes, frame_w, frame_h)
+        if self.trajectories is not None:
+            feet_norm = self.feet_points(final_persons.boxes) / (frame_w, frame_h)
+            self.trajectories.append(video_dt, final_persons.track_id, feet_norm)
+
+        for i, worker in enumerate(workers):
+            tid = worker.track_id
+            bbox = final_persons.boxes[i]
+
+            zone = zones[i].name if zones[i] else SAFE_ZONE
+            worker.zone = zone
+            activity = activities[i]
+            worker.state = activity
+
+            violations = []
+            if fallen[i]: violations.append("fall_detected")
+
+            violations.extend(name for name, flag in zip(VIOLATION_NAMES, ppe_flags[i]) if flag)
+
+            if zones[i] is not None and zones[i].restricted: violations.append("zone_intrusion")
+
+            if violations:
+                points = 0
+                for v in violations:
+                    worker.add_violation(v)
+                    points += 10 if v == 'no_helmet' else 5
+                worker.risk_score += points
+
+                stable_violation = None
+                for v in violations:
+                    if worker.violation_count(v) >= 2:
+                        stable_violation = v
+                        break
+
+                if stable_violation:
+                    # Время видео, а не стены: иначе повтор из кеша душил бы события
+                    now = current_ts
+                    if now - worker.last_alert > 1.5:
+                        print(f"🚨 INCIDENT: Worker #{tid} | {activity} in {zone} | {violations}")
+                        await self._store_safety_event(db, dict(
+                            timestamp=datetime.utcnow(),
+                            video_timestamp=current_ts,
+                            real_time=self.current_real_time,
+                            camera_id=self.camera_id,
+                            event_type=stable_violation,
+                            confidence=float(final_persons.conf[i]),
+                            bbox=bbox.astype(int).tolist(),
+                            track_id=tid,
+                            video_id=self.video_db_id,
+                            action=activity,
+                            zone=zone
+                        ))
+                        worker.last_alert = now
+                        for v in violations: worker.clear_violation(v)
+
+        # Треки, ушедшие из кадра: агрегаты сброшены в итоги, память освобождаем
+        if self._due("evict", frame_id, fps):
+            self.workers.evict_idle(current_ts)
+        # Live не завершается: траектории сбрасываются на диск раз в минуту
+        if self.live and self._due("trajectories", frame_id, fps * 60):
+            self._flush_trajectories()
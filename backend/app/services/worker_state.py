@@ -0,0 +1,114 @@
+# backend/app/services/worker_state.py
+from collections import Counter, OrderedDict
+from typing import Callable, Optional
+
+import numpy as np
+
+from app.services.activity import ActivityEngine
+
+VIOLATION_WINDOW = 10  # сколько последних срабатываний нарушения помним
+VIOLATIONS = ("fall_detected", "no_helmet", "no_mask", "no_glove", "zone_intrusion")
+VIOLATION_INDEX = {name: i for i, name in enumerate(VIOLATIONS)}
+
+
+class WorkerState:
+    __slots__ = (
+        "track_id", "slot", "state", "zone",
+        "violation_counts", "risk_score", "last_alert", "last_seen",
+    )
+
+    def __init__(self, track_id: int, slot: int, now: float = 0.0):
+        self.track_id = track_id
+        self.slot = slot  # строка истории позиций/скелетов в ActivityEngine
+        self.state = "Unknown"
+        self.zone = "Safe"
+        # Сколько раз подряд (до сброса, не больше окна) срабатывало нарушение
+        self.violation_counts = np.zeros(len(VIOLATIONS), dtype=np.uint8)
+        self.risk_score = 0
+        self.last_alert = float("-inf")  # время последнего алерта (сек. видео); первый — сразу
+        self.last_seen = now  # сек. видео (live — от старта потока)
+
+    def add_violation(self, name: str):
+        i = VIOLATION_INDEX[name]
+        self.violation_counts[i] = min(self.violation_counts[i] + 1, VIOLATION_WINDOW)
+
+    def violation_count(self, name: str) -> int:
+        return int(self.violation_counts[VIOLATION_INDEX[name]])
+
+    def clear_violation(self, name: str):
+        self.violation_counts[VIOLATION_INDEX[name]] = 0
+
+    def summary(self) -> dict:
+        """Итоговые агрегаты трека (уходят в результат сегмента)."""
+        return {"risk_score": self.risk_score, "state": self.state, "zone": self.zone}
+
+
+# Память одного трека: слот истории в ActivityEngine + объект со слотами
+WORKER_BYTES = (
+    ActivityEngine.slot_bytes() + len(VIOLATIONS)
+    + 200  # объект и ndarray счётчиков нарушений (оценка)
+)
+
+
+class WorkerStateStore:
+    """
+    Состояния треков процессора с ограниченной памятью.
+    - Порядок в OrderedDict — по последнему появлению: самые старые треки в начале.
+    - История позиций и скелетов всех треков — в общем ActivityEngine (слот на трек).
+    - evict_idle(): треки, не появлявшиеся idle_sec секунд, сначала отдают
+      итоговые агрегаты в on_evict, затем удаляются.
+    - Жёсткий лимит max_bytes: при переполнении вытесняется давно не виденный трек
+      (тоже через on_evict), счётчики — в stats().
+    """
+    def __init__(self, idle_sec: float, max_bytes: int, on_evict: Optional[Callable[[WorkerState], None]] = None):
+        self.idle_sec = idle_sec
+        self.max_workers = max(1, max_bytes // WORKER_BYTES)
+        self.on_evict = on_evict
+        self.activity = ActivityEngine(self.max_workers)
+        self._workers: "OrderedDict[int, WorkerState]" = OrderedDict()
+        self.counters = Counter()
+
+    def __len__(self):
+        return len(self._workers)
+
+    def __contains__(self, track_id: int):
+        return track_id in self._workers
+
+    def items(self):
+        return self._workers.items()
+
+    def get(self, track_id: int, now: float) -> WorkerState:
+        """Состояние трека (создаётся при первом появлении), отмечает его как живой."""
+        worker = self._workers.get(track_id)
+        if worker is None:
+            while len(self._workers) >= self.max_workers:
+                self._evict(next(iter(self._workers)), "evicted_cap")
+            worker = self._workers[track_id] = WorkerState(track_id, self.activity.alloc(), now)
+            self.counters["created"] += 1
+        else:
+            self._workers.move_to_end(track_id)
+        worker.last_seen = now
+        return worker
+
+    def evict_idle(self, now: float):
+        while self._workers:
+            track_id, worker = next(iter(self._workers.items()))
+            if now - worker.last_seen < self.idle_sec:
+                break
+            self._evict(track_id, "evicted_idle")
+
+    def _evict(self, track_id: int, reason: str):
+        worker = self._workers.pop(track_id)
+        self.activity.release(worker.slot)
+        if self.on_evict is not None:
+            self.on_evict(worker)
+        self.counters[reason] += 1
+
+    def stats(self) -> dict:
+        return {
+            "live": len(self._workers),
+            "max": self.max_workers,
+            "bytes": len(self._workers) * WORKER_BYTES,
+            "capacity": self.activity.capacity,
+            **self.counters,
+        }
@@ -1,56 +1,259 @@
-import cv2
+import json
+import os
 import numpy as np
-from typing import List, Dict
+from typing import List, Dict, Optional, Tuple
+
+from app.core.config import settings
+
+# Старый API (/update_zone, set_zone) управляет одной зоной с этим именем
+DEFAULT_ZONE_NAME = "Danger Zone"
+SAFE_ZONE = "Safe Zone"
+# Типы зон, нахождение в которых — нарушение (zone_intrusion); прочие (walkway...) — разметка
+RESTRICTED_ZONE_TYPES = ("danger", "track", "pit", "catenary")
+
+
+class Zone:
+    """Именованная типизированная зона камеры: полигон в нормированных координатах."""
+    __slots__ = ("name", "type", "points")
+
+    def __init__(self, name: str, points: List[List[float]], type: str = "danger"):
+        self.name = name
+        self.type = type
+        self.points = [list(map(float, pt)) for pt in points]
+
+    @property
+    def restricted(self) -> bool:
+        return self.type in RESTRICTED_ZONE_TYPES
+
+    def to_dict(self) -> dict:
+        return {"name": self.name, "type": self.type, "points": self.points}
+
+
+class CompiledPolygon:
+    """
+    Полигон зоны, скомпилированный под разрешение кадра: таблица рёбер в пикселях.
+    contains() проверяет сразу все точки кадра (чёт-нечет по рёбрам, граница — внутри,
+    как pointPolygonTest >= 0).
+    """
+    __slots__ = ("x1", "y1", "x2", "y2", "bbox")
+
+    def __init__(self, points_px: np.ndarray):
+        pts = np.asarray(points_px, dtype=np.float64)
+        nxt = np.roll(pts, -1, axis=0)
+        self.x1, self.y1 = pts[:, 0], pts[:, 1]
+        self.x2, self.y2 = nxt[:, 0], nxt[:, 1]
+        self.bbox = (*pts.min(axis=0), *pts.max(axis=0))
+
+    def contains(self, points: np.ndarray) -> np.ndarray:
+        points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+        px, py = points[:, 0:1], points[:, 1:2]  # (N, 1) против рёбер (E,)
+        x1, y1, x2, y2 = self.x1, self.y1, self.x2, self.y2
+
+        # Луч вправо: ребро пересекает горизонталь точки, и пересечение правее неё
+        straddles = (y1 > py) != (y2 > py)
+        dy = np.where(y2 != y1, y2 - y1, 1.0)
+        x_cross = x1 + (py - y1) * (x2 - x1) / dy
+        inside = np.count_nonzero(straddles & (px < x_cross), axis=1) % 2 == 1
+
+        # Точка на ребре (коллинеарна и внутри его bbox)
+        cross = (x2 - x1) * (py - y1) - (y2 - y1) * (px - x1)
+        on_edge = (
+            (cross == 0)
+            & (np.minimum(x1, x2) <= px) & (px <= np.maximum(x1, x2))
+            & (np.minimum(y1, y2) <= py) & (py <= np.maximum(y1, y2))
+        ).any(axis=1)
+        return inside | on_edge
+
+
+class CompiledZones:
+    """
+    Все зоны камеры под одно разрешение кадра + равномерная сетка GRID x GRID по кадру:
+    в каждой ячейке — список зон, чей bbox её задевает (CSR: cell_start / cell_zones).
+    Точка берёт зоны своей ячейки, отсекает их по bbox и проверяется точно только против
+    оставшихся: стоимость кадра растёт с числом зон рядом с людьми, а не всех зон камеры.
+    Порядок зон — приоритет: запрещённые раньше разметки, дальше — порядок объявления.
+    """
+    __slots__ = ("zones", "polygons", "bboxes", "cell_w", "cell_h", "cell_start", "cell_zones")
+
+    GRID = 16  # ячеек по каждой оси кадра
+
+    def __init__(self, zones: List[Zone], frame_w: int, frame_h: int):
+        self.zones = sorted(zones, key=lambda z: not z.restricted)
+        # Пиксели с отбрасыванием дробной части — как раньше int(pt * size)
+        self.polygons = [
+            CompiledPolygon((np.asarray(z.points, dtype=np.float64) * (frame_w, frame_h)).astype(np.int32))
+            for z in self.zones
+        ]
+        self.bboxes = np.array([p.bbox for p in self.polygons], dtype=np.float64).reshape(-1, 4)
+        self.cell_w = max(frame_w, 1) / self.GRID
+        self.cell_h = max(frame_h, 1) / self.GRID
+        self._build_grid()
+
+    def _cells(self, x: np.ndarray, y: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Координаты ячейки; всё, что за кадром, прижимается к крайним ячейкам."""
+        cx = np.clip(np.floor(x / self.cell_w), 0, self.GRID - 1).astype(np.intp)
+        cy = np.clip(np.floor(y / self.cell_h), 0, self.GRID - 1).astype(np.intp)
+        return cx, cy
+
+    def _build_grid(self):
+        x0, y0 = self._cells(self.bboxes[:, 0], self.bboxes[:, 1])
+        x1, y1 = self._cells(self.bboxes[:, 2], self.bboxes[:, 3])
+        buckets: List[List[int]] = [[] for _ in range(self.GRID * self.GRID)]
+        for z in range(len(self.zones)):
+            for cy in range(y0[z], y1[z] + 1):
+                for cx in range(x0[z], x1[z] + 1):
+                    buckets[cy * self.GRID + cx].append(z)
+        counts = np.array([len(b) for b in buckets], dtype=np.intp)
+        self.cell_start = np.concatenate([[0], np.cumsum(counts)]).astype(np.intp)
+        self.cell_zones = np.array([z for b in buckets for z in b], dtype=np.intp)
+
+    def membership(self, points: np.ndarray) -> np.ndarray:
+        """(N, Z): точка внутри зоны."""
+        points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+        hits = np.zeros((len(points), len(self.zones)), dtype=bool)
+        if len(points) == 0 or len(self.zones) == 0:
+            return hits
+
+        # Пары (точка, зона своей ячейки) одним проходом по CSR
+        cx, cy = self._cells(points[:, 0], points[:, 1])
+        cells = cy * self.GRID + cx
+        starts, counts = self.cell_start[cells], self.cell_start[cells + 1] - self.cell_start[cells]
+        rows = np.repeat(np.arange(len(points)), counts)
+        first = np.cumsum(counts) - counts
+        zone_ids = self.cell_zones[np.repeat(starts - first, counts) + np.arange(counts.sum())]
+
+        # Отсечение по bbox зоны, затем точная проверка — по одной зоне за раз
+        b = self.bboxes[zone_ids]
+        px, py = points[rows, 0], points[rows, 1]
+        near = (b[:, 0] <= px) & (px <= b[:, 2]) & (b[:, 1] <= py) & (py <= b[:, 3])
+        rows, zone_ids = rows[near], zone_ids[near]
+        order = np.argsort(zone_ids, kind="stable")
+        rows, zone_ids = rows[order], zone_ids[order]
+        bounds = np.flatnonzero(np.diff(zone_ids)) + 1
+        for group, z_rows in zip(np.split(zone_ids, bounds), np.split(rows, bounds)):
+            if len(group):
+                hits[z_rows, group[0]] = self.polygons[group[0]].contains(points[z_rows])
+        return hits
 
 
 class ZoneManager:
-    def __init__(self):
-        # video_id -> List[List[float]]
-        self.zones_map: Dict[int, List[List[float]]] = {}
+    """
+    Зоны камер в памяти процесса.
+    sync_dir: каждое изменение публикуется снимком <sync_dir>/<video_id>.json, а sync()
+    подхватывает чужие снимки — так правки зон из API доходят до задач, уже идущих
+    в воркерах пула (у них своя память).
+    """
+    def __init__(self, sync_dir: Optional[str] = None):
+        # video_id -> {name: Zone} (порядок объявления сохраняется)
+        self.zones_map: Dict[int, Dict[str, Zone]] = {}
+        # (video_id, frame_w, frame_h) -> скомпилированные зоны; сбрасывается при любом изменении
+        self._compiled: Dict[Tuple[int, int, int], CompiledZones] = {}
+        self.sync_dir = sync_dir
+        self._synced: Dict[int, int] = {}  # video_id -> mtime_ns последнего прочитанного снимка
 
-    def set_zone(self, video_id: int, points: List[List[float]]):
-        print(f"⚡ ZONE MANAGER: Setting zone for video {video_id}: {points}")
-        self.zones_map[video_id] = points
+    def _invalidate(self, video_id: int):
+        for key in [k for k in self._compiled if k[0] == video_id]:
+            del self._compiled[key]
 
-    def get_zone(self, video_id: int):
-        return self.zones_map.get(video_id, [])
+    def _changed(self, video_id: int):
+        self._invalidate(video_id)
+        if self.sync_dir is None:
+            return
+        os.makedirs(self.sync_dir, exist_ok=True)
+        path = os.path.join(self.sync_dir, f"{video_id}.json")
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self.list_zones(video_id), f)
+        os.replace(tmp, path)
+        self._synced[video_id] = os.stat(path).st_mtime_ns
 
-    def check_point(self, video_id: int, x: int, y: int, frame_w: int, frame_h: int) -> str:
-        """
-        Проверяет точку (x, y) в пикселях
-        """
-        zone_norm = self.zones_map.get(video_id)
+    def sync(self, video_id: int) -> bool:
+        """Подхватывает снимок зон, опубликованный другим процессом. True — зоны обновились."""
+        if self.sync_dir is None:
+            return False
+        path = os.path.join(self.sync_dir, f"{video_id}.json")
+        try:
+            mtime = os.stat(path).st_mtime_ns
+            if self._synced.get(video_id) == mtime:
+                return False
+            with open(path, encoding="utf-8") as f:
+                zones = json.load(f)
+        except (OSError, ValueError):
+            return False
+        self._load(video_id, zones)
+        self._invalidate(video_id)
+        self._synced[video_id] = mtime
+        return True
+
+    def clear_snapshots(self):
+        """Старт API: зоны живут в его памяти, снимки прошлого запуска воркерам не нужны."""
+        if self.sync_dir is not None and os.path.isdir(self.sync_dir):
+            for name in os.listdir(self.sync_dir):
+                if name.endswith(".json"):
+                    os.remove(os.path.join(self.sync_dir, name))
+        self._synced.clear()
 
-        if not zone_norm or len(zone_norm) < 3:
-            return "Safe Zone"
+    def _load(self, video_id: int, zones: List[dict]):
+        self.zones_map[video_id] = {
+            z["name"]: Zone(z["name"], z["points"], z.get("type", "danger")) for z in zones
+        }
 
-        # 1. Конвертируем полигон в пиксели
-        poly_pts = []
-        for pt in zone_norm:
-            px = int(pt[0] * frame_w)
-            py = int(pt[1] * frame_h)
-            poly_pts.append([px, py])
+    def set_zones(self, video_id: int, zones: List[dict]):
+        """Заменяет все зоны камеры: [{name, type, points}, ...]."""
+        self._load(video_id, zones)
+        self._changed(video_id)
 
-        # ВАЖНО: OpenCV любит формат (N, 1, 2) для контуров,
-        # но pointPolygonTest ест и просто (N, 2) int32
-        poly_np = np.array(poly_pts, dtype=np.int32)
+    def upsert_zone(self, video_id: int, name: str, points: List[List[float]], type: str = "danger"):
+        self.zones_map.setdefault(video_id, {})[name] = Zone(name, points, type)
+        self._changed(video_id)
 
-        # Точка проверки (центр низа bbox)
-        point = (float(x), float(y))
+    def remove_zone(self, video_id: int, name: str) -> bool:
+        removed = self.zones_map.get(video_id, {}).pop(name, None) is not None
+        if removed:
+            self._changed(video_id)
+        return removed
 
-        # 2. Проверка
-        # measureDist=False возвращает +1 (inside), -1 (outside), 0 (edge)
-        result = cv2.pointPolygonTest(poly_np, point, False)
+    def list_zones(self, video_id: int) -> List[dict]:
+        return [z.to_dict() for z in self.zones_map.get(video_id, {}).values()]
 
-        # --- ОТЛАДКА (раскомментируй, если не заработает) ---
-        # if result >= 0:
-        #    print(f"[DEBUG] HIT! Point {point} is inside poly {poly_pts[:2]}...")
+    def set_zone(self, video_id: int, points: List[List[float]]):
+        print(f"⚡ ZONE MANAGER: Setting zone for video {video_id}: {points}")
+        self.upsert_zone(video_id, DEFAULT_ZONE_NAME, points, "danger")
+
+    def get_zone(self, video_id: int):
+        zone = self.zones_map.get(video_id, {}).get(DEFAULT_ZONE_NAME)
+        return zone.points if zone else []
+
+    def _compile(self, video_id: int, frame_w: int, frame_h: int) -> Optional[CompiledZones]:
+        key = (video_id, frame_w, frame_h)
+        compiled = self._compiled.get(key)
+        if compiled is None:
+            zones = [z for z in self.zones_map.get(video_id, {}).values() if len(z.points) >= 3]
+            if not zones:
+                return None
+            compiled = self._compiled[key] = CompiledZones(zones, frame_w, frame_h)
+        return compiled
 
-        if result >= 0:
-            return "Danger Zone"
+    def locate_points(self, video_id: int, points: np.ndarray, frame_w: int, frame_h: int) -> List[Optional[Zone]]:
+        """Главная зона каждой точки (N, 2) в пикселях (None — вне зон) одним векторным вызовом."""
+        points = np.asarray(points).reshape(-1, 2)
+        compiled = self._compile(video_id, frame_w, frame_h)
+        if compiled is None:
+            return [None] * len(points)
+        hits = compiled.membership(points)
+        first = hits.argmax(axis=1)
+        return [compiled.zones[z] if hit else None for z, hit in zip(first, hits.any(axis=1))]
 
-        return "Safe Zone"
+    def check_points(self, video_id: int, points: np.ndarray, frame_w: int, frame_h: int) -> List[str]:
+        """Имя зоны для всех точек (N, 2) в пикселях; вне зон — "Safe Zone"."""
+        return [z.name if z else SAFE_ZONE for z in self.locate_points(video_id, points, frame_w, frame_h)]
+
+    def check_point(self, video_id: int, x: int, y: int, frame_w: int, frame_h: int) -> str:
+        """
+        Проверяет точку (x, y) в пикселях
+        """
+        return self.check_points(video_id, [[x, y]], frame_w, frame_h)[0]
 
 
 # Глобальный инстанс
-zone_service = ZoneManager()
+zone_service = ZoneManager(sync_dir=settings.ZONE_SYNC_DIR)
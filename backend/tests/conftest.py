@@ -0,0 +1,6 @@
+# backend/tests/conftest.py
+import os
+import sys
+
+# Тесты запускаются из backend/: пакет app должен импортироваться без установки
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
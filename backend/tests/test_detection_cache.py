@@ -0,0 +1,113 @@
+# backend/tests/test_detection_cache.py
+import os
+
+import numpy as np
+import pytest
+
+from app.core.config import settings
+from app.services import detection_cache, zones
+from app.services.detection_cache import DetectionCache, DetectionCacheWriter
+from app.services.detections import CLASS_IDS, DetectionBatch
+
+
+@pytest.fixture
+def video(tmp_path):
+    path = tmp_path / "clip.mp4"
+    path.write_bytes(os.urandom(64 * 1024))
+    return str(path)
+
+
+@pytest.fixture
+def cache_root(tmp_path, monkeypatch):
+    root = tmp_path / "cache"
+    monkeypatch.setattr(settings, "DETECTION_CACHE_DIR", str(root))
+    return root
+
+
+def _batch(n, track_start=1):
+    boxes = np.arange(n * 4, dtype=np.float32).reshape(n, 4)
+    boxes[:, 2:] += 50
+    return DetectionBatch.from_arrays(boxes, np.full(n, 0.9), CLASS_IDS['person'],
+                                      np.arange(track_start, track_start + n))
+
+
+def test_round_trip(tmp_path):
+    path = str(tmp_path / "entry")
+    frames = {0: _batch(2), 3: _batch(0), 6: _batch(3, track_start=5)}
+    writer = DetectionCacheWriter(path)
+    for frame_id, batch in frames.items():
+        writer.append(frame_id, batch)
+    writer.record_ocr("timestamp", 3, "12:00:00")
+    assert DetectionCache.open(path) is None  # до close() кеш не виден
+    writer.close({"fps": 25.0})
+
+    cache = DetectionCache.open(path)
+    assert len(cache) == 3
+    assert cache.meta["fps"] == 25.0
+    assert cache.get_ocr("timestamp", 3) == "12:00:00"
+    assert cache.get_ocr("timestamp", 6) is None
+    for (frame_id, got), (want_id, want) in zip(cache.frames(), frames.items()):
+        assert frame_id == want_id
+        np.testing.assert_array_equal(got.data, want.data)
+    assert not any(name.endswith(".tmp") for name in os.listdir(tmp_path))
+
+
+def test_empty_cache_round_trip(tmp_path):
+    path = str(tmp_path / "entry")
+    writer = DetectionCacheWriter(path)
+    writer.append(0, _batch(0))
+    writer.close({})
+    assert [len(batch) for _, batch in DetectionCache.open(path).frames()] == [0]
+
+
+def test_discard_leaves_nothing(tmp_path):
+    path = str(tmp_path / "entry")
+    writer = DetectionCacheWriter(path)
+    writer.append(0, _batch(1))
+    writer.discard()
+    assert DetectionCache.open(path) is None
+    assert os.listdir(tmp_path) == []
+
+
+def test_key_changes_with_model_version(video, cache_root, monkeypatch):
+    before = detection_cache.cache_dir(video, 1)
+    monkeypatch.setattr(settings, "INFERENCE_INT8", not settings.INFERENCE_INT8)
+    assert detection_cache.cache_dir(video, 1) != before
+
+
+def test_key_changes_with_restricted_zones_only_in_zone_tiling(video, cache_root, tmp_path, monkeypatch):
+    manager = zones.ZoneManager()
+    monkeypatch.setattr(zones, "zone_service", manager)
+    manager.set_zones(1, [{"name": "pit", "type": "danger", "points": [[0, 0], [0.5, 0], [0.5, 0.5]]}])
+
+    monkeypatch.setattr(settings, "P2_TILING", False)
+    plain = detection_cache.cache_dir(video, 1)
+    manager.upsert_zone(1, "pit", [[0, 0], [0.9, 0], [0.9, 0.9]])
+    assert detection_cache.cache_dir(video, 1) == plain
+
+    monkeypatch.setattr(settings, "P2_TILING", True)
+    monkeypatch.setattr(settings, "P2_TILE_ROI", "zone")
+    tiled = detection_cache.cache_dir(video, 1)
+    manager.upsert_zone(1, "pit", [[0, 0], [0.5, 0], [0.5, 0.5]])
+    assert detection_cache.cache_dir(video, 1) != tiled
+
+
+def test_clear_cache_removes_all_versions_of_video(video, cache_root, monkeypatch):
+    for int8 in (False, True):
+        monkeypatch.setattr(settings, "INFERENCE_INT8", int8)
+        writer = DetectionCacheWriter(detection_cache.cache_dir(video, 1))
+        writer.close({})
+    assert len(os.listdir(cache_root)) == 2
+    detection_cache.clear_cache(video)
+    assert os.listdir(cache_root) == []
+
+
+def test_missing_video_disables_cache(tmp_path):
+    pytest.importorskip("easyocr")
+    from app.services.video_stream import SmartVideoProcessor
+
+    processor = SmartVideoProcessor.__new__(SmartVideoProcessor)
+    processor.use_cache = True
+    processor.video_path = str(tmp_path / "missing.mp4")
+    processor.video_db_id = 1
+    assert processor._cache_path() is None
@@ -0,0 +1,33 @@
+# backend/tests/test_live_streams.py
+import asyncio
+
+from app.services.live_streams import LiveStreamManager
+
+
+def _finish(coro_factory, cancel=False):
+    async def run():
+        manager = LiveStreamManager()
+        task = asyncio.create_task(coro_factory())
+        manager.streams[1] = (None, task)
+        task.add_done_callback(lambda t: manager._on_done(1, t))
+        if cancel:
+            task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+        await asyncio.sleep(0)
+        return manager
+    return asyncio.run(run())
+
+
+def test_crashed_stream_is_removed_and_logged(capsys):
+    async def crash():
+        raise RuntimeError("rtsp gone")
+
+    manager = _finish(crash)
+    assert manager.streams == {}
+    assert "rtsp gone" in capsys.readouterr().out
+
+
+def test_cancelled_stream_is_removed_quietly(capsys):
+    manager = _finish(lambda: asyncio.sleep(10), cancel=True)
+    assert manager.streams == {}
+    assert capsys.readouterr().out == ""
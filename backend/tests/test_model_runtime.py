@@ -0,0 +1,27 @@
+# backend/tests/test_model_runtime.py
+import os
+
+from app.services.model_runtime import _remove_stale_exports, exported_path, weights_tag
+
+
+def test_export_name_follows_weights_version(tmp_path):
+    weights = tmp_path / "yolo.pt"
+    weights.write_bytes(b"v1")
+    first = exported_path(str(weights), "openvino", int8=True)
+    assert first.parent == tmp_path
+
+    weights.write_bytes(b"retrained")
+    os.utime(weights, ns=(1, 1))
+    assert exported_path(str(weights), "openvino", int8=True) != first
+
+
+def test_stale_exports_of_same_variant_removed(tmp_path):
+    weights = tmp_path / "yolo.pt"
+    weights.write_bytes(b"v1")
+    target = exported_path(str(weights), "onnx", int8=True)
+    target.write_bytes(b"new")
+    (tmp_path / "yolo.0badc0de.int8.onnx").write_bytes(b"old")
+    (tmp_path / "yolo.0badc0de.onnx").write_bytes(b"fp32")
+
+    _remove_stale_exports(target, weights_tag(str(weights)))
+    assert sorted(p.name for p in tmp_path.iterdir()) == sorted(["yolo.pt", target.name, "yolo.0badc0de.onnx"])
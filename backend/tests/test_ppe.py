@@ -0,0 +1,43 @@
+# backend/tests/test_ppe.py
+import numpy as np
+
+from app.services.detections import CLASS_IDS
+from app.services.ppe import VIOLATION_NAMES, assign_objects, violation_flags
+
+NO_HELMET = VIOLATION_NAMES.index("no_helmet")
+
+
+def _crowd():
+    # Два перекрывающихся человека и одна голова без каски ближе к оси первого
+    persons = np.array([[100, 100, 200, 400], [150, 100, 250, 400]], dtype=np.float32)
+    heads = np.array([[140, 100, 170, 130]], dtype=np.float32)
+    cls = np.array([CLASS_IDS['head_nohelmet']])
+    return persons, heads, cls
+
+
+def test_containment_mode_flags_every_person_around_item():
+    persons, heads, cls = _crowd()
+    flags = violation_flags(persons, heads, cls, one_to_one=False)
+    assert flags[:, NO_HELMET].tolist() == [True, True]
+
+
+def test_one_to_one_mode_flags_only_owner():
+    persons, heads, cls = _crowd()
+    flags = violation_flags(persons, heads, cls, one_to_one=True)
+    assert flags[:, NO_HELMET].tolist() == [True, False]
+
+
+def test_one_to_one_heads_are_not_shared():
+    persons = np.array([[100, 100, 200, 400], [150, 100, 250, 400]], dtype=np.float32)
+    heads = np.array([[140, 100, 170, 130], [150, 100, 180, 130]], dtype=np.float32)
+    cls = np.array([CLASS_IDS['head_helmet'], CLASS_IDS['head_nohelmet']])
+    owner = assign_objects(persons, heads, cls)
+    assert sorted(owner.tolist()) == [0, 1]
+
+
+def test_empty_inputs():
+    flags = violation_flags(np.zeros((0, 4)), np.zeros((0, 4)), np.zeros(0, dtype=int))
+    assert flags.shape == (0, len(VIOLATION_NAMES))
+    flags = violation_flags(np.array([[0, 0, 10, 10]]), np.zeros((0, 4)), np.zeros(0, dtype=int),
+                            one_to_one=False)
+    assert not flags.any()
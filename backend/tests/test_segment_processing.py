@@ -0,0 +1,80 @@
+# backend/tests/test_segment_processing.py
+from app.services.segment_processing import (
+    EVENT_DEDUP_WINDOW_SEC, SEGMENT_PREROLL_FRAMES, merge_segment_results, split_into_segments,
+)
+
+
+def _box(x):
+    return [x, 100, x + 40, 200]
+
+
+def _segment(start, end, events=(), boundary=None, workers=None, trains=()):
+    return {
+        "start": start, "end": end, "events": list(events), "train_events": list(trains),
+        "boundary_tracks": boundary or {}, "workers": workers or {},
+    }
+
+
+def _event(track_id, ts, kind="no_helmet"):
+    return {"track_id": track_id, "event_type": kind, "video_timestamp": ts}
+
+
+def _worker(risk=1):
+    return {"risk_score": risk, "state": "Working", "zone": "Safe"}
+
+
+def test_split_covers_video_without_gaps():
+    bounds = split_into_segments(10_000, 4)
+    assert bounds[0][0] == 0 and bounds[-1][1] == 10_000
+    assert all(a[1] == b[0] for a, b in zip(bounds, bounds[1:]))
+    # Короткий ролик не режется на сегменты короче двух прероллов
+    assert len(split_into_segments(SEGMENT_PREROLL_FRAMES * 3, 8)) == 1
+
+
+def test_tracks_stitched_across_boundary():
+    # Перекрытие: кадры 96..100 видят оба сегмента; человек A — ID 5 и ID 1, B — ID 6 и ID 2
+    overlap = range(96, 101)
+    first = _segment(0, 100, boundary={f: [(5, _box(10 + f)), (6, _box(500))] for f in overlap},
+                     workers={5: _worker(2), 6: _worker(), 7: _worker()})
+    second = _segment(100, 200, boundary={f: [(1, _box(11 + f)), (2, _box(502))] for f in overlap},
+                      workers={1: _worker(3), 2: _worker(), 3: _worker()})
+
+    merged = merge_segment_results([second, first])  # порядок входа не важен
+    maps = merged["track_maps"]
+    assert maps[100][1] == maps[0][5]
+    assert maps[100][2] == maps[0][6]
+    # Новый человек второго сегмента получает новый сквозной ID
+    assert maps[100][3] not in maps[0].values()
+    assert merged["workers"][maps[0][5]]["risk_score"] == 5
+    assert len(merged["workers"]) == 4
+
+
+def test_no_stitch_without_overlap():
+    first = _segment(0, 100, boundary={99: [(1, _box(10))]}, workers={1: _worker()})
+    second = _segment(100, 200, boundary={150: [(1, _box(10))]}, workers={1: _worker()})
+    maps = merge_segment_results([first, second])["track_maps"]
+    assert maps[0][1] != maps[100][1]
+
+
+def test_events_deduplicated_at_boundary():
+    overlap = range(96, 101)
+    first = _segment(0, 100, events=[_event(5, 3.9)],
+                     boundary={f: [(5, _box(10))] for f in overlap})
+    # Преролл второго сегмента повторно видит то же нарушение, плюс отдельное позже
+    second = _segment(100, 200, events=[_event(1, 4.0), _event(1, 4.0 + 2 * EVENT_DEDUP_WINDOW_SEC),
+                                        _event(1, 4.1, kind="no_mask")],
+                      boundary={f: [(1, _box(10))] for f in overlap})
+
+    events = merge_segment_results([first, second])["events"]
+    assert [(e["event_type"], e["video_timestamp"]) for e in events] == [
+        ("no_helmet", 3.9), ("no_mask", 4.1), ("no_helmet", 4.0 + 2 * EVENT_DEDUP_WINDOW_SEC),
+    ]
+    assert len({e["track_id"] for e in events}) == 1
+
+
+def test_train_keeps_earliest_arrival():
+    first = _segment(0, 100, trains=[{"full_train_id": "T1", "frame_number": 90}])
+    second = _segment(100, 200, trains=[{"full_train_id": "T1", "frame_number": 30},
+                                        {"full_train_id": "T2", "frame_number": 150}])
+    trains = merge_segment_results([first, second])["train_events"]
+    assert sorted((t["full_train_id"], t["frame_number"]) for t in trains) == [("T1", 30), ("T2", 150)]
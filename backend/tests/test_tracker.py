@@ -0,0 +1,65 @@
+# backend/tests/test_tracker.py
+import numpy as np
+
+from app.services.tracker import ObjectTracker
+
+
+def _box(x, y, w=40, h=100):
+    return [x, y, x + w, y + h]
+
+
+def _run(tracker, frames):
+    return [tracker.update(np.array(b, dtype=np.float32).reshape(-1, 4), np.array(s, dtype=np.float32))
+            for b, s in frames]
+
+
+def test_track_confirmed_after_min_hits():
+    tracker = ObjectTracker(min_hits=3, new_track_thresh=0.6)
+    out = _run(tracker, [([_box(100 + 5 * i, 100)], [0.9]) for i in range(4)])
+    assert [ids.tolist() for ids in out] == [[-1], [-1], [1], [1]]
+    assert len(tracker) == 1
+
+
+def test_single_frame_false_positive_gets_no_id():
+    tracker = ObjectTracker(min_hits=3)
+    out = _run(tracker, [([_box(100, 100)], [0.9]), ([], []), ([], [])])
+    assert out[0].tolist() == [-1]
+    assert len(tracker.ids) == 0
+    # Следующий настоящий трек получает первый ID, номера не сгорели на ложняке
+    out = _run(tracker, [([_box(300, 100)], [0.9])] * 3)
+    assert out[-1].tolist() == [1]
+
+
+def test_low_score_detection_does_not_start_track():
+    tracker = ObjectTracker(high_thresh=0.5, low_thresh=0.25, new_track_thresh=0.6, min_hits=1)
+    out = _run(tracker, [([_box(100, 100)], [0.4])] * 3)
+    assert all(ids.tolist() == [-1] for ids in out)
+
+
+def test_ids_stable_for_moving_objects_and_low_score_pass():
+    tracker = ObjectTracker(high_thresh=0.5, low_thresh=0.25, min_hits=1)
+    frames = []
+    for i in range(30):
+        # Второй человек временно "проседает" по уверенности — его держит слабый этап
+        s2 = 0.3 if 10 <= i < 15 else 0.9
+        frames.append(([_box(100 + 4 * i, 100), _box(400 - 4 * i, 120)], [0.9, s2]))
+    out = _run(tracker, frames)
+    assert all(ids.tolist() == [1, 2] for ids in out)
+
+
+def test_lost_track_recovered_within_buffer_and_expires_after():
+    tracker = ObjectTracker(min_hits=1, track_buffer=5)
+    _run(tracker, [([_box(100, 100)], [0.9])] * 3)
+    _run(tracker, [([], [])] * 3)
+    assert _run(tracker, [([_box(100, 100)], [0.9])])[0].tolist() == [1]
+
+    _run(tracker, [([], [])] * 6)
+    assert len(tracker) == 0
+    assert _run(tracker, [([_box(100, 100)], [0.9])])[0].tolist() == [2]
+
+
+def test_reset_restarts_ids():
+    tracker = ObjectTracker(min_hits=1)
+    _run(tracker, [([_box(100, 100), _box(300, 100)], [0.9, 0.9])])
+    tracker.reset()
+    assert _run(tracker, [([_box(500, 100)], [0.9])])[0].tolist() == [1]
@@ -0,0 +1,62 @@
+# backend/tests/test_trajectory_store.py
+from datetime import datetime, timedelta
+
+import numpy as np
+import pytest
+
+from app.services import trajectory_store as ts
+from app.services.trajectory_store import TrajectoryStore, TrajectoryWriter
+
+T0 = datetime(2026, 5, 1, 9, 59, 50)
+SQUARE = [[0.1, 0.1], [0.4, 0.1], [0.4, 0.4], [0.1, 0.4]]
+
+
+@pytest.fixture
+def store(tmp_path):
+    return TrajectoryStore(str(tmp_path))
+
+
+def _write(store, segment, frames):
+    writer = TrajectoryWriter(7, segment=segment, root=store.root)
+    for sec, ids, points in frames:
+        writer.append(T0 + timedelta(seconds=sec), np.array(ids), np.array(points, dtype=np.float32))
+    writer.flush()
+
+
+def test_query_by_polygon_and_time_across_partitions(store, monkeypatch):
+    monkeypatch.setattr(ts, "FLUSH_ROWS", 2)  # несколько чанков на партицию
+    # Трек 1 идёт через квадрат, трек 2 всё время вне его; час меняется на 10-й секунде
+    _write(store, 0, [
+        (sec, [1, 2], [[0.05 + 0.05 * sec, 0.2], [0.9, 0.9]]) for sec in range(0, 20, 2)
+    ])
+    assert len({p.split("/")[-2] for p in store._chunk_paths(7)}) == 2
+
+    found = store.query(7, SQUARE, T0, T0 + timedelta(seconds=60))
+    assert [(r["track_id"], r["points"]) for r in found] == [(1, 3)]
+    assert found[0]["first_seen"] == T0 + timedelta(seconds=2)
+    assert found[0]["last_seen"] == T0 + timedelta(seconds=6)
+
+    # Окно времени отсекает точки, а не только партиции
+    found = store.query(7, SQUARE, T0 + timedelta(seconds=5), T0 + timedelta(seconds=60))
+    assert [(r["track_id"], r["points"]) for r in found] == [(1, 1)]
+    assert store.query(7, SQUARE, T0 + timedelta(hours=2), T0 + timedelta(hours=3)) == []
+
+
+def test_remap_tracks_merges_segment_local_ids(store):
+    # Один человек: ID 3 в сегменте с кадра 0 и ID 1 в сегменте с кадра 500
+    _write(store, 0, [(0, [3], [[0.2, 0.2]]), (1, [4], [[0.3, 0.3]])])
+    _write(store, 500, [(5, [1], [[0.25, 0.25]]), (6, [2], [[0.35, 0.35]])])
+    before = store.query(7, SQUARE, T0, T0 + timedelta(seconds=60))
+    assert len(before) == 4
+
+    store.remap_tracks(7, {0: {3: 1, 4: 2}, 500: {1: 1}})
+    after = store.query(7, SQUARE, T0, T0 + timedelta(seconds=60))
+    by_key = {(r["segment"], r["track_id"]): r["points"] for r in after}
+    # ID без пары в карте остаются локальными своего сегмента
+    assert by_key == {(0, 1): 2, (0, 2): 1, (500, 2): 1}
+
+
+def test_clear(store):
+    _write(store, 0, [(0, [1], [[0.2, 0.2]])])
+    store.clear(7)
+    assert store.query(7, SQUARE, T0, T0 + timedelta(seconds=60)) == []
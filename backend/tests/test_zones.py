@@ -0,0 +1,59 @@
+# backend/tests/test_zones.py
+import cv2
+import numpy as np
+
+from app.services.zones import CompiledZones, Zone, ZoneManager
+
+W, H = 1280, 720
+
+
+def _random_zones(rng, count):
+    zones = []
+    for i in range(count):
+        center = rng.uniform(0.05, 0.95, size=2)
+        angles = np.sort(rng.uniform(0, 2 * np.pi, size=rng.integers(3, 9)))
+        radius = rng.uniform(0.02, 0.3, size=len(angles))[:, None]
+        pts = center + radius * np.c_[np.cos(angles), np.sin(angles)]
+        kind = "danger" if i % 2 else "walkway"
+        zones.append(Zone(f"z{i}", pts.tolist(), kind))
+    return zones
+
+
+def _cv2_membership(compiled, points):
+    expected = np.zeros((len(points), len(compiled.zones)), dtype=bool)
+    for z, zone in enumerate(compiled.zones):
+        contour = (np.asarray(zone.points) * (W, H)).astype(np.int32)
+        for i, (x, y) in enumerate(points):
+            expected[i, z] = cv2.pointPolygonTest(contour, (float(x), float(y)), False) >= 0
+    return expected
+
+
+def test_membership_matches_point_polygon_test():
+    rng = np.random.default_rng(0)
+    compiled = CompiledZones(_random_zones(rng, 40), W, H)
+    points = np.vstack([
+        rng.uniform(-50, [W + 50, H + 50], size=(2000, 2)),
+        rng.integers(0, [W, H], size=(2000, 2)),  # целые точки чаще попадают на рёбра
+    ])
+    # И сами вершины полигонов — граница считается внутри
+    vertices = np.vstack([(np.asarray(z.points) * (W, H)).astype(np.int32) for z in compiled.zones])
+    points = np.vstack([points, vertices])
+    np.testing.assert_array_equal(compiled.membership(points), _cv2_membership(compiled, points))
+
+
+def test_membership_empty():
+    compiled = CompiledZones([], W, H)
+    assert compiled.membership(np.array([[10, 10]])).shape == (1, 0)
+    compiled = CompiledZones(_random_zones(np.random.default_rng(1), 3), W, H)
+    assert compiled.membership(np.zeros((0, 2))).shape == (0, 3)
+
+
+def test_restricted_zone_wins_over_markup():
+    manager = ZoneManager()
+    square = [[0.1, 0.1], [0.5, 0.1], [0.5, 0.5], [0.1, 0.5]]
+    manager.set_zones(1, [
+        {"name": "walk", "type": "walkway", "points": square},
+        {"name": "pit", "type": "pit", "points": square},
+    ])
+    found = manager.locate_points(1, np.array([[0.3 * W, 0.3 * H], [0.9 * W, 0.9 * H]]), W, H)
+    assert [z.name if z else None for z in found] == ["pit", None]